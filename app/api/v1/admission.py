@@ -0,0 +1,30 @@
+from typing import Optional
+from fastapi import Request
+from app.api.v1.rate_limiter import charge_pages, rate_limit_key
+from app.core.metrics import stage
+from app.core.scheduler import admission, estimate_cost
+from app.services.pdf_service import PdfSource, count_pages, source_size
+
+async def charge(request: Request, *documents: PdfSource) -> int:
+    """Page-count the PDFs in `documents` and charge them against the client's page quota."""
+    pages = await count_pages(*documents) if documents else 0
+    await charge_pages(request, pages)
+    return pages
+
+async def admit(request: Request, lane: str, *documents: PdfSource, size: Optional[int] = None):
+    """
+    Wait for a slot in `lane` before doing the work for this request.
+
+    PDFs in `documents` are page-counted once, which feeds both the page quota and the cost
+    estimate; `size` is the byte size when there are no PDFs yet (e.g. DOCX uploads). The slot
+    is released by AdmissionMiddleware once the response has been sent.
+    """
+    pages = await charge(request, *documents)
+
+    if size is None:
+        size = sum(source_size(data) for data in documents) if documents else int(request.headers.get("content-length") or 0)
+    with stage("admission", lane):
+        ticket = await admission.acquire(rate_limit_key(request), lane, estimate_cost(size, pages))
+    if ticket is not None:
+        request.state.admission_tickets = getattr(request.state, "admission_tickets", []) + [ticket]
+    return ticket
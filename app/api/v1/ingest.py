@@ -0,0 +1,212 @@
+import hashlib
+import os
+import uuid
+from typing import List, Optional, Tuple, Union
+import anyio
+from fastapi import HTTPException, Request, UploadFile
+from app.core.config import settings
+from app.utils.zip_stream import read_zip_members
+
+PDF_MAGIC = b"%PDF-"
+# Readers accept the header anywhere in the first KB (some generators prepend junk)
+MAGIC_WINDOW = 1024
+
+class Upload:
+    """
+    An ingested upload: in memory up to UPLOAD_SPOOL_BYTES, otherwise a file in UPLOAD_DIR.
+
+    `source` is what the PDF services take, bytes or that path, so large uploads are opened by
+    fitz straight from disk and only the path is pickled to worker processes. The file is removed
+    by IngestMiddleware once the response has been sent, unless it was `detach`ed first.
+    Members extracted from an archive are always on disk and carry no `sha256`.
+    """
+
+    def __init__(self, filename: str, content_type: Optional[str], size: int, sha256: Optional[str], data: Optional[bytes] = None, path: Optional[str] = None):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        return self.data if self.path is None else self.path
+
+    def read(self) -> bytes:
+        if self.path is None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def detach(self) -> Union[bytes, str]:
+        """Hand the source over to a caller that outlives the request; it removes the file itself."""
+        source = self.source
+        self.path = None
+        self.data = source if isinstance(source, bytes) else None
+        return source
+
+    def close(self):
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+def _too_large(limit: int) -> HTTPException:
+    size = f"{limit // (1024 * 1024)}MB" if limit >= 1024 * 1024 else f"{limit} byte"
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {size} limit.")
+
+def route_name(scope) -> Optional[str]:
+    """The name the matched endpoint was registered with through `limit(...)`, if any."""
+    return getattr(getattr(scope.get("route"), "endpoint", None), "route_name", None)
+
+def upload_limit(scope) -> int:
+    return settings.upload_limit_for(route_name(scope))
+
+async def ingest(request: Request, file: UploadFile, pdf: bool = True, limit: Optional[int] = None) -> Upload:
+    """
+    Read `file` in UPLOAD_CHUNK_SIZE chunks, hashing as it goes and stopping with 413 as soon as
+    it exceeds `limit`, the route's limit by default. With `pdf`, the type is decided by the
+    %PDF- magic bytes rather than the client's Content-Type header.
+    """
+    if limit is None:
+        limit = upload_limit(request.scope)
+    filename = file.filename or "document"
+    if file.size is not None and file.size > limit:
+        raise _too_large(limit)
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    # Kept apart from the buffer, which is dropped once the upload spools to disk
+    head = bytearray()
+    size = 0
+    sniffed = not pdf
+    path = None
+    spool = None
+    try:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > limit:
+                raise _too_large(limit)
+            digest.update(chunk)
+            if not sniffed:
+                head += chunk[:MAGIC_WINDOW - len(head)]
+                if len(head) >= MAGIC_WINDOW:
+                    _check_magic(head, filename)
+                    sniffed = True
+
+            if spool is not None:
+                await spool.write(chunk)
+                continue
+            buffer += chunk
+            if len(buffer) > settings.UPLOAD_SPOOL_BYTES:
+                os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+                path = os.path.join(settings.UPLOAD_DIR, uuid.uuid4().hex)
+                spool = await anyio.open_file(path, "wb")
+                await spool.write(bytes(buffer))
+                buffer = None
+        if not sniffed:
+            _check_magic(head, filename)
+    except BaseException:
+        if spool is not None:
+            await spool.aclose()
+            os.remove(path)
+        raise
+    if spool is not None:
+        await spool.aclose()
+
+    upload = Upload(filename, file.content_type, size, digest.hexdigest(), data=None if path else bytes(buffer), path=path)
+    _track(request, upload)
+    return upload
+
+async def ingest_image(request: Request, file: UploadFile) -> bytes:
+    """The bytes of an image that goes with a PDF (a signature, a stamp), within IMAGE_MAX_BYTES."""
+    upload = await ingest(request, file, pdf=False, limit=settings.IMAGE_MAX_BYTES)
+    if upload.path is None:
+        return upload.data
+    return await anyio.to_thread.run_sync(upload.read)
+
+def _track(request: Request, upload: Upload):
+    if not hasattr(request.state, "uploads"):
+        request.state.uploads = []
+    request.state.uploads.append(upload)
+
+async def ingest_archive(request: Request, file: UploadFile, extensions: Tuple[str, ...], max_member_bytes: int) -> List[Upload]:
+    """
+    Ingest a ZIP upload and extract its members with one of `extensions` into UPLOAD_DIR, in a
+    thread and within the BATCH_* limits. Members are removed after the response like any
+    spooled upload; the archive itself is removed as soon as it has been extracted.
+    Raises 400 on invalid archives, limits being exceeded or PDF members that are not PDFs.
+    """
+    archive = await ingest(request, file, pdf=False)
+    try:
+        members = await anyio.to_thread.run_sync(
+            read_zip_members, archive.source, extensions, settings.BATCH_MAX_FILES, max_member_bytes,
+            settings.BATCH_MAX_TOTAL_BYTES, settings.BATCH_MAX_COMPRESSION_RATIO, settings.UPLOAD_DIR
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    finally:
+        archive.close()
+
+    uploads = []
+    for name, path in members:
+        upload = Upload(name, None, os.path.getsize(path), None, path=path)
+        _track(request, upload)
+        uploads.append(upload)
+    # PDF members are sniffed like direct uploads; the tracked files go with the 400 as well
+    await anyio.to_thread.run_sync(_check_members, [upload for upload in uploads if upload.filename.lower().endswith(".pdf")])
+    return uploads
+
+def _check_magic(head: bytes, filename: str):
+    if PDF_MAGIC not in bytes(head[:MAGIC_WINDOW]):
+        raise HTTPException(status_code=400, detail=f"'{filename}' is not a PDF")
+
+def _check_members(uploads: List[Upload]):
+    for upload in uploads:
+        with open(upload.path, "rb") as f:
+            _check_magic(f.read(MAGIC_WINDOW), upload.filename)
+
+class IngestMiddleware:
+    """
+    Enforces the route's MAX_UPLOAD_BYTES before the multipart parser buffers anything: a
+    Content-Length over the limit is refused before the first body chunk is read, and bodies
+    without one are cut off as soon as they cross it. Spooled uploads are removed after the response.
+
+    The limit is looked up on the first receive, once routing has set scope["route"]. The 413 is
+    raised inside the route's body parsing, so it is rendered like any other HTTPException.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = None
+        received = 0
+
+        async def receive_limited():
+            nonlocal limit, received
+            if limit is None:
+                limit = upload_limit(scope)
+                content_length = dict(scope["headers"]).get(b"content-length", b"")
+                if content_length.isdigit() and int(content_length) > limit:
+                    raise _too_large(limit)
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _too_large(limit)
+            return message
+
+        try:
+            await self.app(scope, receive_limited, send)
+        finally:
+            state = scope.get("state") or {}
+            for upload in state.get("uploads", ()):
+                upload.close()
@@ -1,6 +1,102 @@
+import asyncio
+import hashlib
+import math
+import time
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from limits import parse
 from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from app.core.config import settings
+from app.utils.logger import logger
 
-# In-memory rate limiter
-limiter = Limiter(key_func=get_remote_address, default_limits=[settings.RATE_LIMIT])
\ No newline at end of file
+def rate_limit_key(request: Request) -> str:
+    """The client's API key, hashed so it never reaches the storage; requests without one go by address."""
+    api_key = request.headers.get("x-api-key", "")
+    if not api_key:
+        return f"anonymous:{get_remote_address(request)}"
+    return f"key:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+
+def client_address_key(request: Request) -> str:
+    return f"ip:{get_remote_address(request)}"
+
+def request_cost(request: Request) -> int:
+    """Weight a hit by upload size, one unit per RATE_LIMIT_COST_BYTES started (always 1 when that is 0)."""
+    if settings.RATE_LIMIT_COST_BYTES <= 0:
+        return 1
+    try:
+        length = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        length = 0
+    return max(1, math.ceil(length / settings.RATE_LIMIT_COST_BYTES))
+
+def create_limiter(storage_uri: str) -> Limiter:
+    """
+    Memory by default; point RATE_LIMIT_STORAGE_URI at redis:// (or any limits backend) to share
+    counters between workers and nodes. If that storage goes away we keep limiting in memory.
+    """
+    return Limiter(
+        key_func=rate_limit_key,
+        default_limits=[settings.RATE_LIMIT],
+        storage_uri=storage_uri,
+        strategy=settings.RATE_LIMIT_STRATEGY,
+        key_prefix="utility_api",
+        in_memory_fallback_enabled=not storage_uri.startswith("memory://"),
+        in_memory_fallback=[settings.RATE_LIMIT]
+    )
+
+limiter = create_limiter(settings.RATE_LIMIT_STORAGE_URI)
+
+def limit(route: str):
+    """
+    Limits for one route, both weighted by request_cost: RATE_LIMIT_<ROUTE> (or RATE_LIMIT) per API
+    key, so spreading one key over many addresses gains nothing, and RATE_LIMIT_PER_IP_<ROUTE> (or
+    RATE_LIMIT_PER_IP, or the per-key limit) per client address, so one address gains nothing from
+    many keys. Both are checked once per request, each in its own bucket.
+    """
+    def decorator(endpoint):
+        limited = limiter.limit(settings.rate_limit_for(route), key_func=rate_limit_key, cost=request_cost)(endpoint)
+        limited = limiter.limit(settings.ip_rate_limit_for(route), key_func=client_address_key, cost=request_cost)(limited)
+        # Lets per-route settings (e.g. MAX_UPLOAD_BYTES_<ROUTE>) find the route by the same name
+        limited.route_name = route
+        return limited
+    return decorator
+
+async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded) -> JSONResponse:
+    """429 for an exceeded request limit, with the seconds until its window resets in Retry-After."""
+    retry_after = 1
+    current = getattr(request.state, "view_rate_limit", None)
+    if current is not None:
+        try:
+            # A round-trip to the storage, which may be Redis
+            reset_at, _ = await asyncio.to_thread(limiter.limiter.get_window_stats, current[0], *current[1])
+            retry_after = max(1, math.ceil(reset_at - time.time()))
+        except Exception as e:
+            logger.warning(f"Rate limit storage unavailable, cannot compute Retry-After: {e}")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Rate limit of {exc.detail} exceeded."},
+        headers={"Retry-After": str(retry_after)}
+    )
+
+page_quota = parse(settings.PAGE_QUOTA) if settings.PAGE_QUOTA else None
+
+async def charge_pages(request: Request, pages: int):
+    """Count `pages` against the client's PAGE_QUOTA, in the same storage as the request limits."""
+    if page_quota is None or not limiter.enabled or pages <= 0:
+        return
+
+    key = rate_limit_key(request)
+    try:
+        allowed = await asyncio.to_thread(limiter.limiter.hit, page_quota, "utility_api", key, "pages", cost=pages)
+    except Exception as e:
+        logger.warning(f"Page quota storage unavailable, not charging {pages} pages: {e}")
+        return
+    if not allowed:
+        reset_at, _ = await asyncio.to_thread(limiter.limiter.get_window_stats, page_quota, "utility_api", key, "pages")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Page quota of {page_quota} exceeded ({pages} pages requested).",
+            headers={"Retry-After": str(max(1, math.ceil(reset_at - time.time())))}
+        )
@@ -1,21 +1,28 @@
-
-import os
-from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
-from starlette.background import BackgroundTask
-from app.services.barcode_service import barcode_service
+import hashlib
+from fastapi import APIRouter, Depends, Form, HTTPException, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+from typing import Optional
+from app.core.cache import barcode_cache
+from app.core.config import settings
+from app.core.scheduler import BULK, INTERACTIVE
+from app.services.barcode_service import MEDIA_TYPES, barcode_service, check_output, parse_bulk_items
+from app.api.v1.admission import admit
 from app.api.v1.dependencies import verify_api_key
+from app.api.v1.rate_limiter import limit
 
 router = APIRouter(prefix="/v1/barcode", tags=["barcode"])
 
 @router.post("/generate-barcode", tags=["Generate Barcode"])
+@limit("generate-barcode")
 async def generate_barcode(
+    request: Request,
     data: str = Form(...),
     barcode_type: str = Form('qr'),
     image_format: str = Form('PNG'),
     width: int = Form(250),
     height: int = Form(250),
     logo_file: UploadFile = None,
+    render: str = Form('resample'),
     x_api_key: str = Depends(verify_api_key)
 ):
     """
@@ -27,11 +34,108 @@ async def generate_barcode(
     - **width**: The width of the barcode image.
     - **height**: The height of the barcode image.
     - **logo_file**: Optional. An image file to be placed in the center of the barcode.
+    - **render**: `resample` (default) resizes the rendered code to width x height. `exact` draws
+      the modules directly at the largest whole-pixel scale that fits, which keeps edges sharp;
+      width and height are then pixels for 1D codes too. SVG and PDF output is always vector.
+
+    Identical requests are served from memory and carry an ETag, so clients can revalidate
+    with If-None-Match and get a 304.
     """
+    image_format, render = image_format.lower(), render.lower()
+    check_output(image_format, render)
+
+    logo_data = await logo_file.read() if logo_file else None
+    logo_hash = hashlib.sha256(logo_data).hexdigest() if logo_data else None
+    params = {"type": barcode_type.lower(), "format": image_format, "width": width, "height": height, "logo": logo_hash, "render": render}
+
+    async def compute():
+        # Only misses need a worker slot
+        await admit(request, INTERACTIVE)
+        return await barcode_service.generate_barcode(data, barcode_type, image_format, width, height, logo_data, logo_hash, render)
+
     try:
-        path = await barcode_service.generate_barcode(data, barcode_type, image_format, width, height, logo_file)
-        return FileResponse(path, media_type=f'image/{image_format.lower()}', background=BackgroundTask(os.remove, path))
+        entry = await barcode_cache.fetch(
+            data.encode(),
+            "generate-barcode",
+            params,
+            compute
+        )
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+
+    headers = {"ETag": entry.etag, "Cache-Control": f"private, max-age={settings.CACHE_TTL}"}
+    if entry.matches(request):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.value, media_type=MEDIA_TYPES[image_format], headers=headers)
+
+@router.post("/generate-bulk", tags=["Generate Barcode"])
+@limit("generate-bulk")
+async def generate_barcodes_bulk(
+    request: Request,
+    items: Optional[str] = Form(None),
+    csv_file: Optional[UploadFile] = None,
+    barcode_type: str = Form('qr'),
+    image_format: str = Form('PNG'),
+    width: int = Form(250),
+    height: int = Form(250),
+    logo_file: UploadFile = None,
+    render: str = Form('resample'),
+    output: str = Form('zip'),
+    page_size: str = Form('a4'),
+    columns: int = Form(3),
+    rows: int = Form(8),
+    margin_mm: float = Form(10),
+    show_labels: bool = Form(True),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Generate many barcodes in one request.
+
+    - **items**: JSON array of payloads, either strings or {"data": ..., "label": ...} objects.
+    - **csv_file**: Optional. CSV with the payload in its first column (or a "data" column) and an optional "label" column.
+    - **output**: `zip` for a ZIP of images plus manifest.json, or `pdf` for a printable label sheet.
+    - **page_size**, **columns**, **rows**, **margin_mm**, **show_labels**: Label sheet layout for `pdf` output.
+
+    The other fields, including render, work as in /generate-barcode; the logo is shared by every code.
+    """
+    output = output.lower()
+    if output not in ("zip", "pdf"):
+        raise HTTPException(status_code=400, detail="output must be 'zip' or 'pdf'")
+
+    try:
+        parsed = parse_bulk_items(items, await csv_file.read() if csv_file else None)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="Provide items or a csv_file with at least one payload")
+    if len(parsed) > settings.BARCODE_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BARCODE_BULK_MAX_ITEMS} barcodes can be generated per request")
+    if width <= 0 or height <= 0:
+        raise HTTPException(status_code=400, detail="width and height must be positive")
+
+    logo_data = await logo_file.read() if logo_file else None
+    logo_hash = hashlib.sha256(logo_data).hexdigest() if logo_data else None
+
+    await admit(request, BULK)
+    if output == "pdf":
+        sheet, failed = await barcode_service.generate_label_sheet(
+            parsed, barcode_type, width, height, page_size.lower(), columns, rows, margin_mm * 72 / 25.4, show_labels, logo_data, logo_hash, render
+        )
+        return Response(
+            sheet,
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": "attachment; filename=labels.pdf",
+                "X-Barcodes-Generated": str(len(parsed) - len(failed)),
+                "X-Barcodes-Failed": ",".join(str(item["index"] + 1) for item in failed)
+            }
+        )
+
+    check_output(image_format, render)
+    return StreamingResponse(
+        barcode_service.generate_bulk_zip(parsed, barcode_type, image_format, width, height, logo_data, logo_hash, render),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=barcodes.zip"}
+    )
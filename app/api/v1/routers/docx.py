@@ -1,13 +1,25 @@
 
-from fastapi import APIRouter, Depends, UploadFile, File
-from fastapi.responses import FileResponse, JSONResponse
+import asyncio
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Form, HTTPException, Request, UploadFile, File
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from app.api.v1.admission import admit
 from app.api.v1.dependencies import verify_api_key
-from app.services.docx_service import DocxService, docx_service
+from app.api.v1.ingest import ingest_archive
+from app.api.v1.rate_limiter import limit
+from app.core.config import settings
+from app.core.scheduler import BULK
+from app.services.docx_service import DOCX_CONTENT_TYPES, DocxService, docx_service
+from app.services.docx_template import docx_template_store
 
 router = APIRouter(prefix="/v1/docx", tags=["pdf"])
 
 @router.post("/docx-to-pdf", tags=["DOCX Conversion"])
+@limit("docx-to-pdf")
 async def convert_docx_to_pdf(
+    request: Request,
     file: UploadFile = File(None),
     service: DocxService = Depends(lambda: docx_service),
     x_api_key: str = Depends(verify_api_key)
@@ -18,5 +30,127 @@ async def convert_docx_to_pdf(
     if not file:
         return JSONResponse(status_code=400, content={"message": "File is required"})
 
+    await admit(request, BULK, size=file.size)
     pdf_path = await service.convert_to_pdf(file)
-    return FileResponse(pdf_path, media_type="application/pdf", filename=f"{file.filename}.pdf")
+    return FileResponse(
+        pdf_path,
+        media_type="application/pdf",
+        filename=f"{file.filename}.pdf",
+        background=BackgroundTask(service.cleanup, pdf_path)
+    )
+
+
+@router.post("/docx-to-pdf-batch", tags=["DOCX Conversion"])
+@limit("docx-to-pdf-batch")
+async def convert_docx_to_pdf_batch(
+    request: Request,
+    files: List[UploadFile] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    service: DocxService = Depends(lambda: docx_service),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Convert many DOCX or DOC files to PDF in one request.
+
+    - **files**: The documents to convert, and/or
+    - **archive**: A ZIP file containing the documents.
+
+    Returns a ZIP with the PDFs and a manifest.json holding the status of every input.
+    """
+    documents = []
+    size = 0
+    for file in files or []:
+        if file.content_type not in DOCX_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail=f"'{file.filename}' is not a .docx or .doc file")
+        if file.size is not None and file.size > settings.DOCX_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"'{file.filename}' exceeds the {settings.DOCX_MAX_BYTES // (1024 * 1024)}MB limit.")
+        data = await file.read()
+        documents.append((file.filename, data))
+        size += len(data)
+    if archive is not None:
+        for member in await ingest_archive(request, archive, (".docx", ".doc"), settings.DOCX_MAX_BYTES):
+            documents.append((member.filename, member.source))
+            size += member.size
+
+    if not documents:
+        return JSONResponse(status_code=400, content={"message": "At least one file is required"})
+    if len(documents) > settings.BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {settings.BATCH_MAX_FILES} files")
+
+    await admit(request, BULK, size=size)
+    return StreamingResponse(
+        service.convert_batch(documents),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=converted_documents.zip"}
+    )
+
+@router.post("/templates", tags=["DOCX Conversion"])
+@limit("docx-templates")
+async def upload_merge_template(
+    request: Request,
+    file: UploadFile = File(...),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Store a DOCX template containing {{field}} placeholders. The returned template_id
+    (the sha256 of the file) is used with /templates/{template_id}/merge.
+    """
+    if file.content_type != DOCX_CONTENT_TYPES[0]:
+        raise HTTPException(status_code=400, detail="Template must be a .docx file")
+    data = await file.read()
+    if len(data) > settings.DOCX_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"File size exceeds the {settings.DOCX_MAX_BYTES // (1024 * 1024)}MB limit.")
+
+    try:
+        template = await asyncio.to_thread(docx_template_store.save, data)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return {"template_id": template.template_id, "fields": template.fields, "size": template.size}
+
+@router.get("/templates", tags=["DOCX Conversion"])
+async def list_merge_templates(x_api_key: str = Depends(verify_api_key)):
+    return {"templates": docx_template_store.list()}
+
+@router.delete("/templates/{template_id}", tags=["DOCX Conversion"])
+async def delete_merge_template(template_id: str, x_api_key: str = Depends(verify_api_key)):
+    if not docx_template_store.remove(template_id):
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"deleted": template_id}
+
+@router.post("/templates/{template_id}/merge", tags=["DOCX Conversion"])
+@limit("docx-merge")
+async def merge_template_to_pdf(
+    request: Request,
+    template_id: str,
+    records: str = Form(...),
+    filename_field: Optional[str] = Form(None),
+    service: DocxService = Depends(lambda: docx_service),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Generate one PDF per record from a stored template.
+
+    - **records**: JSON array of objects; each {{field}} is replaced by the record's value.
+    - **filename_field**: Optional. Record field used to name the PDFs in the ZIP.
+
+    Returns a ZIP with the PDFs and a manifest.json listing missing fields and failures per record.
+    """
+    try:
+        parsed = json.loads(records)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"records is not valid JSON: {e}")
+    if not isinstance(parsed, list) or not parsed or not all(isinstance(record, dict) for record in parsed):
+        raise HTTPException(status_code=400, detail="records must be a non-empty JSON array of objects")
+    if len(parsed) > settings.MERGE_MAX_RECORDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.MERGE_MAX_RECORDS} records can be merged per request")
+
+    template = await asyncio.to_thread(docx_template_store.get, template_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    await admit(request, BULK, size=template.size * len(parsed))
+    return StreamingResponse(
+        service.merge_template(template, parsed, filename_field),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=merged_documents.zip"}
+    )
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
+from app.services.libreoffice_pool import libreoffice_pool
 
 router = APIRouter(prefix="/v1", tags=["health"])
 
 @router.get("/health")
 async def health_check():
-    return JSONResponse(content={"status": "ok", "version": "v1"})
\ No newline at end of file
+    # The DOCX converter mode is null until the first conversion starts the LibreOffice pool
+    return JSONResponse(content={"status": "ok", "version": "v1", "libreoffice_mode": libreoffice_pool.mode})
\ No newline at end of file
@@ -0,0 +1,107 @@
+import json
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.api.v1.admission import charge
+from app.api.v1.dependencies import verify_api_key
+from app.api.v1.ingest import ingest
+from app.api.v1.rate_limiter import limit, rate_limit_key
+from app.core.scheduler import estimate_cost
+from app.services.job_service import FAILED, JOB_KINDS, SUCCEEDED, Job, job_service
+
+router = APIRouter(prefix="/v1/jobs", tags=["jobs"])
+
+def _status(request: Request, job: Job) -> dict:
+    status = job.to_dict()
+    status["links"] = {"self": str(request.url_for("get_job", job_id=job.job_id))}
+    if job.status == SUCCEEDED:
+        status["links"]["result"] = str(request.url_for("get_job_result", job_id=job.job_id))
+    return status
+
+@router.post("/{kind}", status_code=202)
+@limit("jobs")
+async def submit_job(
+    request: Request,
+    kind: str,
+    file: UploadFile = File(...),
+    options: str = Form("{}"),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Queue a long-running operation and return its job_id straight away.
+
+    - **kind**: convert-to-image, convert-to-images, convert-to-text or docx-to-pdf.
+    - **options**: JSON object with the same parameters as the synchronous endpoint,
+      e.g. {"dpi": 200, "pages": "1-10"}.
+
+    Poll GET /v1/jobs/{job_id} for status and progress, then fetch GET /v1/jobs/{job_id}/result.
+    """
+    job_kind = JOB_KINDS.get(kind)
+    if job_kind is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind '{kind}'. Use one of: {', '.join(JOB_KINDS)}")
+    is_pdf = "application/pdf" in job_kind.content_types
+    if not is_pdf and file.content_type not in job_kind.content_types:
+        raise HTTPException(status_code=400, detail=f"Invalid file type for {kind}")
+    try:
+        parsed = json.loads(options)
+        if not isinstance(parsed, dict):
+            raise ValueError("options must be a JSON object")
+        parsed = job_kind.parse(parsed)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    upload = await ingest(request, file, pdf=is_pdf, limit=job_kind.max_bytes)
+    pages = await charge(request, upload.source) if is_pdf else 0
+    job = await job_service.submit(
+        kind,
+        rate_limit_key(request),
+        upload.source,
+        parsed,
+        upload.filename,
+        pages=pages,
+        cost=estimate_cost(upload.size, pages)
+    )
+    # The job owns the spooled file from here on; until submit succeeded the request did, so a
+    # refused job (503) still has it removed after the response
+    upload.detach()
+    return JSONResponse(
+        status_code=202,
+        content=_status(request, job),
+        headers={"Location": str(request.url_for("get_job", job_id=job.job_id))}
+    )
+
+@router.get("/{job_id}", name="get_job")
+async def get_job(request: Request, job_id: str, x_api_key: str = Depends(verify_api_key)):
+    job = await job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return _status(request, job)
+
+@router.get("/{job_id}/result", name="get_job_result")
+async def get_job_result(job_id: str, x_api_key: str = Depends(verify_api_key)):
+    job = await job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job.status == FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}, the result is not ready yet")
+
+    try:
+        chunks = await job_service.read_result(job)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return StreamingResponse(
+        chunks,
+        media_type=job.result["media_type"],
+        headers={
+            "Content-Disposition": f"attachment; filename={job.result['filename']}",
+            "Content-Length": str(job.result["size"])
+        }
+    )
+
+@router.delete("/{job_id}")
+async def delete_job(job_id: str, x_api_key: str = Depends(verify_api_key)):
+    """Cancel a pending job or remove a finished one and its result."""
+    if not await job_service.delete(job_id):
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return {"deleted": job_id}
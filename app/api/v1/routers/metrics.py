@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.core.metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: request latency, stage timings, pages/bytes processed, pool and cache state."""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
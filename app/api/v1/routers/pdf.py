@@ -1,58 +1,222 @@
 import io
-from typing import Optional
+import json
+from typing import List, Optional
+from app.core.cache import pdf_cache
 from app.core.config import settings
-from app.api.v1.rate_limiter import limiter
+from app.api.v1.admission import admit
+from app.api.v1.ingest import ingest, ingest_archive, ingest_image
+from app.api.v1.rate_limiter import limit
+from app.core.scheduler import BULK, INTERACTIVE
 from app.api.v1.dependencies import verify_api_key
-from fastapi.responses import StreamingResponse, JSONResponse
+from app.services.template_index import template_index
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Request, Form
 from app.services.pdf_service import (
     convert_pdf_to_single_image, 
+    stream_pdf_as_png,
+    stream_pdf_pages_as_zip,
     convert_pdf_to_text,
+    convert_pdf_to_text_with_ocr,
+    convert_pdf_to_structured_text,
+    stream_pdf_text_ndjson,
     replace_template_with_image,
+    replace_templates_with_images,
+    register_template,
+    sign_pdf_batch,
     split_pdf_by_pages,
-    remove_empty_pages
+    stream_pdf_split,
+    remove_empty_pages,
+    parse_pipeline,
+    run_pdf_pipeline,
+    PIPELINE_MEDIA_TYPES,
+    optimize_pdf,
+    ocr_dpi,
+    validate_optimize_options
 )
 
 router = APIRouter(prefix="/v1/pdf", tags=["pdf"])
 
 @router.post("/convert-to-image")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("convert-to-image")
 async def pdf_to_image(
     request: Request,
     file: UploadFile = File(...),
+    stream: bool = Form(False),
     x_api_key: str = Depends(verify_api_key)
 ):
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="File must be a PDF")
-    data = await file.read()
-    
-    image_bytes = await convert_pdf_to_single_image(data, dpi=150)
+    """
+    Render all pages of a PDF below each other into one PNG.
+
+    - **stream**: Stream the PNG page by page instead of building it in a worker first.
+      Keeps memory flat for very long documents.
+    """
+    upload = await ingest(request, file)
+    data = upload.source
+
+    headers = {"Content-Disposition": "inline; filename=combined.png"}
+    params = {"dpi": 150}
+
+    async def compute():
+        # Only misses need a worker slot
+        await admit(request, BULK, data)
+        return await convert_pdf_to_single_image(data, dpi=150)
+
+    if stream:
+        # A cached render is served as is, otherwise stream without buffering it for the cache
+        entry = await pdf_cache.get(pdf_cache.make_key(upload.sha256, "convert-to-image", params))
+        if entry is None:
+            await admit(request, BULK, data)
+            try:
+                chunks = await stream_pdf_as_png(data, dpi=150)
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+            return StreamingResponse(chunks, media_type="image/png", headers=headers)
+    else:
+        entry = await pdf_cache.fetch_hashed(upload.sha256, "convert-to-image", params, compute)
+
+    if entry.matches(request):
+        return Response(status_code=304, headers={"ETag": entry.etag})
     return StreamingResponse(
-        io.BytesIO(image_bytes),
+        io.BytesIO(entry.value),
         media_type="image/png",
-        headers={"Content-Disposition": "inline; filename=combined.png"}
+        headers={**headers, "ETag": entry.etag}
     )
     
+@router.post("/convert-to-images")
+@limit("convert-to-images")
+async def pdf_to_images(
+    request: Request,
+    file: UploadFile = File(...),
+    pages: Optional[str] = Form(None),
+    dpi: int = Form(150),
+    image_format: str = Form("png"),
+    grayscale: bool = Form(False),
+    alpha: bool = Form(False),
+    quality: int = Form(85),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Render PDF pages to separate images, returned as a streamed ZIP.
+
+    - **pages**: Pages to render, e.g. "1-3,5". All pages when empty.
+    - **dpi**: Render resolution.
+    - **image_format**: png, jpeg or webp.
+    - **grayscale**: Render in grayscale.
+    - **alpha**: Keep transparency (png/webp only).
+    - **quality**: Quality for jpeg/webp (1-100).
+    """
+    data = (await ingest(request, file)).source
+    await admit(request, BULK, data)
+
+    try:
+        chunks = await stream_pdf_pages_as_zip(data, pages, dpi, image_format, grayscale, alpha, quality)
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=pages.zip"}
+    )
+
 @router.post("/convert-to-text")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("convert-to-text")
 async def convert_to_text(
     request: Request,
     file: UploadFile = File(...),
     dpi: int = 300,
     language: str = "en",
+    mode: str = "text",
+    ocr: bool = True,
     x_api_key: str = Depends(verify_api_key)
 ):
-    """Extract text from PDF with automatic fallback to OCR if needed"""
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="File must be a PDF")
+    """
+    Extract text from PDF with automatic fallback to OCR if needed
+
+    - **dpi**: Render resolution for OCR pages (capped by OCR_MAX_DPI).
+    - **language**: Comma separated OCR languages, e.g. "en,id".
+    - **mode**: "text" for the joined text, "structured" for per-page text, blocks with
+      bounding boxes and word counts, or "ndjson" to stream the structured pages one per line.
+    - **ocr**: OCR pages without a text layer (text mode only).
+    """
+    if mode not in ("text", "structured", "ndjson"):
+        raise HTTPException(status_code=400, detail="Mode must be one of: text, structured, ndjson")
     
     # Parse language parameter
     lang_list = language.split(',')
     
-    data = await file.read()
+    upload = await ingest(request, file)
+    data = upload.source
+    lane = BULK if ocr and settings.OCR_ENABLED and mode == "text" else INTERACTIVE
+
+    def admitted(convert):
+        async def compute():
+            # Only misses need a worker slot
+            await admit(request, lane, data)
+            return await convert()
+        return compute
+
+    if mode == "ndjson":
+        await admit(request, lane, data)
+        try:
+            lines = await stream_pdf_text_ndjson(data)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    if mode == "structured":
+        entry = await pdf_cache.fetch_hashed(
+            upload.sha256,
+            "convert-to-text:structured",
+            {},
+            admitted(lambda: convert_pdf_to_structured_text(data)),
+            cacheable=lambda result: result["success"]
+        )
+        result = entry.value
+        if not result["success"]:
+            return JSONResponse(
+                status_code=422,
+                content={
+                    "detail": result["error"],
+                    "page_count": result["page_count"],
+                }
+            )
+        if entry.matches(request):
+            return Response(status_code=304, headers={"ETag": entry.etag})
+        return JSONResponse(
+            content={
+                "pages": result["pages"],
+                "page_count": result["page_count"]
+            },
+            headers={"Content-Disposition": "attachment; filename=extracted_text.json", "ETag": entry.etag}
+        )
     
-    # First try regular text extraction
-    result = await convert_pdf_to_text(data)
+    # Regular text extraction, with OCR only for pages that have no text layer
+    if ocr and settings.OCR_ENABLED:
+        entry = await pdf_cache.fetch_hashed(
+            upload.sha256,
+            "convert-to-text:ocr",
+            {"dpi": ocr_dpi(dpi), "language": lang_list},
+            admitted(lambda: convert_pdf_to_text_with_ocr(data, dpi, lang_list)),
+            cacheable=lambda result: result["success"]
+        )
+    else:
+        entry = await pdf_cache.fetch_hashed(
+            upload.sha256,
+            "convert-to-text",
+            {},
+            admitted(lambda: convert_pdf_to_text(data)),
+            cacheable=lambda result: result["success"]
+        )
+    result = entry.value
     
     if not result["success"]:
         return JSONResponse(
@@ -63,17 +227,22 @@ async def convert_to_text(
             }
         )
     
+    if entry.matches(request):
+        return Response(status_code=304, headers={"ETag": entry.etag})
+
     # Return successful text response
     return JSONResponse(
         content={
             "text": result["text"],
-            "page_count": result["page_count"]
+            "page_count": result["page_count"],
+            "used_ocr": result.get("used_ocr", False),
+            "ocr_pages": result.get("ocr_pages", [])
         },
-        headers={"Content-Disposition": "attachment; filename=extracted_text.json"}
+        headers={"Content-Disposition": "attachment; filename=extracted_text.json", "ETag": entry.etag}
     )
     
 @router.post("/sign")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("sign")
 async def sign_document_with_image(
     request: Request,
     pdf_file: UploadFile = File(...),
@@ -81,19 +250,23 @@ async def sign_document_with_image(
     template_text: str = Form("${sign}"),
     image_width: Optional[float] = Form(None),
     image_height: Optional[float] = Form(None),
+    optimize: bool = Form(False),
     x_api_key: str = Depends(verify_api_key)
 ):
-    if pdf_file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="First file must be a PDF")
-    
+    """
+    Replace every occurrence of the template text with the image.
+
+    - **optimize**: Subset fonts and save with deduplication, deflate and object streams.
+    """
     # Validate image file
     valid_image_types = ["image/png", "image/jpeg", "image/jpg", "image/gif"]
     if image_file.content_type not in valid_image_types and not image_file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Second file must be an image")
     
     # Read the files
-    pdf_data = await pdf_file.read()
-    image_data = await image_file.read()
+    pdf_data = (await ingest(request, pdf_file)).source
+    image_data = await ingest_image(request, image_file)
+    await admit(request, INTERACTIVE, pdf_data)
     
     # Replace template with image
     result = await replace_template_with_image(
@@ -101,7 +274,8 @@ async def sign_document_with_image(
         template_text, 
         image_data,
         image_width,
-        image_height
+        image_height,
+        optimize
     )
     
     if not result["success"]:
@@ -111,51 +285,247 @@ async def sign_document_with_image(
     return StreamingResponse(
         io.BytesIO(result["pdf_data"]),
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=modified_{pdf_file.filename}"}
+        headers={
+            "Content-Disposition": f"attachment; filename=modified_{pdf_file.filename}",
+            "X-Template-Index": "hit" if result["template_index_used"] else "miss"
+        }
+    )
+
+@router.post("/sign-multi")
+@limit("sign-multi")
+async def sign_document_with_images(
+    request: Request,
+    pdf_file: UploadFile = File(...),
+    image_files: List[UploadFile] = File(...),
+    template_texts: List[str] = Form(...),
+    image_width: Optional[float] = Form(None),
+    image_height: Optional[float] = Form(None),
+    optimize: bool = Form(False),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Replace several placeholders with their own image in one pass.
+
+    - **image_files**: One image per template text, in the same order.
+    - **template_texts**: The placeholders, e.g. ${sign}, ${paraf}, ${stamp}.
+    - **optimize**: Subset fonts and save with deduplication, deflate and object streams.
+    """
+    if len(image_files) != len(template_texts):
+        raise HTTPException(status_code=400, detail="Provide exactly one image per template text")
+    for image_file in image_files:
+        if not image_file.content_type or not image_file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"'{image_file.filename}' is not an image")
+    
+    pdf_data = (await ingest(request, pdf_file)).source
+    mappings = [
+        (template_text, await ingest_image(request, image_file), image_width, image_height)
+        for template_text, image_file in zip(template_texts, image_files)
+    ]
+    await admit(request, INTERACTIVE, pdf_data)
+    
+    result = await replace_templates_with_images(pdf_data, mappings, optimize)
+    if not result["success"]:
+        raise HTTPException(status_code=422, detail=result["error"])
+    
+    return StreamingResponse(
+        io.BytesIO(result["pdf_data"]),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename=modified_{pdf_file.filename}",
+            "X-Template-Index": "hit" if result["template_index_used"] else "miss",
+            "X-Template-Placements": ",".join(f"{text}={count}" for text, count in result["placements"].items())
+        }
+    )
+
+@router.post("/templates")
+@limit("sign-templates")
+async def register_sign_template(
+    request: Request,
+    file: UploadFile = File(...),
+    template_texts: List[str] = Form(["${sign}", "${paraf}", "${stamp}"]),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Register a sample of a generated form. Later sign requests for documents with the
+    same layout use the stored placeholder positions instead of searching every page.
+    """
+    data = (await ingest(request, file)).source
+    await admit(request, INTERACTIVE, data)
+    try:
+        return await register_template(data, template_texts)
+    except HTTPException as e:
+        raise e
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+
+@router.get("/templates")
+async def list_sign_templates(x_api_key: str = Depends(verify_api_key)):
+    return {"templates": template_index.list()}
+
+@router.delete("/templates/{template_id}")
+async def delete_sign_template(template_id: str, x_api_key: str = Depends(verify_api_key)):
+    if not template_index.remove(template_id):
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"deleted": template_id}
+    
+@router.post("/sign-batch")
+@limit("sign-batch")
+async def sign_documents_batch(
+    request: Request,
+    image_file: UploadFile = File(...),
+    pdf_files: List[UploadFile] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    template_text: str = Form("${sign}"),
+    image_width: Optional[float] = Form(None),
+    image_height: Optional[float] = Form(None),
+    optimize: bool = Form(False),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Stamp one signature image into many PDFs in one request.
+
+    - **pdf_files**: The PDFs to sign, and/or
+    - **archive**: A ZIP file containing the PDFs to sign.
+    - **optimize**: Subset fonts and save every output with deduplication, deflate and object streams.
+
+    Returns a ZIP with the signed PDFs and a manifest.json holding the status of every input.
+    """
+    if not image_file.content_type or not image_file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Image file must be an image")
+
+    documents = []
+    for pdf_file in pdf_files or []:
+        documents.append((pdf_file.filename, (await ingest(request, pdf_file)).source))
+    if archive is not None:
+        members = await ingest_archive(request, archive, (".pdf",), settings.BATCH_MAX_FILE_BYTES)
+        documents.extend((member.filename, member.source) for member in members)
+
+    if not documents:
+        raise HTTPException(status_code=400, detail="No PDF files provided")
+    if len(documents) > settings.BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {settings.BATCH_MAX_FILES} files")
+
+    image_data = await ingest_image(request, image_file)
+    await admit(request, BULK, *(pdf_data for _, pdf_data in documents))
+
+    return StreamingResponse(
+        sign_pdf_batch(documents, template_text, image_data, image_width, image_height, optimize),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=signed_documents.zip"}
     )
     
 @router.post("/split-by-range")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("split-by-range")
 async def split_pdf_range(
     request: Request,
     file: UploadFile = File(...),
     start_page: int = Form(1),
     end_page: Optional[int] = Form(None),
+    optimize: bool = Form(False),
     x_api_key: str = Depends(verify_api_key)
 ):
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="File must be a PDF")
-    
+    """
+    Extract the pages from start_page to end_page (the last page when empty).
+
+    - **optimize**: Subset fonts and save with deduplication, deflate and object streams.
+    """
     try:
-        data = await file.read()
-        result_pdf = await split_pdf_by_pages(data, start_page, end_page)
+        upload = await ingest(request, file)
+        data = upload.source
+
+        async def compute():
+            # Only misses need a worker slot
+            await admit(request, INTERACTIVE, data)
+            return await split_pdf_by_pages(data, start_page, end_page, optimize)
+
+        entry = await pdf_cache.fetch_hashed(
+            upload.sha256,
+            "split-by-range",
+            {"start_page": start_page, "end_page": end_page, "optimize": optimize},
+            compute
+        )
+        if entry.matches(request):
+            return Response(status_code=304, headers={"ETag": entry.etag})
         
         filename = f"split_pages_{start_page}_to_{end_page or 'end'}.pdf"
         
         return StreamingResponse(
-            io.BytesIO(result_pdf),
+            io.BytesIO(entry.value),
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers={"Content-Disposition": f"attachment; filename={filename}", "ETag": entry.etag}
         )
         
+    except HTTPException as e:
+        raise e
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
 
+@router.post("/split-multi")
+@limit("split-multi")
+async def split_pdf_multi(
+    request: Request,
+    file: UploadFile = File(...),
+    spec: str = Form(...),
+    save_profile: str = Form("balanced"),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Split one PDF into many, returned as a streamed ZIP.
+
+    - **spec**: "1-3,5;8-12;13-20" (one output per ";" group), "every:N" or "bookmarks[:LEVEL]".
+    - **save_profile**: "speed", "balanced" or "size" trade-off for saving each output.
+    """
+    data = (await ingest(request, file)).source
+    await admit(request, INTERACTIVE, data)
+
+    try:
+        chunks = await stream_pdf_split(data, spec, save_profile)
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=split.zip"}
+    )
+
 @router.post("/remove-empty-pages")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("remove-empty-pages")
 async def remove_empty_pdf_pages(
     request: Request,
     file: UploadFile = File(...),
+    header_margin: float = Form(0.15),
+    footer_margin: float = Form(0.15),
+    text_threshold: int = Form(20),
+    ink_threshold: float = Form(0.001),
+    optimize: bool = Form(False),
     x_api_key: str = Depends(verify_api_key)
 ):
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="File must be a PDF")
+    """
+    Remove pages whose body (the page without header and footer margins) is empty.
+
+    - **header_margin** / **footer_margin**: Fraction of the page height ignored at the top / bottom.
+    - **text_threshold**: Pages with more characters than this in the body are kept.
+    - **ink_threshold**: Fraction of inked body pixels from which a page counts as non-empty.
+    - **optimize**: Subset fonts and save with deduplication, deflate and object streams.
+    """
+    if header_margin < 0 or footer_margin < 0 or header_margin + footer_margin >= 1:
+        raise HTTPException(status_code=400, detail="Margins must be positive and leave part of the page as body")
+    if not 0 <= ink_threshold <= 1:
+        raise HTTPException(status_code=400, detail="Ink threshold must be between 0 and 1")
     
     try:
-        data = await file.read()
-        result_pdf = await remove_empty_pages(data)
+        data = (await ingest(request, file)).source
+        await admit(request, INTERACTIVE, data)
+        result_pdf = await remove_empty_pages(data, header_margin, footer_margin, text_threshold, ink_threshold, optimize)
         
         # Create a filename for the processed file
         original_filename = file.filename.rsplit('.', 1)[0]
@@ -167,7 +537,111 @@ async def remove_empty_pdf_pages(
             headers={"Content-Disposition": f"attachment; filename={new_filename}"}
         )
         
+    except HTTPException as e:
+        raise e
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+@router.post("/optimize")
+@limit("optimize")
+async def optimize_pdf_file(
+    request: Request,
+    file: UploadFile = File(...),
+    image_dpi: int = Form(150),
+    image_quality: int = Form(75),
+    subset_fonts: bool = Form(True),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Make a PDF smaller.
+
+    - **image_dpi**: Downsample images shown above this resolution; 0 leaves images untouched.
+    - **image_quality**: JPEG quality (1-100) for downsampled and recompressed images.
+    - **subset_fonts**: Keep only the glyphs the document uses in embedded fonts.
+
+    Unused and duplicate objects are dropped and streams are deflated into object streams.
+    The original is returned when the result would not be smaller. X-Original-Size and
+    X-Optimized-Size report both sizes in bytes.
+    """
+    try:
+        validate_optimize_options(image_dpi, image_quality)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    data = (await ingest(request, file)).source
+    await admit(request, BULK, data)
+    try:
+        result = await optimize_pdf(data, image_dpi, image_quality, subset_fonts)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+
+    original_filename = (file.filename or "document.pdf").rsplit('.', 1)[0]
+    return StreamingResponse(
+        io.BytesIO(result["pdf_data"]),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={original_filename}_optimized.pdf",
+            "X-Original-Size": str(result["original_size"]),
+            "X-Optimized-Size": str(result["optimized_size"]),
+            "X-Images-Rewritten": str(result["images_rewritten"])
+        }
+    )
+
+@router.post("/pipeline")
+@limit("pipeline")
+async def run_pipeline(
+    request: Request,
+    file: UploadFile = File(...),
+    steps: str = Form(...),
+    image_files: List[UploadFile] = File(None),
+    x_api_key: str = Depends(verify_api_key)
+):
+    """
+    Run several operations on one upload. The PDF is parsed once, every step works on the
+    same open document and the result is saved or rendered once at the end.
+
+    - **steps**: JSON list, e.g. [{"op": "remove-empty-pages"}, {"op": "split-by-range", "start_page": 2},
+      {"op": "sign", "template_text": "${sign}"}, {"op": "convert-to-image", "dpi": 150}].
+      Steps: remove-empty-pages, split-by-range, sign. The last step may be an output:
+      save (default, with save_profile), optimize (image_dpi, image_quality, subset_fonts),
+      convert-to-image, convert-to-images or split-multi (spec).
+      Options are the same as those of the single-operation endpoints.
+    - **image_files**: Images for the sign steps, referenced by filename with "image".
+
+    The X-Pipeline-Timing header lists the duration of every step.
+    """
+    for image_file in image_files or []:
+        if not image_file.content_type or not image_file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"'{image_file.filename}' is not an image")
+    images = {image_file.filename: await ingest_image(request, image_file) for image_file in image_files or []}
+    try:
+        parsed = parse_pipeline(json.loads(steps), images)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Steps must be valid JSON")
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    data = (await ingest(request, file)).source
+    output_op = parsed[-1]["op"]
+    await admit(request, BULK if output_op in ("convert-to-image", "convert-to-images") else INTERACTIVE, data)
+
+    try:
+        result = await run_pdf_pipeline(data, parsed)
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+
+    media_type, filename = PIPELINE_MEDIA_TYPES[output_op]
+    timing = ", ".join(f"{step};dur={seconds * 1000:.1f}" for step, seconds in result["timings"])
+    return StreamingResponse(
+        io.BytesIO(result["output"]),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}", "X-Pipeline-Timing": timing}
+    )
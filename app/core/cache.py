@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Union
+from fastapi import Request
+from app.core.config import settings
+from app.core.metrics import state
+from app.utils.logger import logger
+
+# Bump when an operation's output format changes so stale entries are never served
+CACHE_VERSION = "1"
+
+CacheValue = Union[bytes, dict]
+
+class CacheEntry:
+    def __init__(self, key: str, value: CacheValue, created_at: float = None):
+        self.key = key
+        self.value = value
+        self.etag = f'"{key[:32]}"'
+        self.created_at = created_at or time.time()
+        self.size = len(value) if isinstance(value, bytes) else len(json.dumps(value))
+
+    def matches(self, request: Request) -> bool:
+        """True when the client's If-None-Match already names this entry."""
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+        return self.etag in tags
+
+class ResultCache:
+    """
+    Content-addressed cache for operation results.
+
+    Keys are derived from the sha256 of the input, the operation name and its parameters.
+    Entries live in an in-memory LRU bounded by `memory_bytes` and, when `disk_dir` is set,
+    in a second on-disk tier bounded by `disk_bytes`. Both tiers expire entries after `ttl` seconds.
+    """
+
+    def __init__(self, name: str, memory_bytes: int, disk_dir: Optional[str] = None, disk_bytes: int = 0, ttl: float = 3600, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        if self.enabled and self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        state.track_cache(self)
+
+    @staticmethod
+    def make_key(data_hash: str, operation: str, params: dict) -> str:
+        raw = json.dumps([CACHE_VERSION, data_hash, operation, params], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    # Memory tier
+
+    def _memory_get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.created_at > self.ttl:
+            self._memory_pop(key)
+            return None
+        self._memory.move_to_end(key)
+        return entry
+
+    def _memory_pop(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_used -= entry.size
+
+    def _memory_set(self, entry: CacheEntry):
+        # Single results larger than a quarter of the budget would flush everything else
+        if entry.size > self.memory_bytes // 4:
+            return
+        self._memory_pop(entry.key)
+        self._memory[entry.key] = entry
+        self._memory_used += entry.size
+        while self._memory_used > self.memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted.size
+
+    # Disk tier
+
+    def _disk_path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}{suffix}")
+
+    def _disk_get(self, key: str) -> Optional[CacheEntry]:
+        for suffix in (".bin", ".json"):
+            path = self._disk_path(key, suffix)
+            try:
+                created_at = os.path.getmtime(path)
+                if time.time() - created_at > self.ttl:
+                    os.remove(path)
+                    return None
+                with open(path, "rb") as f:
+                    raw = f.read()
+                return CacheEntry(key, raw if suffix == ".bin" else json.loads(raw), created_at)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _disk_set(self, entry: CacheEntry):
+        if isinstance(entry.value, bytes):
+            path, raw = self._disk_path(entry.key, ".bin"), entry.value
+        else:
+            path, raw = self._disk_path(entry.key, ".json"), json.dumps(entry.value).encode()
+        if len(raw) > self.disk_bytes:
+            return
+
+        # Write to a temp name first so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+        self._disk_evict()
+
+    def _disk_evict(self):
+        files = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                os.remove(path)
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        # Oldest first until the tier fits its budget again
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    # Public API
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        if not self.enabled:
+            return None
+        entry = self._memory_get(key)
+        if entry is None and self.disk_dir:
+            entry = await asyncio.to_thread(self._disk_get, key)
+            if entry is not None:
+                self._memory_set(entry)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def set(self, key: str, value: CacheValue) -> CacheEntry:
+        entry = CacheEntry(key, value)
+        if not self.enabled:
+            return entry
+        self._memory_set(entry)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._disk_set, entry)
+            except OSError as e:
+                logger.warning(f"Could not write cache entry to disk: {e}")
+        return entry
+
+    async def fetch(
+        self,
+        data: bytes,
+        operation: str,
+        params: dict,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> CacheEntry:
+        """Return the cached result for (data, operation, params), computing and storing it on a miss."""
+        # hashlib releases the GIL on large buffers, so hashing off-loop keeps other requests moving
+        data_hash = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+        return await self.fetch_hashed(data_hash, operation, params, compute, cacheable)
+
+    async def fetch_hashed(
+        self,
+        data_hash: str,
+        operation: str,
+        params: dict,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> CacheEntry:
+        """`fetch` for input whose sha256 is already known, e.g. hashed while it was uploaded."""
+        key = self.make_key(data_hash, operation, params)
+        entry = await self.get(key)
+        if entry is not None:
+            return entry
+
+        value = await compute()
+        if not cacheable(value):
+            return CacheEntry(key, value)
+        return await self.set(key, value)
+
+pdf_cache = ResultCache(
+    "pdf",
+    memory_bytes=settings.CACHE_MEMORY_BYTES,
+    disk_dir=settings.CACHE_DIR,
+    disk_bytes=settings.CACHE_DISK_BYTES,
+    ttl=settings.CACHE_TTL,
+    enabled=settings.CACHE_ENABLED
+)
+
+# Small, hot and cheap to rebuild: barcodes only get the memory tier
+barcode_cache = ResultCache(
+    "barcode",
+    memory_bytes=settings.BARCODE_CACHE_BYTES,
+    ttl=settings.CACHE_TTL,
+    enabled=settings.CACHE_ENABLED
+)
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path=os.getenv("ENV_PATH", ".env"))
@@ -7,4 +9,121 @@ class Settings:
     API_KEY: str = os.getenv("API_KEY")
     RATE_LIMIT: str = os.getenv("RATE_LIMIT", "5/minute")
 
+    # Rate limit storage and weighting; per-route overrides come from RATE_LIMIT_<ROUTE>
+    RATE_LIMIT_STORAGE_URI: str = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+    RATE_LIMIT_STRATEGY: str = os.getenv("RATE_LIMIT_STRATEGY", "fixed-window")
+    RATE_LIMIT_COST_BYTES: int = int(os.getenv("RATE_LIMIT_COST_BYTES", "0"))
+    # Limit per client address, next to the one per API key; RATE_LIMIT_PER_IP_<ROUTE> overrides it per route
+    RATE_LIMIT_PER_IP: str = os.getenv("RATE_LIMIT_PER_IP", "")
+    PAGE_QUOTA: str = os.getenv("PAGE_QUOTA", "")
+
+    # Worker pool for blocking PDF work
+    WORKER_POOL_KIND: str = os.getenv("WORKER_POOL_KIND", "process")
+    WORKER_RETRY_AFTER: int = int(os.getenv("WORKER_RETRY_AFTER", "5"))
+    PDF_WORKERS: int = int(os.getenv("PDF_WORKERS", os.cpu_count() or 1))
+    PDF_MAX_QUEUE: int = int(os.getenv("PDF_MAX_QUEUE", "16"))
+    PDF_JOB_TIMEOUT: float = float(os.getenv("PDF_JOB_TIMEOUT", "120"))
+    MAX_RENDER_DPI: int = int(os.getenv("MAX_RENDER_DPI", "600"))
+    EMPTY_PAGE_DPI: int = int(os.getenv("EMPTY_PAGE_DPI", "50"))
+    # Pages per worker job for streamed responses (PNG, page images, NDJSON, split parts)
+    STREAM_BATCH_PAGES: int = max(1, int(os.getenv("STREAM_BATCH_PAGES", "8")))
+
+    # Admission lanes in front of the pools; bulk work never gets every worker
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    INTERACTIVE_CONCURRENCY: int = int(os.getenv("INTERACTIVE_CONCURRENCY", PDF_WORKERS))
+    BULK_CONCURRENCY: int = int(os.getenv("BULK_CONCURRENCY", max(1, PDF_WORKERS // 2)))
+    INTERACTIVE_MAX_COST: float = float(os.getenv("INTERACTIVE_MAX_COST", "50"))
+    ADMISSION_MAX_WAITING: int = int(os.getenv("ADMISSION_MAX_WAITING", "64"))
+    ADMISSION_WAIT_TIMEOUT: float = float(os.getenv("ADMISSION_WAIT_TIMEOUT", "30"))
+
+    # Registered form layouts for signing
+    TEMPLATE_INDEX_SIZE: int = int(os.getenv("TEMPLATE_INDEX_SIZE", "128"))
+    TEMPLATE_INDEX_DIR: str = os.getenv("TEMPLATE_INDEX_DIR", "sign_templates")
+
+    # Batch endpoints
+    BATCH_MAX_FILES: int = int(os.getenv("BATCH_MAX_FILES", "500"))
+    BATCH_MAX_FILE_BYTES: int = int(os.getenv("BATCH_MAX_FILE_BYTES", 50 * 1024 * 1024))
+    # Limits on what a ZIP batch upload may expand to, counted while it is extracted
+    BATCH_MAX_TOTAL_BYTES: int = int(os.getenv("BATCH_MAX_TOTAL_BYTES", 1024 * 1024 * 1024))
+    BATCH_MAX_COMPRESSION_RATIO: int = int(os.getenv("BATCH_MAX_COMPRESSION_RATIO", "100"))
+    BARCODE_BULK_MAX_ITEMS: int = int(os.getenv("BARCODE_BULK_MAX_ITEMS", "5000"))
+    PIPELINE_MAX_STEPS: int = int(os.getenv("PIPELINE_MAX_STEPS", "20"))
+
+    # Image recompression threads inside one optimize job
+    OPTIMIZE_IMAGE_THREADS: int = int(os.getenv("OPTIMIZE_IMAGE_THREADS", min(4, os.cpu_count() or 1)))
+
+    # Asynchronous jobs; results are kept for JOB_TTL seconds after they finish
+    JOB_STORAGE: str = os.getenv("JOB_STORAGE", "local")
+    JOB_DIR: str = os.getenv("JOB_DIR", os.path.join(tempfile.gettempdir(), "utility_api_jobs"))
+    JOB_TTL: int = int(os.getenv("JOB_TTL", "3600"))
+    JOB_MAX_PENDING: int = int(os.getenv("JOB_MAX_PENDING", "100"))
+    JOB_PROGRESS_INTERVAL: float = float(os.getenv("JOB_PROGRESS_INTERVAL", "1"))
+    JOB_JANITOR_INTERVAL: int = int(os.getenv("JOB_JANITOR_INTERVAL", "300"))
+
+    # OCR fallback for pages without a text layer
+    OCR_ENABLED: bool = os.getenv("OCR_ENABLED", "true").lower() == "true"
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+    OCR_MAX_QUEUE: int = int(os.getenv("OCR_MAX_QUEUE", "16"))
+    OCR_JOB_TIMEOUT: float = float(os.getenv("OCR_JOB_TIMEOUT", "600"))
+    OCR_MAX_DPI: int = int(os.getenv("OCR_MAX_DPI", "300"))
+    TESSERACT_CMD: str = os.getenv("TESSERACT_CMD", "")
+
+    # Upload ingestion; per-route overrides come from MAX_UPLOAD_BYTES_<ROUTE>
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+    UPLOAD_SPOOL_BYTES: int = int(os.getenv("UPLOAD_SPOOL_BYTES", 8 * 1024 * 1024))
+    # Signature and stamp images uploaded with a PDF
+    IMAGE_MAX_BYTES: int = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "utility_api_uploads"))
+
+    # DOCX conversion work directories (tmpfs when available)
+    DOCX_MAX_BYTES: int = int(os.getenv("DOCX_MAX_BYTES", 10 * 1024 * 1024))
+    DOCX_WORK_DIR: str = os.getenv("DOCX_WORK_DIR", os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "utility_api_docx"))
+    DOCX_WORK_TTL: int = int(os.getenv("DOCX_WORK_TTL", "3600"))
+    DOCX_JANITOR_INTERVAL: int = int(os.getenv("DOCX_JANITOR_INTERVAL", "600"))
+
+    # Stored DOCX merge templates
+    DOCX_TEMPLATE_DIR: str = os.getenv("DOCX_TEMPLATE_DIR", "docx_templates")
+    DOCX_TEMPLATE_CACHE_SIZE: int = int(os.getenv("DOCX_TEMPLATE_CACHE_SIZE", "32"))
+    MERGE_MAX_RECORDS: int = int(os.getenv("MERGE_MAX_RECORDS", "1000"))
+
+    # Warm LibreOffice pool for DOCX conversion
+    LIBREOFFICE_PATH: str = os.getenv("LIBREOFFICE_PATH", "")
+    # Python used to run the UNO bridge when this interpreter has no `uno` module (empty = searched)
+    LIBREOFFICE_PYTHON: str = os.getenv("LIBREOFFICE_PYTHON", "")
+    LIBREOFFICE_WORKERS: int = int(os.getenv("LIBREOFFICE_WORKERS", "2"))
+    LIBREOFFICE_MAX_QUEUE: int = int(os.getenv("LIBREOFFICE_MAX_QUEUE", "16"))
+    LIBREOFFICE_JOB_TIMEOUT: float = float(os.getenv("LIBREOFFICE_JOB_TIMEOUT", "120"))
+    LIBREOFFICE_MAX_JOBS: int = int(os.getenv("LIBREOFFICE_MAX_JOBS", "200"))
+    LIBREOFFICE_BATCH_SIZE: int = int(os.getenv("LIBREOFFICE_BATCH_SIZE", "25"))
+    LIBREOFFICE_STARTUP_TIMEOUT: float = float(os.getenv("LIBREOFFICE_STARTUP_TIMEOUT", "60"))
+    LIBREOFFICE_HEALTH_TIMEOUT: float = float(os.getenv("LIBREOFFICE_HEALTH_TIMEOUT", "5"))
+    LIBREOFFICE_PROFILE_DIR: str = os.getenv("LIBREOFFICE_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "utility_api_lo_profiles"))
+
+    # Prometheus metrics at /metrics and optional Server-Timing response headers
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+    # Result cache for PDF operations
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MEMORY_BYTES: int = int(os.getenv("CACHE_MEMORY_BYTES", 256 * 1024 * 1024))
+    CACHE_DIR: str = os.getenv("CACHE_DIR", "")
+    CACHE_DISK_BYTES: int = int(os.getenv("CACHE_DISK_BYTES", 2 * 1024 * 1024 * 1024))
+    CACHE_TTL: int = int(os.getenv("CACHE_TTL", "86400"))
+    BARCODE_CACHE_BYTES: int = int(os.getenv("BARCODE_CACHE_BYTES", 32 * 1024 * 1024))
+
+    def rate_limit_for(self, route: str) -> str:
+        """RATE_LIMIT_CONVERT_TO_TEXT for "convert-to-text", falling back to RATE_LIMIT."""
+        return os.getenv(f"RATE_LIMIT_{route.upper().replace('-', '_')}", self.RATE_LIMIT)
+
+    def ip_rate_limit_for(self, route: str) -> str:
+        """RATE_LIMIT_PER_IP_CONVERT_TO_TEXT for "convert-to-text", then RATE_LIMIT_PER_IP, then the per-key limit."""
+        return os.getenv(f"RATE_LIMIT_PER_IP_{route.upper().replace('-', '_')}", self.RATE_LIMIT_PER_IP or self.rate_limit_for(route))
+
+    def upload_limit_for(self, route: Optional[str]) -> int:
+        """MAX_UPLOAD_BYTES_SIGN_BATCH for "sign-batch", falling back to MAX_UPLOAD_BYTES."""
+        if not route:
+            return self.MAX_UPLOAD_BYTES
+        return int(os.getenv(f"MAX_UPLOAD_BYTES_{route.upper().replace('-', '_')}", self.MAX_UPLOAD_BYTES))
+
 settings = Settings()
\ No newline at end of file
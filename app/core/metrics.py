@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, List, Optional, Tuple
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.datastructures import MutableHeaders
+from app.core.config import settings
+
+REQUEST_SECONDS = Histogram(
+    "utility_api_request_duration_seconds",
+    "Time from receiving a request until its response has been sent",
+    ["method", "route", "status"]
+)
+STAGE_SECONDS = Histogram(
+    "utility_api_stage_duration_seconds",
+    "Time spent in one stage of an operation (open, render, encode, save, ...)",
+    ["operation", "stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+PAGES_PROCESSED = Counter("utility_api_pages_processed", "Pages processed", ["operation"])
+BYTES_PROCESSED = Counter("utility_api_bytes_processed", "Document bytes read and written", ["operation", "direction"])
+
+# Samples recorded inside a pool worker, shipped back to the API process with the result
+_worker_samples = threading.local()
+# Stage durations of the current request, for the Server-Timing header
+_request_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+
+Sample = Tuple[str, tuple, float]
+
+def _apply(kind: str, labels: tuple, value: float):
+    if kind == "stage":
+        STAGE_SECONDS.labels(*labels).observe(value)
+        timings = _request_timings.get()
+        if timings is not None:
+            name = "-".join(labels)
+            timings[name] = timings.get(name, 0.0) + value
+    elif kind == "pages":
+        PAGES_PROCESSED.labels(*labels).inc(value)
+    else:
+        BYTES_PROCESSED.labels(*labels).inc(value)
+
+def _record(kind: str, labels: tuple, value: float):
+    samples = getattr(_worker_samples, "samples", None)
+    if samples is not None:
+        samples.append((kind, labels, value))
+    else:
+        _apply(kind, labels, value)
+
+def observe_stage(operation: str, name: str, seconds: float):
+    _record("stage", (operation, name), seconds)
+
+@contextmanager
+def stage(operation: str, name: str):
+    """Time the enclosed block as stage `name` of `operation`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(operation, name, time.perf_counter() - started)
+
+def add_pages(operation: str, pages: int):
+    if pages:
+        _record("pages", (operation,), pages)
+
+def add_bytes(operation: str, direction: str, size: int):
+    if size:
+        _record("bytes", (operation, direction), size)
+
+def call_collecting(fn, *args):
+    """Run `fn(*args)` in a pool worker and return (result, samples recorded meanwhile)."""
+    _worker_samples.samples = []
+    try:
+        return fn(*args), _worker_samples.samples
+    finally:
+        _worker_samples.samples = None
+
+def apply_samples(samples: List[Sample]):
+    for kind, labels, value in samples:
+        _apply(kind, labels, value)
+
+# Gauges read from live objects at scrape time
+
+class StateCollector:
+    """Worker pool, cache and queue state, read when /metrics is scraped instead of on every change."""
+
+    def __init__(self):
+        self.pools = []
+        self.caches = []
+        self.gauges = []
+
+    def track_pool(self, pool):
+        self.pools.append(pool)
+
+    def track_cache(self, cache):
+        self.caches.append(cache)
+
+    def track_gauge(self, name: str, documentation: str, labels: List[str], read: Callable[[], Iterable[Tuple[list, float]]]):
+        self.gauges.append((name, documentation, labels, read))
+
+    def collect(self):
+        in_flight = GaugeMetricFamily("utility_api_pool_in_flight", "Jobs running on a worker pool", labels=["pool"])
+        queued = GaugeMetricFamily("utility_api_pool_queued", "Jobs waiting for a worker pool", labels=["pool"])
+        workers = GaugeMetricFamily("utility_api_pool_workers", "Worker pool size", labels=["pool"])
+        for pool in self.pools:
+            in_flight.add_metric([pool.name], min(pool.pending, pool.max_workers))
+            queued.add_metric([pool.name], max(0, pool.pending - pool.max_workers))
+            workers.add_metric([pool.name], pool.max_workers)
+        yield from (in_flight, queued, workers)
+
+        hits = CounterMetricFamily("utility_api_cache_hits", "Result cache hits", labels=["cache"])
+        misses = CounterMetricFamily("utility_api_cache_misses", "Result cache misses", labels=["cache"])
+        ratio = GaugeMetricFamily("utility_api_cache_hit_ratio", "Result cache hits / lookups since start", labels=["cache"])
+        for cache in self.caches:
+            lookups = cache.hits + cache.misses
+            hits.add_metric([cache.name], cache.hits)
+            misses.add_metric([cache.name], cache.misses)
+            ratio.add_metric([cache.name], cache.hits / lookups if lookups else 0.0)
+        yield from (hits, misses, ratio)
+
+        for name, documentation, labels, read in self.gauges:
+            gauge = GaugeMetricFamily(name, documentation, labels=labels)
+            for label_values, value in read():
+                gauge.add_metric(label_values, value)
+            yield gauge
+
+state = StateCollector()
+REGISTRY.register(state)
+
+def render_metrics() -> bytes:
+    """Prometheus text format; merges every process's files when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(state)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def _server_timing(timings: dict, total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+class MetricsMiddleware:
+    """
+    Records request latency per route template (not per raw path, which would explode the
+    label set) and, with SERVER_TIMING_ENABLED, adds a Server-Timing header with the stages
+    that finished before the response started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    MutableHeaders(scope=message).append("Server-Timing", _server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
+            _request_timings.reset(token)
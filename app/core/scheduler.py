@@ -0,0 +1,174 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Optional
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import state
+from app.utils.logger import logger
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+def estimate_cost(size_bytes: int, pages: int = 0) -> float:
+    """Rough work estimate in page-equivalents: every page plus one per megabyte uploaded."""
+    return pages + size_bytes / (1024 * 1024)
+
+class Ticket:
+    """A granted slot in a lane. Releasing twice is harmless."""
+
+    def __init__(self, lane: "Lane", client: str, cost: float):
+        self.lane = lane
+        self.client = client
+        self.cost = cost
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.lane.release()
+
+class Lane:
+    """
+    Up to `concurrency` jobs run at once; the rest wait in one FIFO per client. Freed slots go
+    to clients in turn, so a client queueing fifty jobs does not push everyone else back fifty places.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_waiting: int, wait_timeout: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_waiting = max(0, max_waiting)
+        self.wait_timeout = wait_timeout
+        self.running = 0
+        self.waiting = 0
+        self._queues = OrderedDict()
+
+    def _busy(self, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(settings.WORKER_RETRY_AFTER)}
+        )
+
+    def _grant_next(self):
+        while self.running < self.concurrency and self._queues:
+            client, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            self.waiting -= 1
+            if not future.done():
+                self.running += 1
+                future.set_result(None)
+
+    def _forget(self, client: str, future: asyncio.Future):
+        queue = self._queues.get(client)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self.waiting -= 1
+            if not queue:
+                del self._queues[client]
+
+    async def acquire(self, client: str, cost: float, background: bool = False) -> Ticket:
+        """
+        Wait for a slot. Background callers (queued jobs) have nobody waiting on an HTTP
+        response, so they are neither turned away by `max_waiting` nor timed out.
+        """
+        if self.running < self.concurrency and not self._queues:
+            self.running += 1
+            return Ticket(self, client, cost)
+        if not background and self.waiting >= self.max_waiting:
+            raise self._busy(f"Server is busy, the {self.name} queue is full. Please retry later.")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(client, deque()).append(future)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=None if background else self.wait_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we gave up; hand it on
+                self.release()
+            else:
+                future.cancel()
+                self._forget(client, future)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._busy(f"Server is busy, no {self.name} slot became free within {self.wait_timeout:g} seconds.")
+            raise
+        return Ticket(self, client, cost)
+
+    def release(self):
+        self.running -= 1
+        self._grant_next()
+
+    def stats(self) -> dict:
+        return {"concurrency": self.concurrency, "running": self.running, "waiting": self.waiting, "clients_waiting": len(self._queues)}
+
+class AdmissionScheduler:
+    """
+    Admission in front of the worker pools.
+
+    Interactive work (sign, split, ...) and bulk work (OCR, DOCX, rendering) get separate lanes
+    with their own concurrency caps, so a bulk burst cannot take every worker. Interactive
+    requests whose estimated cost exceeds `interactive_max_cost` are demoted to the bulk lane.
+    """
+
+    def __init__(self, interactive: int, bulk: int, max_waiting: int, wait_timeout: float, interactive_max_cost: float, enabled: bool = True):
+        self.enabled = enabled
+        self.interactive_max_cost = interactive_max_cost
+        self.lanes = {
+            INTERACTIVE: Lane(INTERACTIVE, interactive, max_waiting, wait_timeout),
+            BULK: Lane(BULK, bulk, max_waiting, wait_timeout)
+        }
+
+    def lane_for(self, lane: str, cost: float) -> str:
+        if lane == INTERACTIVE and cost > self.interactive_max_cost:
+            return BULK
+        return lane
+
+    async def acquire(self, client: str, lane: str, cost: float = 1.0, background: bool = False) -> Optional[Ticket]:
+        if not self.enabled:
+            return None
+        target = self.lane_for(lane, cost)
+        if target != lane:
+            logger.info(f"Demoting {lane} job of cost {cost:.1f} from {client} to the {target} lane")
+        return await self.lanes[target].acquire(client, cost, background)
+
+    def stats(self) -> dict:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+class AdmissionMiddleware:
+    """
+    Releases the tickets a request acquired once its response, including a streamed body, has
+    been sent or the client has gone away. Routes only acquire; they never have to release.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            state = scope.get("state") or {}
+            for ticket in state.get("admission_tickets", ()):
+                ticket.release()
+
+admission = AdmissionScheduler(
+    interactive=settings.INTERACTIVE_CONCURRENCY,
+    bulk=settings.BULK_CONCURRENCY,
+    max_waiting=settings.ADMISSION_MAX_WAITING,
+    wait_timeout=settings.ADMISSION_WAIT_TIMEOUT,
+    interactive_max_cost=settings.INTERACTIVE_MAX_COST,
+    enabled=settings.ADMISSION_ENABLED
+)
+
+state.track_gauge(
+    "utility_api_admission_running", "Jobs holding an admission slot", ["lane"],
+    lambda: [([name], stats["running"]) for name, stats in admission.stats().items()]
+)
+state.track_gauge(
+    "utility_api_admission_waiting", "Jobs waiting for an admission slot", ["lane"],
+    lambda: [([name], stats["waiting"]) for name, stats in admission.stats().items()]
+)
@@ -0,0 +1,221 @@
+import asyncio
+import collections
+import multiprocessing
+import threading
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import apply_samples, call_collecting, state
+from app.utils.logger import logger
+
+class WorkerPool:
+    """
+    Bounded executor for blocking work (PyMuPDF, Pillow, ...).
+
+    At most `max_workers` jobs run at once and at most `max_queue` more may wait.
+    Anything beyond that is rejected with a 503 + Retry-After so a burst of heavy
+    requests cannot pile up behind the event loop.
+
+    A process job that outlives `timeout` retires its executor: new jobs go to a fresh one, and
+    the old one's processes are killed as soon as every job still on it has finished or timed
+    out, so a hung document never keeps a worker. Threads cannot be killed; in thread mode a
+    timed-out job keeps its slot until it returns.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, timeout: float, kind: str = "process", initializer=None, initargs: tuple = ()):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.kind = kind
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Unfinished futures per process executor, and those of retired executors that timed out
+        self._running: Dict[ProcessPoolExecutor, Set[Future]] = {}
+        self._expired: Dict[ProcessPoolExecutor, Set[Future]] = {}
+        state.track_pool(self)
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self):
+        # Called with self._lock held
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"{self.name}-worker",
+                    initializer=self.initializer,
+                    initargs=self.initargs
+                )
+            else:
+                # spawn instead of fork: the parent runs an event loop and helper threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer,
+                    initargs=self.initargs
+                )
+            logger.info(f"Started {self.name} pool ({self.kind}, {self.max_workers} workers, queue {self.max_queue})")
+        return self._executor
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _finished(self, executor, future: Future):
+        with self._lock:
+            self._running.get(executor, set()).discard(future)
+        self._reap(executor)
+
+    def _expire(self, executor, future: Future):
+        """A running job timed out: send new jobs to a fresh executor and kill this one once it is idle."""
+        with self._lock:
+            if future.done():
+                return
+            self._expired.setdefault(executor, set()).add(future)
+            if self._executor is executor:
+                self._executor = None
+        logger.warning(f"{self.name} job timed out, recycling its worker processes")
+        self._reap(executor)
+
+    def _reap(self, executor):
+        with self._lock:
+            expired = self._expired.get(executor)
+            if expired is None or not self._running.get(executor, set()) <= expired:
+                return
+            del self._expired[executor]
+            self._running.pop(executor, None)
+        # ProcessPoolExecutor cannot stop a running call; its processes can only be killed
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _replace_broken(self, executor):
+        """A worker died: start a fresh executor for the next job, unless another caller already did."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+            self._running.pop(executor, None)
+            self._expired.pop(executor, None)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn, *args):
+        """Run `fn(*args)` on the pool and await its result."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Server is busy, the {self.name} worker pool is saturated. Please retry later.",
+                    headers={"Retry-After": str(settings.WORKER_RETRY_AFTER)}
+                )
+            self._pending += 1
+
+        executor = None
+        try:
+            with self._lock:
+                executor = self._get_executor()
+                # Stage timings recorded in the worker come back with the result
+                future = executor.submit(call_collecting, fn, *args)
+                if isinstance(executor, ProcessPoolExecutor):
+                    self._running.setdefault(executor, set()).add(future)
+        except BrokenProcessPool:
+            self._release()
+            self._broken(executor)
+        except Exception:
+            self._release()
+            raise
+
+        # The slot is only freed once the job really finishes (or its worker is killed), not when
+        # the caller gives up, otherwise timed-out jobs would keep burning CPU while new ones are admitted.
+        future.add_done_callback(self._release)
+        if isinstance(executor, ProcessPoolExecutor):
+            future.add_done_callback(lambda done: self._finished(executor, done))
+
+        waiter = asyncio.wrap_future(future)
+        try:
+            result, samples = await asyncio.wait_for(asyncio.shield(waiter), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # Nobody reads the outcome any more, not even the BrokenProcessPool of a killed worker
+            waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+            if not future.cancel() and isinstance(executor, ProcessPoolExecutor):
+                self._expire(executor, future)
+            raise HTTPException(status_code=504, detail=f"Processing took longer than {self.timeout:g} seconds.")
+        except BrokenProcessPool:
+            self._broken(executor)
+        apply_samples(samples)
+        return result
+
+    def _broken(self, executor):
+        # A worker died (e.g. crashed inside MuPDF); start a fresh pool for the next job
+        logger.error(f"{self.name} pool is broken, restarting it")
+        self._replace_broken(executor)
+        raise HTTPException(status_code=500, detail="Worker process crashed while processing the document.")
+
+    async def imap_unordered(self, fn, jobs: list) -> AsyncIterator[tuple]:
+        """
+        Run `fn(*args)` for every args tuple in `jobs` and yield (index, result) as they finish.
+        A failed job yields its exception instead of aborting the others. At most `max_workers`
+        jobs of one batch are submitted at a time, so a big batch never fills the queue by itself.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run_job(index, args):
+            async with semaphore:
+                try:
+                    return index, await self.run(fn, *args)
+                except Exception as e:
+                    return index, e
+
+        tasks = [asyncio.create_task(run_job(index, args)) for index, args in enumerate(jobs)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away or the consumer stopped early: drop what has not started yet
+            for task in tasks:
+                task.cancel()
+
+    async def imap(self, fn, jobs: Iterable[tuple], window: Optional[int] = None) -> AsyncIterator:
+        """
+        Run `fn(*args)` for every args tuple in `jobs` and yield the results in order, for output
+        that is streamed while it is produced. At most `window` jobs (default `max_workers`) are
+        in flight ahead of the one being consumed, so finished results never pile up behind a
+        slow one. The first failure is raised and the jobs not yet consumed are dropped.
+        """
+        window = max(1, window or self.max_workers)
+        running = collections.deque()
+        try:
+            for args in jobs:
+                running.append(asyncio.create_task(self.run(fn, *args)))
+                if len(running) >= window:
+                    yield await running.popleft()
+            while running:
+                yield await running.popleft()
+        finally:
+            for task in running:
+                task.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+pdf_pool = WorkerPool(
+    "pdf",
+    max_workers=settings.PDF_WORKERS,
+    max_queue=settings.PDF_MAX_QUEUE,
+    timeout=settings.PDF_JOB_TIMEOUT,
+    kind=settings.WORKER_POOL_KIND
+)
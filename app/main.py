@@ -1,18 +1,50 @@
+import asyncio
 import uvicorn
 from fastapi import FastAPI
+from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
-from app.api.v1.rate_limiter import limiter
-from app.api.v1.routers import health, pdf, about, docx, barcode
+from app.api.v1.ingest import IngestMiddleware
+from app.api.v1.rate_limiter import limiter, rate_limit_exceeded
+from app.api.v1.routers import health, pdf, about, docx, barcode, jobs, metrics
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware
+from app.core.scheduler import AdmissionMiddleware
+from app.core.worker_pool import pdf_pool
+from app.services.pdf_service import ocr_pool
+from app.services.libreoffice_pool import libreoffice_pool
+from app.services.docx_service import docx_service
+from app.services.job_service import job_service
 from app.utils.logger import logger
 
 # Create FastAPI app and attach rate limiter
 app = FastAPI(title="PDF to Image Service")
 app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded)
+# Rejects oversized bodies before they are parsed and removes spooled uploads afterwards.
+# Innermost, so the 413 is raised in the route itself rather than in SlowAPI's receive task.
+app.add_middleware(IngestMiddleware)
 app.add_middleware(SlowAPIMiddleware)
+# Outermost, so admission slots are held until a streamed body has been fully sent
+app.add_middleware(AdmissionMiddleware)
+if settings.METRICS_ENABLED:
+    # Outside admission too, so request latency includes the time spent waiting for a slot
+    app.add_middleware(MetricsMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up application...")
+    app.state.janitor = asyncio.create_task(docx_service.run_janitor())
+    app.state.job_janitor = asyncio.create_task(job_service.run_janitor())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Shutting down worker pools...")
+    app.state.janitor.cancel()
+    app.state.job_janitor.cancel()
+    await job_service.shutdown()
+    pdf_pool.shutdown()
+    ocr_pool.shutdown()
+    await libreoffice_pool.stop()
 
 # Include routers
 app.include_router(health.router)
@@ -20,6 +52,9 @@ app.include_router(pdf.router)
 app.include_router(about.router)
 app.include_router(docx.router)
 app.include_router(barcode.router)
+app.include_router(jobs.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
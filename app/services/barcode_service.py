@@ -1,87 +1,379 @@
-from fastapi import HTTPException, UploadFile
+from fastapi import HTTPException
 from barcode import get_barcode_class
+from barcode.errors import BarcodeError
 from barcode.writer import ImageWriter
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional, Tuple
 from PIL import Image
-import os
-import uuid
+from qrcode.exceptions import DataOverflowError
+import base64
+import csv
+import fitz
+import hashlib
 import io
+import json
+import numpy as np
 import qrcode
+from app.core.worker_pool import pdf_pool
+from app.utils.logger import logger
+from app.utils.zip_stream import astream_zip, safe_member_name
 
-class BarcodeService:
-    def __init__(self):
-        self.upload_dir = "uploads"
-        os.makedirs(self.upload_dir, exist_ok=True)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "gif": ("GIF", "image/gif"),
+    "bmp": ("BMP", "image/bmp"),
+    "webp": ("WEBP", "image/webp"),
+}
+VECTOR_FORMATS = {
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+}
+MEDIA_TYPES = {**{name: media_type for name, (_, media_type) in IMAGE_FORMATS.items()}, **VECTOR_FORMATS}
+
+# How a raster code reaches the requested size: a LANCZOS resize of the library's bitmap,
+# or modules drawn directly at an integer pixel scale
+RENDER_MODES = ("resample", "exact")
+
+# Modules of white space on each side of a 1D code drawn from its module matrix
+QUIET_ZONE = 10
+
+def check_output(image_format: str, render: str = "resample"):
+    if image_format.lower() not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported image format. Use one of: {', '.join(MEDIA_TYPES)}")
+    if render.lower() not in RENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"render must be one of: {', '.join(RENDER_MODES)}")
+
+# Logos already decoded and resized in this worker, keyed by (logo hash, box size)
+_logo_cache = OrderedDict()
+LOGO_CACHE_SIZE = 32
+
+def _prepare_logo(logo_data: bytes, logo_hash: str, max_width: int, max_height: int) -> Image.Image:
+    key = (logo_hash, max_width, max_height)
+    logo = _logo_cache.get(key)
+    if logo is not None:
+        _logo_cache.move_to_end(key)
+        return logo
+
+    try:
+        logo = Image.open(io.BytesIO(logo_data))
+    except Image.DecompressionBombError:
+        raise ValueError("Logo image is too large. Please use a smaller image.")
+    logo.thumbnail((max_width, max_height), Image.LANCZOS)
+
+    # Flatten a transparent logo onto white so it stays readable on top of the modules
+    if logo.mode == 'RGBA':
+        white_bg = Image.new('RGBA', logo.size, (255, 255, 255, 255))
+        white_bg.paste(logo, (0, 0), logo)
+        logo = white_bg
+    else:
+        logo.load()
+
+    _logo_cache[key] = logo
+    while len(_logo_cache) > LOGO_CACHE_SIZE:
+        _logo_cache.popitem(last=False)
+    return logo
+
+def _make_qr(data: str) -> qrcode.QRCode:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+def _module_matrix(data: str, barcode_type: str) -> np.ndarray:
+    """Dark modules as a boolean matrix, quiet zone included. 1D codes are a single row."""
+    if barcode_type == 'qr':
+        return np.array(_make_qr(data).get_matrix(), dtype=bool)
+    code = "".join(get_barcode_class(barcode_type)(data).build())
+    row = np.zeros(len(code) + 2 * QUIET_ZONE, dtype=bool)
+    row[QUIET_ZONE:QUIET_ZONE + len(code)] = np.frombuffer(code.encode(), dtype=np.uint8) == ord("1")
+    return row[np.newaxis, :]
+
+def _render_exact(matrix: np.ndarray, width: int, height: int) -> Image.Image:
+    """
+    Draw every module as a block of whole pixels at the largest integer scale that fits, so
+    edges stay sharp. Whatever the scale leaves over becomes white margin around the code.
+    """
+    rows, cols = matrix.shape
+    if rows == 1:
+        # The bars of a 1D code run the full height
+        scale_x, scale_y = max(1, width // cols), max(1, height)
+    else:
+        # 2D codes keep square modules
+        scale_x = scale_y = max(1, min(width // cols, height // rows))
+    modules = np.repeat(np.repeat(matrix, scale_y, axis=0), scale_x, axis=1)
+
+    canvas = np.full((max(height, modules.shape[0]), max(width, modules.shape[1])), 255, dtype=np.uint8)
+    top = (canvas.shape[0] - modules.shape[0]) // 2
+    left = (canvas.shape[1] - modules.shape[1]) // 2
+    canvas[top:top + modules.shape[0], left:left + modules.shape[1]][modules] = 0
+    return Image.fromarray(canvas, mode="L")
+
+def _render_vector(matrix: np.ndarray, image_format: str, width: int, height: int, logo_data: Optional[bytes] = None, logo_hash: Optional[str] = None) -> bytes:
+    """SVG (or a PDF converted from it) with one path for all dark modules, drawn in module units."""
+    rows, cols = matrix.shape
+    path = []
+    for y, row in enumerate(matrix):
+        # Merge each horizontal run of dark modules into a single rectangle
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], row.view(np.int8), [0]))))
+        for x0, x1 in zip(edges[::2], edges[1::2]):
+            path.append(f"M{x0},{y}h{x1 - x0}v1h{x0 - x1}z")
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{width}" height="{height}" '
+        f'viewBox="0 0 {cols} {rows}" preserveAspectRatio="{"none" if rows == 1 else "xMidYMid meet"}" shape-rendering="crispEdges">',
+        f'<rect width="{cols}" height="{rows}" fill="#fff"/>',
+        f'<path d="{"".join(path)}" fill="#000"/>'
+    ]
+    if logo_data:
+        logo_img = _prepare_logo(logo_data, logo_hash, int(width * 0.35), int(height * 0.35))
+        logo_png = io.BytesIO()
+        logo_img.save(logo_png, format="PNG")
+        parts.append(
+            f'<image x="{cols * 0.325:g}" y="{rows * 0.325:g}" width="{cols * 0.35:g}" height="{rows * 0.35:g}" '
+            f'xlink:href="data:image/png;base64,{base64.b64encode(logo_png.getvalue()).decode()}"/>'
+        )
+    parts.append("</svg>")
+    svg = "".join(parts).encode()
+
+    if image_format == "svg":
+        return svg
+    document = fitz.open(stream=svg, filetype="svg")
+    try:
+        return document.convert_to_pdf()
+    finally:
+        document.close()
+
+def _render_barcode(data: str, barcode_type: str, image_format: str, width: int, height: int, logo_data: Optional[bytes] = None, logo_hash: Optional[str] = None, render: str = "resample") -> bytes:
+    """Build the barcode image and encode it straight into memory."""
+    try:
+        if image_format in VECTOR_FORMATS:
+            return _render_vector(_module_matrix(data, barcode_type), image_format, width, height, logo_data, logo_hash)
+
+        pil_format, _ = IMAGE_FORMATS[image_format]
+        if render == "exact":
+            barcode_img = _render_exact(_module_matrix(data, barcode_type), width, height)
+
+        elif barcode_type == 'qr':
+            barcode_img = _make_qr(data).make_image(fill_color="black", back_color="white").convert("RGBA")
+
+            # Resize QR code to desired width and height
+            barcode_img = barcode_img.resize((width, height), Image.LANCZOS)
+
+        else:
+            # Get the barcode class for 1D barcodes
+            barcode_class = get_barcode_class(barcode_type)
+
+            # Generate the barcode
+            barcode = barcode_class(data, writer=ImageWriter())
+
+            # Generate the barcode to an in-memory BytesIO object
+            temp_barcode_buffer = io.BytesIO()
+            options = {'module_width': width, 'module_height': height}
+            barcode.write(temp_barcode_buffer, options)
+            temp_barcode_buffer.seek(0) # Rewind the buffer to the beginning
+            barcode_img = Image.open(temp_barcode_buffer)
+
+        if logo_data:
+            # Logo is at most 35% of the barcode in each direction
+            barcode_width, barcode_height = barcode_img.size
+            logo_img = _prepare_logo(logo_data, logo_hash, int(barcode_width * 0.35), int(barcode_height * 0.35))
+
+            # Calculate position to center the logo
+            logo_width, logo_height = logo_img.size
+            position = ((barcode_width - logo_width) // 2, (barcode_height - logo_height) // 2)
+
+            # Ensure barcode_img is RGBA for pasting with alpha channel
+            if barcode_img.mode != 'RGBA':
+                barcode_img = barcode_img.convert('RGBA')
+            barcode_img.paste(logo_img, position, logo_img if logo_img.mode == 'RGBA' else None)
 
-    async def generate_barcode(self, data: str, barcode_type: str, image_format: str, width: int, height: int, logo_file: UploadFile = None):
+        if pil_format in ("JPEG", "BMP") and barcode_img.mode not in ("RGB", "L"):
+            barcode_img = barcode_img.convert("RGB")
+
+        buffer = io.BytesIO()
+        barcode_img.save(buffer, format=pil_format)
+        return buffer.getvalue()
+    except Image.DecompressionBombError:
+        raise ValueError("Barcode image is too large. Please use a smaller width or height.")
+    except (BarcodeError, DataOverflowError) as e:
+        raise ValueError(f"Invalid barcode: {e}")
+
+def _render_barcode_batch(items: List[str], barcode_type: str, image_format: str, width: int, height: int, logo_data: Optional[bytes] = None, logo_hash: Optional[str] = None, render: str = "resample") -> List[Tuple[Optional[bytes], Optional[str]]]:
+    """Render a slice of a bulk request; a bad payload gives (None, error) instead of failing the slice."""
+    results = []
+    for data in items:
         try:
-            if barcode_type.lower() == 'qr':
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_H,
-                    box_size=10,
-                    border=4,
+            results.append((_render_barcode(data, barcode_type, image_format, width, height, logo_data, logo_hash, render), None))
+        except ValueError as e:
+            results.append((None, str(e)))
+    return results
+
+def _build_label_sheet(images: List[Tuple[Optional[bytes], str]], page_size: str, columns: int, rows: int, margin: float, show_labels: bool) -> bytes:
+    """
+    Lay the codes out on a grid of `columns` x `rows` labels per page. Every distinct image is
+    embedded once and later cells reuse its xref, so repeated codes do not grow the file.
+    """
+    page_rect = fitz.paper_rect(page_size)
+    cell_width = (page_rect.width - 2 * margin) / columns
+    cell_height = (page_rect.height - 2 * margin) / rows
+    label_height = min(12, cell_height * 0.2) if show_labels else 0
+    padding = min(cell_width, cell_height) * 0.05
+
+    pdf = fitz.open()
+    try:
+        xrefs = {}
+        page = None
+        per_page = columns * rows
+        for position, (image_data, label) in enumerate(images):
+            if position % per_page == 0:
+                page = pdf.new_page(width=page_rect.width, height=page_rect.height)
+            if image_data is None:
+                continue
+
+            row, column = divmod(position % per_page, columns)
+            x0 = margin + column * cell_width
+            y0 = margin + row * cell_height
+            image_rect = fitz.Rect(x0 + padding, y0 + padding, x0 + cell_width - padding, y0 + cell_height - padding - label_height)
+
+            digest = hashlib.sha1(image_data).digest()
+            if digest in xrefs:
+                page.insert_image(image_rect, xref=xrefs[digest])
+            else:
+                xrefs[digest] = page.insert_image(image_rect, stream=image_data)
+
+            if show_labels:
+                fontsize = label_height * 0.75
+                text_width = fitz.get_text_length(label, fontsize=fontsize)
+                page.insert_text(
+                    (x0 + max(padding, (cell_width - text_width) / 2), image_rect.y1 + label_height * 0.8),
+                    label,
+                    fontsize=fontsize
                 )
-                qr.add_data(data)
-                qr.make(fit=True)
-                barcode_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
 
-                # Resize QR code to desired width and height
-                barcode_img = barcode_img.resize((width, height), Image.LANCZOS)
+        return pdf.tobytes(garbage=1, deflate=True)
+    finally:
+        pdf.close()
 
+def parse_bulk_items(items: Optional[str], csv_data: Optional[bytes]) -> List[dict]:
+    """
+    Read bulk payloads from a JSON array (strings or {"data", "label"} objects) and/or a CSV
+    whose first column, or its "data" column when there is a header, holds the payload.
+    """
+    parsed = []
+    if items:
+        try:
+            values = json.loads(items)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"items is not valid JSON: {e}")
+        if not isinstance(values, list):
+            raise ValueError("items must be a JSON array")
+        for value in values:
+            if isinstance(value, dict):
+                parsed.append({"data": str(value.get("data", "")), "label": str(value.get("label") or value.get("data", ""))})
             else:
-                # Get the barcode class for 1D barcodes
-                barcode_class = get_barcode_class(barcode_type)
-
-                # Generate the barcode
-                barcode = barcode_class(data, writer=ImageWriter())
-
-                # Generate the barcode to an in-memory BytesIO object
-                temp_barcode_buffer = io.BytesIO()
-                options = {'module_width': width, 'module_height': height}
-                barcode.write(temp_barcode_buffer, options)
-                temp_barcode_buffer.seek(0) # Rewind the buffer to the beginning
-                barcode_img = Image.open(temp_barcode_buffer)
-
-            if logo_file:
-                logo_img = Image.open(io.BytesIO(await logo_file.read()))
-                
-                # Calculate logo size to fit within barcode (e.g., 20% of barcode height)
-                barcode_width, barcode_height = barcode_img.size
-                logo_max_height = int(barcode_height * 0.35)
-                logo_max_width = int(barcode_width * 0.35)
-
-                logo_img.thumbnail((logo_max_width, logo_max_height), Image.LANCZOS)
-
-                # Calculate position to center the logo
-                logo_width, logo_height = logo_img.size
-                position = ((barcode_width - logo_width) // 2, (barcode_height - logo_height) // 2)
-
-                # Ensure barcode_img is RGBA for pasting with alpha channel
-                if barcode_img.mode != 'RGBA':
-                    barcode_img = barcode_img.convert('RGBA')
-
-                # Create a white background for the logo if it has an alpha channel
-                if logo_img.mode == 'RGBA':
-                    white_bg = Image.new('RGBA', logo_img.size, (255, 255, 255, 255))
-                    white_bg.paste(logo_img, (0, 0), logo_img)
-                    logo_to_paste = white_bg
-                else:
-                    logo_to_paste = logo_img
-                
-                barcode_img.paste(logo_to_paste, position, logo_to_paste if logo_to_paste.mode == 'RGBA' else None)
-
-            # Save the final barcode image
-            filename = f"{uuid.uuid4()}.{image_format.lower()}"
-            path = os.path.join(self.upload_dir, filename)
-            barcode_img.save(path)
-            
-            return path
-        except Image.DecompressionBombError:
-            raise HTTPException(status_code=400, detail="Logo image is too large. Please use a smaller image.")
+                parsed.append({"data": str(value), "label": str(value)})
+
+    if csv_data:
+        reader = csv.reader(io.StringIO(csv_data.decode("utf-8-sig")))
+        rows = [row for row in reader if row and any(cell.strip() for cell in row)]
+        if rows and "data" in [cell.strip().lower() for cell in rows[0]]:
+            header = [cell.strip().lower() for cell in rows.pop(0)]
+            data_column = header.index("data")
+            label_column = header.index("label") if "label" in header else data_column
+        else:
+            data_column, label_column = 0, (1 if rows and len(rows[0]) > 1 else 0)
+        for row in rows:
+            data = row[data_column].strip() if data_column < len(row) else ""
+            label = row[label_column].strip() if label_column < len(row) else data
+            parsed.append({"data": data, "label": label or data})
+
+    if any(not item["data"] for item in parsed):
+        raise ValueError("Every item needs a non-empty data value")
+    return parsed
+
+class BarcodeService:
+    async def generate_barcode(self, data: str, barcode_type: str, image_format: str, width: int, height: int, logo_data: Optional[bytes] = None, logo_hash: Optional[str] = None, render: str = "resample") -> bytes:
+        """Return the encoded barcode image. `logo_hash` identifies the logo for the per-worker logo cache."""
+        check_output(image_format, render)
+        if width <= 0 or height <= 0:
+            raise HTTPException(status_code=400, detail="width and height must be positive")
+
+        try:
+            return await pdf_pool.run(_render_barcode, data, barcode_type.lower(), image_format.lower(), width, height, logo_data, logo_hash, render.lower())
+        except HTTPException:
+            raise
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
         except Exception as e:
-            import traceback
-            print(f"An unexpected error occurred: {e}")
-            traceback.print_exc()
+            logger.exception(f"Barcode generation failed: {e}")
             raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
-barcode_service = BarcodeService()
\ No newline at end of file
+    async def _render_many(self, items: List[dict], barcode_type: str, image_format: str, width: int, height: int, logo_data: Optional[bytes], logo_hash: Optional[str], render: str) -> AsyncIterator[Tuple[int, Optional[bytes], Optional[str]]]:
+        """Yield (index, image, error) for every item, rendered in slices across the worker pool."""
+        check_output(image_format, render)
+
+        # A few slices per worker keeps everyone busy while the logo only travels once per slice
+        slice_size = max(1, min(100, -(-len(items) // (pdf_pool.max_workers * 4))))
+        slices = [items[i:i + slice_size] for i in range(0, len(items), slice_size)]
+        jobs = [
+            ([item["data"] for item in chunk], barcode_type.lower(), image_format.lower(), width, height, logo_data, logo_hash, render.lower())
+            for chunk in slices
+        ]
+
+        async for slice_index, result in pdf_pool.imap_unordered(_render_barcode_batch, jobs):
+            offset = slice_index * slice_size
+            if isinstance(result, Exception):
+                error = getattr(result, "detail", str(result))
+                result = [(None, error)] * len(slices[slice_index])
+            for position, (image_data, error) in enumerate(result):
+                yield offset + position, image_data, error
+
+    async def generate_bulk_zip(self, items: List[dict], barcode_type: str, image_format: str, width: int, height: int, logo_data: Optional[bytes] = None, logo_hash: Optional[str] = None, render: str = "resample") -> AsyncIterator[bytes]:
+        """Stream a ZIP of barcode images, in completion order, plus a manifest.json."""
+        digits = len(str(len(items)))
+        extension = image_format.lower()
+        manifest = [{"data": item["data"], "label": item["label"]} for item in items]
+
+        async def members():
+            async for index, image_data, error in self._render_many(items, barcode_type, image_format, width, height, logo_data, logo_hash, render):
+                name = None
+                if image_data is not None:
+                    name = f"{index + 1:0{digits}d}_{safe_member_name(items[index]['label'])}.{extension}"
+                    yield name, image_data
+                manifest[index].update({"success": error is None, "output": name, "error": error})
+            yield "manifest.json", json.dumps(manifest, indent=2).encode()
+
+        async for chunk in astream_zip(members()):
+            yield chunk
+
+    async def generate_label_sheet(self, items: List[dict], barcode_type: str, width: int, height: int, page_size: str, columns: int, rows: int, margin: float, show_labels: bool, logo_data: Optional[bytes] = None, logo_hash: Optional[str] = None, render: str = "resample") -> Tuple[bytes, List[dict]]:
+        """Build a printable PDF with one label per item. Returns the PDF and the items that failed."""
+        if fitz.paper_rect(page_size).width <= 0:
+            raise HTTPException(status_code=400, detail=f"Unknown page size '{page_size}'")
+        if columns < 1 or rows < 1 or margin < 0:
+            raise HTTPException(status_code=400, detail="columns and rows must be at least 1 and margin must not be negative")
+
+        images = [(None, item["label"]) for item in items]
+        failed = []
+        async for index, image_data, error in self._render_many(items, barcode_type, "png", width, height, logo_data, logo_hash, render):
+            if error is None:
+                images[index] = (image_data, items[index]["label"])
+            else:
+                failed.append({"index": index, "data": items[index]["data"], "error": error})
+
+        try:
+            sheet = await pdf_pool.run(_build_label_sheet, images, page_size, columns, rows, margin, show_labels)
+        except HTTPException:
+            raise
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        return sheet, sorted(failed, key=lambda item: item["index"])
+
+barcode_service = BarcodeService()
@@ -1,69 +1,217 @@
-
-
 from fastapi import UploadFile, HTTPException
+import anyio
+import asyncio
+import json
 import os
+import shutil
+import time
 import uuid
 import platform
-import subprocess
+from typing import AsyncIterator, List, Optional, Tuple, Union
+from app.core.config import settings
+from app.services.docx_template import DocxTemplate
+from app.services.libreoffice_pool import libreoffice_pool
+from app.utils.logger import logger
+from app.utils.zip_stream import astream_zip, safe_member_name
+
+DOCX_CONTENT_TYPES = ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"]
+
+def _convert_with_word(upload_path: str, pdf_path: str):
+    # Runs in a worker thread, which has to initialise COM itself before talking to Word
+    import pythoncom
+    from docx2pdf import convert
+    pythoncom.CoInitialize()
+    try:
+        convert(upload_path, pdf_path)
+    finally:
+        pythoncom.CoUninitialize()
 
 class DocxService:
     def __init__(self):
-        self.upload_dir = "uploads"
-        os.makedirs(self.upload_dir, exist_ok=True)
+        # Every request gets its own directory under work_dir (tmpfs when available),
+        # removed once the response is sent; the janitor sweeps anything left behind.
+        self.work_dir = settings.DOCX_WORK_DIR
+        os.makedirs(self.work_dir, exist_ok=True)
 
-    async def convert_to_pdf(self, file: UploadFile):
+    def _new_workdir(self) -> str:
+        path = os.path.join(self.work_dir, uuid.uuid4().hex)
+        os.makedirs(path)
+        return path
+
+    def cleanup(self, path: str):
+        """Remove the per-request directory holding `path` (a file inside it or the directory itself)."""
+        workdir = path if os.path.isdir(path) else os.path.dirname(path)
+        if os.path.dirname(os.path.abspath(workdir)) == os.path.abspath(self.work_dir):
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    async def _spool_upload(self, file: UploadFile, path: str):
+        # Copy the upload in chunks and stop as soon as it goes over the limit
+        size = 0
+        async with await anyio.open_file(path, "wb") as buffer:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.DOCX_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File size exceeds the {settings.DOCX_MAX_BYTES // (1024 * 1024)}MB limit.")
+                await buffer.write(chunk)
+
+    async def convert_to_pdf(self, file: UploadFile) -> str:
+        """
+        Convert the upload to PDF and return its path inside a fresh per-request directory.
+        Callers must pass the returned path to `cleanup` once the PDF has been sent.
+        """
         # Validate file type
-        if file.content_type not in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"]:
+        if file.content_type not in DOCX_CONTENT_TYPES:
             raise HTTPException(status_code=400, detail="Invalid file type. Only .docx and .doc are supported.")
 
-        # Validate file size (10MB limit)
-        if file.file._file.seekable():
-            file.file._file.seek(0, 2)
-            size = file.file._file.tell()
-            file.file._file.seek(0)
-            if size > 10 * 1024 * 1024:
-                raise HTTPException(status_code=413, detail="File size exceeds the 10MB limit.")
+        # Validate file size early when the multipart parser already knows it
+        if file.size is not None and file.size > settings.DOCX_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"File size exceeds the {settings.DOCX_MAX_BYTES // (1024 * 1024)}MB limit.")
 
-        # Save the uploaded file
-        file_ext = os.path.splitext(file.filename)[1]
-        upload_path = os.path.join(self.upload_dir, f"{uuid.uuid4()}{file_ext}")
-        with open(upload_path, "wb") as buffer:
-            buffer.write(await file.read())
+        workdir = self._new_workdir()
+        try:
+            upload_path = self._source_path(workdir, file.filename)
+            await self._spool_upload(file, upload_path)
+            return await self._convert(upload_path)
+        except BaseException:
+            self.cleanup(workdir)
+            raise
 
-        pdf_path = os.path.splitext(upload_path)[0] + ".pdf"
+    async def convert_file_to_pdf(self, filename: str, source: Union[bytes, str]) -> str:
+        """Like `convert_to_pdf`, for a document already ingested into memory or onto disk (e.g. a queued job)."""
+        workdir = self._new_workdir()
+        try:
+            upload_path = self._source_path(workdir, filename)
+            if isinstance(source, str):
+                await asyncio.to_thread(shutil.copyfile, source, upload_path)
+            else:
+                async with await anyio.open_file(upload_path, "wb") as buffer:
+                    await buffer.write(source)
+            return await self._convert(upload_path)
+        except BaseException:
+            self.cleanup(workdir)
+            raise
+
+    def _source_path(self, workdir: str, filename: Optional[str]) -> str:
+        file_ext = os.path.splitext(filename or "")[1].lower() or ".docx"
+        return os.path.join(workdir, f"document{file_ext}")
+
+    async def _convert(self, upload_path: str) -> str:
+        pdf_path = os.path.join(os.path.dirname(upload_path), "document.pdf")
 
         # Try converting with MS Word first on Windows
         if platform.system() == "Windows":
             try:
-                from docx2pdf import convert
-                convert(upload_path, pdf_path)
+                await anyio.to_thread.run_sync(_convert_with_word, upload_path, pdf_path)
                 return pdf_path
             except Exception as e:
-                print(f"MS Word conversion failed: {e}. Falling back to LibreOffice.")
+                logger.warning(f"MS Word conversion failed: {e}. Falling back to LibreOffice.")
+
+        # Fallback to LibreOffice if not on Windows or MS Word conversion fails.
+        # Conversions run on a pool of warm LibreOffice instances, each with its own profile.
+        await libreoffice_pool.convert(upload_path, pdf_path)
+        return pdf_path
+
+    async def _stream_conversions(self, workdir: str, jobs: List[Tuple[str, str, dict]]) -> AsyncIterator[bytes]:
+        """
+        Convert the (source_path, output_name, manifest_entry) jobs already written to `workdir`
+        and stream a ZIP of the PDFs, in completion order, followed by manifest.json.
+        """
+        by_path = {source_path: (position, output_name) for position, (source_path, output_name, _) in enumerate(jobs)}
+        manifest = [entry for _, _, entry in jobs]
+
+        async def members():
+            async for source_path, error in libreoffice_pool.convert_many(list(by_path), workdir):
+                position, output_name = by_path[source_path]
+                pdf_path = os.path.splitext(source_path)[0] + ".pdf"
+                if error is None and not os.path.exists(pdf_path):
+                    error = "LibreOffice did not produce a PDF for this file."
 
-        # Fallback to LibreOffice if not on Windows or MS Word conversion fails
+                if error is None:
+                    async with await anyio.open_file(pdf_path, "rb") as converted:
+                        yield output_name, await converted.read()
+                    os.remove(pdf_path)
+                manifest[position].update({
+                    "success": error is None,
+                    "output": output_name if error is None else None,
+                    "error": None if error is None else getattr(error, "detail", str(error))
+                })
+
+            yield "manifest.json", json.dumps(manifest, indent=2).encode()
+
+        async for chunk in astream_zip(members()):
+            yield chunk
+
+    async def convert_batch(self, documents: List[Tuple[str, Union[bytes, str]]]) -> AsyncIterator[bytes]:
+        """
+        Convert many DOCX/DOC files, given as bytes or a path, and stream back a ZIP of PDFs plus
+        a manifest.json with the status of every input. The whole set is handed to the LibreOffice pool at once.
+        """
+        workdir = self._new_workdir()
         try:
-            if platform.system() == "Windows":
-                libreoffice_path = "C:\\Program Files\\LibreOffice\\program\\soffice.exe"
-                if not os.path.exists(libreoffice_path):
-                    raise HTTPException(status_code=500, detail="LibreOffice not found. Please install it and ensure the path is correct.")
-                command = [libreoffice_path, '--headless', '--convert-to', 'pdf', '--outdir', self.upload_dir, upload_path]
-            else:
-                command = ['soffice', '--headless', '--convert-to', 'pdf', '--outdir', self.upload_dir, upload_path]
-
-            subprocess.run(command, check=True)
-            
-            base_name = os.path.splitext(os.path.basename(upload_path))[0]
-            converted_pdf_path = os.path.join(self.upload_dir, base_name + '.pdf')
-            os.rename(converted_pdf_path, pdf_path)
-            
-            return pdf_path
-        except FileNotFoundError:
-            raise HTTPException(status_code=500, detail="LibreOffice not found. Please install it and ensure it's in your system's PATH.")
-        except subprocess.CalledProcessError as e:
-            raise HTTPException(status_code=500, detail=f"An error occurred during PDF conversion: {e}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+            jobs = []
+            for index, (filename, data) in enumerate(documents, start=1):
+                file_ext = os.path.splitext(filename)[1].lower() or ".docx"
+                source_path = os.path.join(workdir, f"{index:04d}{file_ext}")
+                if isinstance(data, str):
+                    await asyncio.to_thread(shutil.copyfile, data, source_path)
+                else:
+                    async with await anyio.open_file(source_path, "wb") as buffer:
+                        await buffer.write(data)
+                output_name = f"{index:04d}_{os.path.splitext(os.path.basename(filename))[0]}.pdf"
+                jobs.append((source_path, output_name, {"file": filename}))
 
-docx_service = DocxService()
+            async for chunk in self._stream_conversions(workdir, jobs):
+                yield chunk
+        finally:
+            self.cleanup(workdir)
+
+    async def merge_template(self, template: DocxTemplate, records: List[dict], filename_field: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        Fill `template` once per record and stream back a ZIP of the resulting PDFs plus a
+        manifest.json. Records only cost a string join each; the conversions run on the pool.
+        """
+        workdir = self._new_workdir()
+        try:
+            def render_all():
+                jobs = []
+                for index, record in enumerate(records, start=1):
+                    source_path = os.path.join(workdir, f"{index:04d}.docx")
+                    with open(source_path, "wb") as f:
+                        f.write(template.render(record))
+                    label = str(record.get(filename_field) or "") if filename_field else ""
+                    output_name = f"{index:04d}_{safe_member_name(label)}.pdf" if label else f"{index:04d}.pdf"
+                    missing = [field for field in template.fields if field not in record]
+                    jobs.append((source_path, output_name, {"record": index, "missing_fields": missing}))
+                return jobs
 
+            jobs = await asyncio.to_thread(render_all)
+            async for chunk in self._stream_conversions(workdir, jobs):
+                yield chunk
+        finally:
+            self.cleanup(workdir)
+
+    def sweep_orphans(self) -> int:
+        """Remove request directories older than DOCX_WORK_TTL, e.g. left by a crashed worker."""
+        removed = 0
+        cutoff = time.time() - settings.DOCX_WORK_TTL
+        for name in os.listdir(self.work_dir):
+            path = os.path.join(self.work_dir, name)
+            try:
+                if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    async def run_janitor(self):
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.sweep_orphans)
+                if removed:
+                    logger.info(f"Janitor removed {removed} orphaned conversion directories")
+            except Exception as e:
+                logger.warning(f"Janitor sweep failed: {e}")
+            await asyncio.sleep(settings.DOCX_JANITOR_INTERVAL)
+
+docx_service = DocxService()
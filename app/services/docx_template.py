@@ -0,0 +1,198 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import List, Optional
+from app.core.config import settings
+
+# Parts of a DOCX that carry body text
+TEXT_PART = re.compile(r"word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml")
+PARAGRAPH = re.compile(r"<w:p[ >].*?</w:p>", re.S)
+TEXT_NODE = re.compile(r"(<w:t(?:\s[^>]*)?>)([^<]*)(</w:t>)")
+PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z0-9_.\-]+)\s*\}\}")
+
+# Marks a field inside compiled XML; NUL can never occur in a well-formed XML part
+FIELD_MARK = "\x00"
+FIELD_SPLIT = re.compile("\x00([^\x00]*)\x00")
+
+def _escape(value) -> str:
+    text = "" if value is None else str(value)
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    # Line breaks in a value become real breaks inside the run
+    return text.replace("\r\n", "\n").replace("\n", '</w:t><w:br/><w:t xml:space="preserve">')
+
+def _compile_paragraph(match: re.Match) -> str:
+    """
+    Rewrite one paragraph so every {{field}} sits in a single text node.
+
+    Word freely splits typed text across runs (spell check, formatting, revision marks), so
+    "{{name}}" may arrive as "{{", "na", "me}}". The paragraph's text nodes are joined, each
+    placeholder is moved into the node where it starts and removed from the nodes it spilled into.
+    """
+    paragraph = match.group(0)
+    nodes = list(TEXT_NODE.finditer(paragraph))
+    if not nodes:
+        return paragraph
+    full = "".join(node.group(2) for node in nodes)
+    placeholders = list(PLACEHOLDER.finditer(full))
+    if not placeholders:
+        return paragraph
+
+    out = []
+    last = 0
+    start = 0
+    for node in nodes:
+        end = start + len(node.group(2))
+        pieces = []
+        pos = start
+        touched = False
+        for placeholder in placeholders:
+            p_start, p_end = placeholder.span()
+            if p_end <= start or p_start >= end:
+                continue
+            touched = True
+            if p_start >= start:
+                pieces.append(full[pos:p_start])
+                pieces.append(f"{FIELD_MARK}{placeholder.group(1)}{FIELD_MARK}")
+            pos = max(pos, min(p_end, end))
+        pieces.append(full[pos:end])
+
+        open_tag = node.group(1)
+        # Edited nodes may now start or end with the space that used to follow a placeholder
+        if touched and "xml:space" not in open_tag:
+            open_tag = open_tag[:-1] + ' xml:space="preserve">'
+        out.append(paragraph[last:node.start()])
+        out.append(open_tag + "".join(pieces) + node.group(3))
+        last = node.end()
+        start = end
+    out.append(paragraph[last:])
+    return "".join(out)
+
+class DocxTemplate:
+    """
+    A DOCX parsed once into its ZIP members, with every text part compiled into alternating
+    literal XML and field names. Rendering a record is then a join plus a ZIP write.
+    """
+
+    def __init__(self, template_id: str, data: bytes):
+        self.template_id = template_id
+        self.size = len(data)
+        self.members = []
+        self.parts = {}
+        fields = []
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                raw = archive.read(info)
+                self.members.append((info.filename, raw))
+                if TEXT_PART.fullmatch(info.filename):
+                    compiled = PARAGRAPH.sub(_compile_paragraph, raw.decode("utf-8"))
+                    pieces = FIELD_SPLIT.split(compiled)
+                    self.parts[info.filename] = pieces
+                    fields.extend(pieces[1::2])
+
+        if "word/document.xml" not in self.parts:
+            raise ValueError("The file is not a DOCX document")
+        self.fields = list(dict.fromkeys(fields))
+
+    def render(self, record: dict) -> bytes:
+        buffer = io.BytesIO()
+        # Stored, not deflated: the file only lives long enough for LibreOffice to read it
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            for name, raw in self.members:
+                pieces = self.parts.get(name)
+                if pieces is not None:
+                    raw = "".join(
+                        piece if i % 2 == 0 else _escape(record.get(piece))
+                        for i, piece in enumerate(pieces)
+                    ).encode("utf-8")
+                archive.writestr(name, raw)
+        return buffer.getvalue()
+
+class DocxTemplateStore:
+    """
+    Uploaded merge templates, addressed by the sha256 of their bytes.
+
+    The original file is kept under `directory` so templates survive restarts; the compiled
+    form of the most recently used `max_cached` templates stays in memory.
+    """
+
+    def __init__(self, directory: str, max_cached: int):
+        self.directory = directory
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, template_id: str) -> str:
+        return os.path.join(self.directory, f"{template_id}.docx")
+
+    def _remember(self, template: DocxTemplate):
+        with self._lock:
+            self._cache.pop(template.template_id, None)
+            self._cache[template.template_id] = template
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def save(self, data: bytes) -> DocxTemplate:
+        template_id = hashlib.sha256(data).hexdigest()
+        try:
+            template = DocxTemplate(template_id, data)
+        except zipfile.BadZipFile:
+            raise ValueError("The file is not a DOCX document")
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(template_id)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._remember(template)
+        return template
+
+    def get(self, template_id: str) -> Optional[DocxTemplate]:
+        if not re.fullmatch(r"[0-9a-f]{64}", template_id):
+            return None
+        with self._lock:
+            template = self._cache.get(template_id)
+            if template is not None:
+                self._cache.move_to_end(template_id)
+                return template
+        try:
+            with open(self._path(template_id), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        template = DocxTemplate(template_id, data)
+        self._remember(template)
+        return template
+
+    def remove(self, template_id: str) -> bool:
+        if not re.fullmatch(r"[0-9a-f]{64}", template_id):
+            return False
+        with self._lock:
+            self._cache.pop(template_id, None)
+        try:
+            os.remove(self._path(template_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list(self) -> List[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        templates = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".docx"):
+                path = os.path.join(self.directory, name)
+                templates.append({
+                    "template_id": name[:-5],
+                    "size": os.path.getsize(path),
+                    "stored_at": int(os.path.getmtime(path))
+                })
+        return templates
+
+docx_template_store = DocxTemplateStore(settings.DOCX_TEMPLATE_DIR, settings.DOCX_TEMPLATE_CACHE_SIZE)
@@ -0,0 +1,459 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Union
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import state
+from app.core.scheduler import BULK, admission
+from app.services.docx_service import DOCX_CONTENT_TYPES, docx_service
+from app.services.pdf_service import (
+    PdfSource,
+    convert_pdf_to_text,
+    convert_pdf_to_text_with_ocr,
+    stream_pdf_as_png,
+    stream_pdf_pages_as_zip
+)
+from app.utils.logger import logger
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+CHUNK_SIZE = 1024 * 1024
+
+class Job:
+    """State of one queued job; `to_dict` is both the stored metadata and the status response."""
+
+    def __init__(self, job_id: str, kind: str, client: str, total: int = 0):
+        self.job_id = job_id
+        self.kind = kind
+        self.client = client
+        self.status = QUEUED
+        self.done = 0
+        self.total = total
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.started_at = None
+        self.finished_at = None
+
+    def progress(self, done: int, total: int):
+        """Progress callback for the services; may be called from worker threads."""
+        self.done = done
+        self.total = total
+
+    @property
+    def expires_at(self) -> Optional[float]:
+        return self.finished_at + settings.JOB_TTL if self.finished_at else None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.expires_at
+        }
+
+    @classmethod
+    def from_dict(cls, meta: dict, client: str = "") -> "Job":
+        job = cls(meta["job_id"], meta["kind"], client, meta["progress"]["total"])
+        job.status = meta["status"]
+        job.done = meta["progress"]["done"]
+        for name in ("error", "result", "created_at", "updated_at", "started_at", "finished_at"):
+            setattr(job, name, meta.get(name))
+        return job
+
+class JobStorage(ABC):
+    """
+    Where job metadata and results live. The local backend suits a single host; a shared
+    backend (object storage, NFS, ...) lets any instance answer for any job. Methods block
+    and are called from a thread.
+    """
+
+    @abstractmethod
+    def save_meta(self, job_id: str, meta: dict):
+        ...
+
+    @abstractmethod
+    def load_meta(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def result_writer(self, job_id: str):
+        """Context manager yielding a binary file; the result only becomes visible on a clean exit."""
+
+    @abstractmethod
+    def read_result(self, job_id: str) -> Iterator[bytes]:
+        ...
+
+    @abstractmethod
+    def delete(self, job_id: str):
+        ...
+
+    @abstractmethod
+    def job_ids(self) -> List[str]:
+        ...
+
+class LocalJobStorage(JobStorage):
+    """<job_id>.json and <job_id>.result files in one directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    def save_meta(self, job_id: str, meta: dict):
+        path = self._path(job_id, "json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def load_meta(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(self._path(job_id, "json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @contextmanager
+    def result_writer(self, job_id: str):
+        path = self._path(job_id, "result")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                yield f
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def read_result(self, job_id: str) -> Iterator[bytes]:
+        # Opened eagerly so a missing result fails before the response starts
+        f = open(self._path(job_id, "result"), "rb")
+
+        def chunks():
+            with f:
+                while chunk := f.read(CHUNK_SIZE):
+                    yield chunk
+        return chunks()
+
+    def delete(self, job_id: str):
+        for suffix in ("json", "result"):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def job_ids(self) -> List[str]:
+        return [name[:-5] for name in os.listdir(self.directory) if name.endswith(".json")]
+
+JOB_STORAGES: Dict[str, Callable[[], JobStorage]] = {
+    "local": lambda: LocalJobStorage(settings.JOB_DIR)
+}
+
+def create_job_storage(name: str) -> JobStorage:
+    if name not in JOB_STORAGES:
+        raise ValueError(f"Unknown JOB_STORAGE '{name}'. Use one of: {', '.join(JOB_STORAGES)}")
+    return JOB_STORAGES[name]()
+
+# Job kinds
+
+def _int_option(options: dict, name: str, default: int, low: int, high: int) -> int:
+    value = options.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        raise ValueError(f"Option '{name}' must be an integer between {low} and {high}")
+    return value
+
+def _bool_option(options: dict, name: str, default: bool) -> bool:
+    value = options.get(name, default)
+    if not isinstance(value, bool):
+        raise ValueError(f"Option '{name}' must be true or false")
+    return value
+
+def _str_option(options: dict, name: str, default: Optional[str]) -> Optional[str]:
+    value = options.get(name, default)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"Option '{name}' must be a string")
+    return value
+
+JobOutput = Union[bytes, AsyncIterator[bytes]]
+
+class JobKind:
+    """
+    An operation that can be queued. `parse` validates the options at submit time,
+    `run(job, source, options, filename)` produces the result bytes or an async chunk iterator.
+    `max_bytes` caps the upload below the route's MAX_UPLOAD_BYTES_JOBS when set.
+    """
+
+    def __init__(self, content_types: List[str], media_type: str, filename: str, parse: Callable[[dict], dict], run: Callable[..., Awaitable[JobOutput]], max_bytes: Optional[int] = None):
+        self.content_types = content_types
+        self.media_type = media_type
+        self.filename = filename
+        self.parse = parse
+        self.run = run
+        self.max_bytes = max_bytes
+
+async def _run_pdf_to_image(job: Job, source: PdfSource, options: dict, filename: str) -> JobOutput:
+    return await stream_pdf_as_png(source, options["dpi"], job.progress)
+
+async def _run_pdf_to_images(job: Job, source: PdfSource, options: dict, filename: str) -> JobOutput:
+    return await stream_pdf_pages_as_zip(source, progress=job.progress, **options)
+
+async def _run_pdf_to_text(job: Job, source: PdfSource, options: dict, filename: str) -> JobOutput:
+    if options["ocr"] and settings.OCR_ENABLED:
+        result = await convert_pdf_to_text_with_ocr(source, options["dpi"], options["language"].split(","), job.progress)
+    else:
+        result = await convert_pdf_to_text(source)
+    if not result["success"]:
+        raise ValueError(result["error"])
+    return json.dumps({
+        "text": result["text"],
+        "page_count": result["page_count"],
+        "used_ocr": result.get("used_ocr", False),
+        "ocr_pages": result.get("ocr_pages", [])
+    }).encode()
+
+async def _run_docx_to_pdf(job: Job, source: PdfSource, options: dict, filename: str) -> JobOutput:
+    job.progress(0, 1)
+    pdf_path = await docx_service.convert_file_to_pdf(filename, source)
+    try:
+        with open(pdf_path, "rb") as f:
+            output = f.read()
+    finally:
+        docx_service.cleanup(pdf_path)
+    job.progress(1, 1)
+    return output
+
+JOB_KINDS: Dict[str, JobKind] = {
+    "convert-to-image": JobKind(
+        ["application/pdf"], "image/png", "combined.png",
+        lambda options: {"dpi": _int_option(options, "dpi", 150, 1, settings.MAX_RENDER_DPI)},
+        _run_pdf_to_image
+    ),
+    "convert-to-images": JobKind(
+        ["application/pdf"], "application/zip", "pages.zip",
+        lambda options: {
+            "pages": _str_option(options, "pages", None),
+            "dpi": _int_option(options, "dpi", 150, 1, settings.MAX_RENDER_DPI),
+            "image_format": _str_option(options, "image_format", "png"),
+            "grayscale": _bool_option(options, "grayscale", False),
+            "alpha": _bool_option(options, "alpha", False),
+            "quality": _int_option(options, "quality", 85, 1, 100)
+        },
+        _run_pdf_to_images
+    ),
+    "convert-to-text": JobKind(
+        ["application/pdf"], "application/json", "extracted_text.json",
+        lambda options: {
+            "dpi": _int_option(options, "dpi", 300, 1, settings.MAX_RENDER_DPI),
+            "language": _str_option(options, "language", "en"),
+            "ocr": _bool_option(options, "ocr", True)
+        },
+        _run_pdf_to_text
+    ),
+    "docx-to-pdf": JobKind(
+        DOCX_CONTENT_TYPES, "application/pdf", "document.pdf",
+        lambda options: {},
+        _run_docx_to_pdf,
+        max_bytes=settings.DOCX_MAX_BYTES
+    )
+}
+
+async def _settle(fn: Callable, *args):
+    """
+    Run `fn` in a thread and wait for it to finish even if the job is cancelled meanwhile, so
+    a cancelled job never leaves a file operation running behind its cleanup.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        raise
+
+class JobService:
+    """
+    Runs queued jobs in the background and keeps their state and results in `storage`.
+
+    Jobs wait for a bulk lane slot like bulk requests do, but without a timeout. The process
+    that accepted a job keeps it in memory and writes its metadata, including progress, every
+    JOB_PROGRESS_INTERVAL seconds, so other instances sharing the storage can answer polls.
+    """
+
+    def __init__(self, storage: JobStorage):
+        self.storage = storage
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def _save(self, job: Job):
+        job.updated_at = time.time()
+        self.storage.save_meta(job.job_id, job.to_dict())
+
+    async def submit(self, kind: str, client: str, source: PdfSource, options: dict, filename: str, pages: int = 0, cost: float = 1.0) -> Job:
+        if self.pending >= settings.JOB_MAX_PENDING:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many jobs are pending. Please retry later.",
+                headers={"Retry-After": str(settings.WORKER_RETRY_AFTER)}
+            )
+
+        job = Job(uuid.uuid4().hex, kind, client, pages)
+        await asyncio.to_thread(self._save, job)
+        self._jobs[job.job_id] = job
+        self._tasks[job.job_id] = asyncio.create_task(self._run(job, JOB_KINDS[kind], source, options, filename, cost))
+        return job
+
+    async def _heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(settings.JOB_PROGRESS_INTERVAL)
+            await asyncio.to_thread(self._save, job)
+
+    async def _write_result(self, job: Job, output: JobOutput) -> int:
+        """
+        Write the result through the storage; only the file operations happen in threads. A job
+        deleted meanwhile leaves nothing behind: its partial result is discarded, and a result
+        committed while `delete` ran is removed again.
+        """
+        size = 0
+        writer = self.storage.result_writer(job.job_id)
+        f = await _settle(writer.__enter__)
+        try:
+            if isinstance(output, bytes):
+                await _settle(f.write, output)
+                size = len(output)
+            else:
+                async for chunk in output:
+                    await _settle(f.write, chunk)
+                    size += len(chunk)
+            if job.job_id not in self._jobs:
+                raise asyncio.CancelledError()
+        except BaseException as e:
+            await _settle(writer.__exit__, type(e), e, e.__traceback__)
+            raise
+        try:
+            await _settle(writer.__exit__, None, None, None)
+        finally:
+            if job.job_id not in self._jobs:
+                await _settle(self.storage.delete, job.job_id)
+        return size
+
+    async def _run(self, job: Job, kind: JobKind, source: PdfSource, options: dict, filename: str, cost: float):
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        ticket = None
+        try:
+            ticket = await admission.acquire(job.client, BULK, cost, background=True)
+            job.status = RUNNING
+            job.started_at = time.time()
+            await asyncio.to_thread(self._save, job)
+
+            output = await kind.run(job, source, options, filename)
+            size = await self._write_result(job, output)
+            job.result = {"media_type": kind.media_type, "filename": kind.filename, "size": size}
+            job.done = job.total
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            # Deleted while pending or running; `delete` removes what was stored
+            raise
+        except Exception as e:
+            logger.warning(f"Job {job.job_id} ({job.kind}) failed: {e}")
+            job.status = FAILED
+            job.error = getattr(e, "detail", None) or str(e)
+        finally:
+            heartbeat.cancel()
+            if ticket is not None:
+                ticket.release()
+            self._tasks.pop(job.job_id, None)
+            if isinstance(source, str):
+                # The spooled upload was detached from its request, so the job owns it
+                try:
+                    os.remove(source)
+                except FileNotFoundError:
+                    pass
+
+        job.finished_at = time.time()
+        await asyncio.to_thread(self._save, job)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        if not JOB_ID.fullmatch(job_id):
+            return None
+        job = self._jobs.get(job_id)
+        if job is None:
+            meta = await asyncio.to_thread(self.storage.load_meta, job_id)
+            job = Job.from_dict(meta) if meta else None
+        if job is not None and job.expires_at and job.expires_at < time.time():
+            return None
+        return job
+
+    async def read_result(self, job: Job) -> Iterator[bytes]:
+        return await asyncio.to_thread(self.storage.read_result, job.job_id)
+
+    async def delete(self, job_id: str) -> bool:
+        job = await self.get(job_id)
+        if job is None:
+            return False
+        task = self._tasks.pop(job_id, None)
+        if task is not None:
+            task.cancel()
+        self._jobs.pop(job_id, None)
+        await asyncio.to_thread(self.storage.delete, job_id)
+        return True
+
+    def sweep_expired(self) -> int:
+        """Remove finished jobs past their TTL, and unfinished ones whose owner stopped updating them."""
+        removed = 0
+        now = time.time()
+        for job_id in self.storage.job_ids():
+            meta = self.storage.load_meta(job_id)
+            if meta is None or job_id in self._tasks:
+                continue
+            job = Job.from_dict(meta)
+            stale = job.status not in FINISHED and job.updated_at < now - settings.JOB_TTL
+            if stale or (job.expires_at and job.expires_at < now):
+                self.storage.delete(job_id)
+                self._jobs.pop(job_id, None)
+                removed += 1
+        for job_id, job in list(self._jobs.items()):
+            if job.expires_at and job.expires_at < now:
+                self._jobs.pop(job_id, None)
+        return removed
+
+    async def run_janitor(self):
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.sweep_expired)
+                if removed:
+                    logger.info(f"Janitor removed {removed} expired jobs")
+            except Exception as e:
+                logger.warning(f"Job janitor sweep failed: {e}")
+            await asyncio.sleep(settings.JOB_JANITOR_INTERVAL)
+
+    async def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+job_service = JobService(create_job_storage(settings.JOB_STORAGE))
+state.track_gauge("utility_api_jobs_pending", "Queued or running asynchronous jobs", [], lambda: [([], job_service.pending)])
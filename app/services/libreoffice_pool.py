@@ -0,0 +1,429 @@
+import asyncio
+import json
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import stage, state
+from app.utils.logger import logger
+
+try:
+    from app.services import uno_bridge
+except ImportError:
+    # Only a Python with LibreOffice's UNO bridge can import it; see LibreOfficePool._resolve_mode
+    uno_bridge = None
+
+# How workers talk to LibreOffice: UNO in this process, UNO through uno_bridge.py run by another
+# Python, or one `soffice --convert-to` process per job (or group of jobs)
+UNO = "uno"
+UNO_BRIDGE = "uno-bridge"
+CONVERT_TO = "convert-to"
+
+BRIDGE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uno_bridge.py")
+
+class OfficeWorker:
+    """
+    One LibreOffice instance with its own user profile.
+
+    With UNO (in this process or through the bridge script) the instance stays running and listens
+    on a named pipe, so a conversion only pays for loading and exporting the document. Profile and
+    pipe are private to this app process: several uvicorn workers on one host each start their own
+    instances without sharing a profile or attaching to each other's office. Without UNO
+    every job runs `soffice --convert-to` against this worker's private (already initialised)
+    profile, which still keeps concurrent conversions from fighting over one profile directory.
+    """
+
+    def __init__(self, index: int, soffice_path: str, profile_root: str, mode: str = CONVERT_TO, bridge_python: Optional[str] = None):
+        self.index = index
+        self.soffice_path = soffice_path
+        self.mode = mode
+        self.bridge_python = bridge_python
+        self.profile_dir = os.path.join(profile_root, str(os.getpid()), f"worker_{index}")
+        self.pipe_name = None
+        self.jobs = 0
+        self._process = None
+        self._desktop = None
+        self._bridge = None
+
+    @property
+    def profile_url(self) -> str:
+        return Path(self.profile_dir).resolve().as_uri()
+
+    # Long-lived UNO instance
+
+    async def start(self):
+        if self.mode == CONVERT_TO:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        # A fresh name per start, so a restarted instance never meets a stale pipe
+        self.pipe_name = f"utility_api_{os.getpid()}_{self.index}_{uuid.uuid4().hex[:8]}"
+        self._process = await asyncio.create_subprocess_exec(
+            self.soffice_path,
+            "--headless", "--invisible", "--nologo", "--norestore", "--nodefault", "--nolockcheck",
+            f"-env:UserInstallation={self.profile_url}",
+            f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
+        if self.mode == UNO_BRIDGE:
+            try:
+                await self._start_bridge()
+            except Exception as e:
+                await self.stop()
+                raise RuntimeError(f"LibreOffice worker {self.index} failed to start: {e}")
+            logger.info(f"LibreOffice worker {self.index} listening on pipe {self.pipe_name} (UNO bridge)")
+            return
+
+        # The first start creates the profile, which can take a few seconds
+        deadline = asyncio.get_running_loop().time() + settings.LIBREOFFICE_STARTUP_TIMEOUT
+        while True:
+            try:
+                self._desktop = await asyncio.to_thread(uno_bridge.connect, self.pipe_name)
+                logger.info(f"LibreOffice worker {self.index} listening on pipe {self.pipe_name}")
+                return
+            except Exception:
+                if self._process.returncode is not None or asyncio.get_running_loop().time() > deadline:
+                    await self.stop()
+                    raise RuntimeError(f"LibreOffice worker {self.index} failed to start")
+                await asyncio.sleep(0.25)
+
+    async def _start_bridge(self):
+        self._bridge = await asyncio.create_subprocess_exec(
+            self.bridge_python, BRIDGE_SCRIPT, self.pipe_name, str(settings.LIBREOFFICE_STARTUP_TIMEOUT),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        # The bridge retries the connection itself until the startup timeout
+        reply = await asyncio.wait_for(self._bridge.stdout.readline(), settings.LIBREOFFICE_STARTUP_TIMEOUT + 5)
+        if not reply:
+            raise RuntimeError("UNO bridge exited")
+        message = json.loads(reply)
+        if "error" in message:
+            raise RuntimeError(message["error"])
+
+    async def _call(self, request: dict, timeout: Optional[float] = None):
+        """Send one request to the bridge and wait for its reply; a failed job raises RuntimeError."""
+        self._bridge.stdin.write(json.dumps(request).encode() + b"\n")
+        await self._bridge.stdin.drain()
+        reply = await asyncio.wait_for(self._bridge.stdout.readline(), timeout)
+        if not reply:
+            raise RuntimeError("UNO bridge exited")
+        message = json.loads(reply)
+        if "error" in message:
+            raise RuntimeError(message["error"])
+
+    async def stop(self):
+        self._desktop = None
+        for process in (self._bridge, self._process):
+            if process is not None and process.returncode is None:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except (ProcessLookupError, AttributeError):
+                    process.kill()
+                await process.wait()
+        self._bridge = None
+        self._process = None
+
+    async def restart(self):
+        logger.info(f"Restarting LibreOffice worker {self.index} after {self.jobs} jobs")
+        await self.stop()
+        self.jobs = 0
+        with stage("docx", "office-startup"):
+            await self.start()
+
+    async def healthy(self) -> bool:
+        """Whether the instance still answers, within LIBREOFFICE_HEALTH_TIMEOUT; a wedged one is restarted."""
+        if self.mode == CONVERT_TO:
+            return True
+        if self._process is None or self._process.returncode is not None:
+            return False
+        try:
+            if self.mode == UNO_BRIDGE:
+                if self._bridge is None or self._bridge.returncode is not None:
+                    return False
+                await self._call({"op": "ping"}, settings.LIBREOFFICE_HEALTH_TIMEOUT)
+            else:
+                if self._desktop is None:
+                    return False
+                await asyncio.wait_for(asyncio.to_thread(self._desktop.getComponents), settings.LIBREOFFICE_HEALTH_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    # One-shot fallback
+
+    async def convert_batch(self, source_paths: list, out_dir: str):
+        process = await asyncio.create_subprocess_exec(
+            self.soffice_path,
+            f"-env:UserInstallation={self.profile_url}",
+            "--headless", "--norestore", "--nolockcheck",
+            "--convert-to", "pdf", "--outdir", out_dir, *source_paths,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            # Timed out: take the whole office process group down with us
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, AttributeError):
+                process.kill()
+            raise
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, self.soffice_path, stderr=stderr)
+
+    async def convert(self, source_path: str, pdf_path: str):
+        if self.mode == UNO:
+            await asyncio.to_thread(uno_bridge.convert, self._desktop, source_path, pdf_path)
+            return
+        if self.mode == UNO_BRIDGE:
+            await self._call({"op": "convert", "source": os.path.abspath(source_path), "pdf": os.path.abspath(pdf_path)})
+            return
+
+        out_dir = os.path.dirname(pdf_path) or "."
+        await self.convert_batch([source_path], out_dir)
+        converted_path = os.path.join(out_dir, os.path.splitext(os.path.basename(source_path))[0] + ".pdf")
+        if os.path.abspath(converted_path) != os.path.abspath(pdf_path):
+            os.replace(converted_path, pdf_path)
+
+class LibreOfficePool:
+    """
+    Fixed set of OfficeWorkers shared by all DOCX conversions.
+
+    Jobs wait for an idle worker, up to `max_queue` waiting jobs (503 beyond that). Each job
+    has a timeout after which its worker is restarted, workers are health-checked before use
+    and recycled after `max_jobs` conversions to keep LibreOffice's memory growth in check.
+    """
+
+    def __init__(self, size: int, max_queue: int, timeout: float, max_jobs: int):
+        self.size = max(1, size)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self.workers = []
+        self._idle = None
+        self._waiting = 0
+        self._start_lock = None
+        # Resolved when the pool starts; None until the first conversion
+        self.mode: Optional[str] = None
+
+    @property
+    def soffice_path(self) -> str:
+        if settings.LIBREOFFICE_PATH:
+            return settings.LIBREOFFICE_PATH
+        if platform.system() == "Windows":
+            return "C:\\Program Files\\LibreOffice\\program\\soffice.exe"
+        return shutil.which("soffice") or shutil.which("libreoffice") or "soffice"
+
+    @property
+    def profile_root(self) -> str:
+        return settings.LIBREOFFICE_PROFILE_DIR
+
+    def _remove_stale_profiles(self):
+        """Profiles are kept per app process (by pid); remove those of processes that are gone."""
+        if platform.system() == "Windows" or not os.path.isdir(self.profile_root):
+            # os.kill(pid, 0) would terminate the process on Windows
+            return
+        for name in os.listdir(self.profile_root):
+            if not name.isdigit() or int(name) == os.getpid():
+                continue
+            try:
+                os.kill(int(name), 0)
+            except ProcessLookupError:
+                shutil.rmtree(os.path.join(self.profile_root, name), ignore_errors=True)
+            except PermissionError:
+                # Alive, but another user's
+                pass
+
+    def _bridge_pythons(self, soffice_path: str) -> List[str]:
+        """Interpreters that may have the UNO module: LIBREOFFICE_PYTHON, LibreOffice's own, the system python3."""
+        program_dir = os.path.dirname(os.path.realpath(shutil.which(soffice_path) or soffice_path))
+        candidates = [settings.LIBREOFFICE_PYTHON, os.path.join(program_dir, "python"), os.path.join(program_dir, "python.exe")]
+        if platform.system() != "Windows":
+            # Distribution packages (python3-uno, libreoffice-pyuno) install it for the system interpreter
+            candidates.append("/usr/bin/python3")
+        return [path for path in candidates if path and os.path.isfile(path) and os.access(path, os.X_OK)]
+
+    async def _resolve_mode(self, soffice_path: str) -> Tuple[str, Optional[str]]:
+        if uno_bridge is not None:
+            return UNO, None
+        for python in self._bridge_pythons(soffice_path):
+            process = await asyncio.create_subprocess_exec(
+                python, "-c", "import uno", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                if await asyncio.wait_for(process.wait(), 30) == 0:
+                    return UNO_BRIDGE, python
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        logger.warning(
+            "No Python with LibreOffice's UNO module found (set LIBREOFFICE_PYTHON); "
+            "every DOCX conversion starts its own soffice process"
+        )
+        return CONVERT_TO, None
+
+    async def _start_workers(self, workers: List[OfficeWorker]):
+        """Start all workers; if any fails, the ones already running are stopped again."""
+        with stage("docx", "office-startup"):
+            results = await asyncio.gather(*(worker.start() for worker in workers), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await asyncio.gather(*(worker.stop() for worker in workers))
+            raise errors[0]
+
+    async def _ensure_started(self):
+        if self._idle is not None:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._idle is not None:
+                return
+            soffice_path = self.soffice_path
+            if not os.path.exists(soffice_path) and shutil.which(soffice_path) is None:
+                raise HTTPException(status_code=500, detail="LibreOffice not found. Please install it and ensure it's in your system's PATH.")
+
+            await asyncio.to_thread(self._remove_stale_profiles)
+            mode, bridge_python = await self._resolve_mode(soffice_path)
+            workers = [OfficeWorker(index, soffice_path, self.profile_root, mode, bridge_python) for index in range(self.size)]
+            try:
+                await self._start_workers(workers)
+            except Exception as e:
+                if mode != UNO_BRIDGE:
+                    raise
+                logger.warning(f"UNO bridge with {bridge_python} failed ({e}); every DOCX conversion starts its own soffice process")
+                mode = CONVERT_TO
+                workers = [OfficeWorker(index, soffice_path, self.profile_root) for index in range(self.size)]
+            logger.info(f"LibreOffice pool started with {self.size} workers ({mode})")
+            self.mode = mode
+            self.workers = workers
+            idle = asyncio.Queue()
+            for worker in workers:
+                idle.put_nowait(worker)
+            self._idle = idle
+
+    @asynccontextmanager
+    async def _worker(self):
+        """Wait for an idle, healthy worker and hand it back to the pool afterwards."""
+        await self._ensure_started()
+
+        if self._waiting >= self.max_queue and self._idle.empty():
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, all document converters are in use. Please retry later.",
+                headers={"Retry-After": str(settings.WORKER_RETRY_AFTER)}
+            )
+
+        self._waiting += 1
+        try:
+            with stage("docx", "wait-for-office"):
+                worker = await self._idle.get()
+        finally:
+            self._waiting -= 1
+
+        try:
+            if not await worker.healthy():
+                await worker.restart()
+            yield worker
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def _run(self, worker: OfficeWorker, job, job_count: int = 1):
+        try:
+            with stage("docx", "convert"):
+                await asyncio.wait_for(job, timeout=self.timeout * job_count)
+            worker.jobs += job_count
+            if worker.jobs >= self.max_jobs:
+                await worker.restart()
+        except asyncio.TimeoutError:
+            await worker.restart()
+            raise HTTPException(status_code=504, detail=f"Document conversion took longer than {self.timeout * job_count:g} seconds.")
+        except subprocess.CalledProcessError as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred during PDF conversion: {e}")
+        except HTTPException:
+            raise
+        except Exception as e:
+            # A UNO failure usually means the instance is wedged; start over before the next job
+            if not await worker.healthy():
+                await worker.restart()
+            raise HTTPException(status_code=500, detail=f"An error occurred during PDF conversion: {e}")
+
+    async def convert(self, source_path: str, pdf_path: str):
+        """Convert one document to PDF on the next idle worker."""
+        async with self._worker() as worker:
+            await self._run(worker, worker.convert(source_path, pdf_path))
+
+    async def convert_many(self, source_paths: List[str], out_dir: str) -> AsyncIterator[Tuple[str, Optional[Exception]]]:
+        """
+        Convert many documents into `out_dir` (each as <name>.pdf) and yield (source_path, error)
+        as they finish. Warm UNO workers take one document at a time; without UNO each worker
+        gets a group of documents for a single soffice invocation, so office startup is paid
+        once per group instead of once per file.
+        """
+        await self._ensure_started()
+        if self.mode != CONVERT_TO:
+            groups = [[path] for path in source_paths]
+        else:
+            group_count = max(self.size, -(-len(source_paths) // settings.LIBREOFFICE_BATCH_SIZE))
+            groups = [group for group in (source_paths[i::group_count] for i in range(group_count)) if group]
+
+        semaphore = asyncio.Semaphore(self.size)
+
+        async def convert_group(group):
+            async with semaphore:
+                try:
+                    async with self._worker() as worker:
+                        if worker.mode != CONVERT_TO:
+                            pdf_path = os.path.join(out_dir, os.path.splitext(os.path.basename(group[0]))[0] + ".pdf")
+                            await self._run(worker, worker.convert(group[0], pdf_path))
+                        else:
+                            await self._run(worker, worker.convert_batch(group, out_dir), len(group))
+                    return group, None
+                except Exception as e:
+                    return group, e
+
+        tasks = [asyncio.create_task(convert_group(group)) for group in groups]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                group, error = await next_done
+                for source_path in group:
+                    yield source_path, error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stop(self):
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+        self.workers = []
+        self._idle = None
+        await asyncio.to_thread(shutil.rmtree, os.path.join(self.profile_root, str(os.getpid())), ignore_errors=True)
+
+    def stats(self) -> dict:
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {"workers": len(self.workers), "busy": len(self.workers) - idle, "waiting": self._waiting}
+
+libreoffice_pool = LibreOfficePool(
+    size=settings.LIBREOFFICE_WORKERS,
+    max_queue=settings.LIBREOFFICE_MAX_QUEUE,
+    timeout=settings.LIBREOFFICE_JOB_TIMEOUT,
+    max_jobs=settings.LIBREOFFICE_MAX_JOBS
+)
+
+state.track_gauge(
+    "utility_api_libreoffice", "LibreOffice pool workers, busy workers and waiting conversions", ["state"],
+    lambda: [([name], value) for name, value in libreoffice_pool.stats().items()]
+)
@@ -1,72 +1,346 @@
+import asyncio
 import fitz
+import hashlib
 from PIL import Image
-from typing import List, Optional
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple, Union
 import io
+import json
+import struct
+import zlib
+import zipfile
 import numpy as np
-import tempfile
+import threading
+import time
 import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import add_bytes, add_pages, observe_stage, stage
+from app.core.worker_pool import WorkerPool, pdf_pool
+from app.services.template_index import template_index
+from app.utils.logger import logger
+from app.utils.page_range import parse_page_range, parse_split_spec
+from app.utils.zip_stream import astream_zip, safe_member_name, stream_zip
 
-async def convert_pdf_to_single_image(data: bytes, dpi: int = 150) -> bytes:
-    pdf = fitz.open(stream=data, filetype="pdf")
-    images = []
-    
+# progress(done, total), called as pages are finished
+Progress = Callable[[int, int], None]
+
+# Streamed outputs are produced on the worker pool in batches of STREAM_BATCH_PAGES pages; at most
+# STREAM_WINDOW batches of one response are in flight, so one download never takes every worker
+STREAM_WINDOW = 2
+
+# A PDF in memory, or the path of an upload spooled to disk. Paths are also what worker
+# processes should get for large files: pickling a path is free, pickling 200 MB is not.
+PdfSource = Union[bytes, str]
+
+def source_size(source: PdfSource) -> int:
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+def _open_pdf(source: PdfSource, operation: Optional[str] = None) -> fitz.Document:
+    if operation is None:
+        return fitz.open(source, filetype="pdf") if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+    add_bytes(operation, "in", source_size(source))
+    with stage(operation, "open"):
+        return _open_pdf(source)
+
+def _count_pages(data: PdfSource) -> int:
+    try:
+        with _open_pdf(data) as pdf:
+            return pdf.page_count
+    except Exception:
+        # Unreadable PDFs cost nothing here; the route rejects them itself
+        return 0
+
+async def count_pages(*sources: PdfSource) -> int:
+    """
+    Total page count of `sources` from their xrefs, cheap enough to run before admitting a request.
+    It runs on the worker pool all the same: a damaged PDF is repaired while it is opened, which
+    must not happen in the API process.
+    """
+    if len(sources) == 1:
+        return await pdf_pool.run(_count_pages, sources[0])
+    pages = 0
+    async for _, result in pdf_pool.imap_unordered(_count_pages, [(source,) for source in sources]):
+        if isinstance(result, Exception):
+            raise result
+        pages += result
+    return pages
+
+def _save_pdf(pdf: fitz.Document, operation: str, **options) -> bytes:
+    with stage(operation, "save"):
+        output = pdf.tobytes(**options)
+    add_bytes(operation, "out", len(output))
+    return output
+
+def _save_output(pdf: fitz.Document, operation: str, optimize: bool = False) -> bytes:
+    """Save a result document: "balanced" by default, with `optimize` fonts are subset and the "size" profile is used."""
+    if not optimize:
+        return _save_pdf(pdf, operation, **SAVE_PROFILES["balanced"])
+    with stage(operation, "subset-fonts"):
+        _subset_fonts(pdf)
+    return _save_pdf(pdf, operation, **SAVE_PROFILES["size"])
+
+def _png_chunk(tag: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload)) + tag + payload + struct.pack(">I", zlib.crc32(tag + payload))
+
+# Header of the zlib stream in IDAT (deflate, 32K window); the data follows as raw deflate pieces
+ZLIB_HEADER = b"\x78\x9c"
+# An empty final deflate block, closing a stream built from sync-flushed pieces
+DEFLATE_END = b"\x03\x00"
+ADLER_BASE = 65521
+
+def _adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """Adler-32 of two byte strings joined, from their checksums and the second one's length (zlib's adler32_combine)."""
+    remainder = length2 % ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % ADLER_BASE
+    sum1 = (sum1 + (adler2 & 0xFFFF) + ADLER_BASE - 1) % ADLER_BASE
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + ADLER_BASE - remainder) % ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+def _png_page_sizes(pdf: fitz.Document, mat: fitz.Matrix) -> List[Tuple[int, int]]:
+    # Page pixel sizes follow from the page rects, so the PNG header can be written before rendering
+    return [((page.rect * mat).irect.width, (page.rect * mat).irect.height) for page in pdf]
+
+def _png_scanlines(pix: fitz.Pixmap, width: int, height: int) -> bytes:
+    """A rendered page as `height` PNG scanlines of `width` pixels, padded with white and "Sub" filtered."""
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+
+    # Pad narrower pages with white, and clamp to the size announced in IHDR
+    rows = np.full((height, width * 3), 255, dtype=np.uint8)
+    rows[:min(height, pix.height), :min(width, pix.width) * 3] = samples[:height, :min(width, pix.width) * 3]
+    del samples
+
+    # PNG "Sub" filter (type 1): each byte minus the same channel of the previous pixel
+    scanlines = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 0] = 1
+    scanlines[:, 1:4] = rows[:, :3]
+    np.subtract(rows[:, 3:], rows[:, :-3], out=scanlines[:, 4:])
+    return scanlines.tobytes()
+
+def _iter_png_pages(pdf: fitz.Document, mat: fitz.Matrix, progress: Optional[Progress] = None) -> Iterator[bytes]:
+    """The whole PNG from one open document, for callers that already run on a worker."""
+    try:
+        sizes = _png_page_sizes(pdf, mat)
+        max_width = max(width for width, _ in sizes)
+
+        yield b"\x89PNG\r\n\x1a\n"
+        yield _png_chunk(b"IHDR", struct.pack(">IIBBBBB", max_width, sum(height for _, height in sizes), 8, 2, 0, 0, 0))
+
+        compressor = zlib.compressobj(6)
+        written = 0
+        for page_number, (page, (_, height)) in enumerate(zip(pdf, sizes), start=1):
+            with stage("convert-to-image", "render"):
+                pix = page.get_pixmap(matrix=mat, alpha=False)
+            with stage("convert-to-image", "encode"):
+                compressed = compressor.compress(_png_scanlines(pix, max_width, height))
+            del pix
+            if compressed:
+                written += len(compressed)
+                yield _png_chunk(b"IDAT", compressed)
+            if progress:
+                progress(page_number, len(sizes))
+
+        compressed = compressor.flush()
+        add_pages("convert-to-image", len(sizes))
+        add_bytes("convert-to-image", "out", written + len(compressed))
+        yield _png_chunk(b"IDAT", compressed)
+        yield _png_chunk(b"IEND", b"")
+    finally:
+        pdf.close()
+
+def _read_png_layout(data: PdfSource, dpi: int) -> List[Tuple[int, int]]:
+    scale = dpi / 72
+    with _open_pdf(data, "convert-to-image") as pdf:
+        return _png_page_sizes(pdf, fitz.Matrix(scale, scale))
+
+def _render_png_segment(data: PdfSource, dpi: int, first: int, last: int, width: int) -> Tuple[bytes, int, int]:
+    """
+    Pages first..last-1 as one piece of the IDAT data: raw deflate that ends on a byte boundary
+    (sync flush), plus the Adler-32 and length of its scanlines so the caller can close the stream.
+    """
     scale = dpi / 72
     mat = fitz.Matrix(scale, scale)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    pieces = []
+    adler, length = 1, 0
+    with _open_pdf(data) as pdf:
+        for page in pdf.pages(first, last):
+            height = (page.rect * mat).irect.height
+            with stage("convert-to-image", "render"):
+                pix = page.get_pixmap(matrix=mat, alpha=False)
+            with stage("convert-to-image", "encode"):
+                scanlines = _png_scanlines(pix, width, height)
+                del pix
+                adler = zlib.adler32(scanlines, adler)
+                length += len(scanlines)
+                pieces.append(compressor.compress(scanlines))
+    pieces.append(compressor.flush(zlib.Z_SYNC_FLUSH))
+    add_pages("convert-to-image", last - first)
+    return b"".join(pieces), adler, length
 
-    for page in pdf:
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        images.append(img)
+async def _stream_png(data: PdfSource, dpi: int, sizes: List[Tuple[int, int]], progress: Optional[Progress]) -> AsyncIterator[bytes]:
+    width = max(page_width for page_width, _ in sizes)
+    yield b"\x89PNG\r\n\x1a\n"
+    yield _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, sum(height for _, height in sizes), 8, 2, 0, 0, 0))
+    yield _png_chunk(b"IDAT", ZLIB_HEADER)
 
-    max_width = max(img.width for img in images)
-    total_height = sum(img.height for img in images)
-    combined = Image.new("RGB", (max_width, total_height), (255, 255, 255))
+    batch = settings.STREAM_BATCH_PAGES
+    segments = ((data, dpi, first, min(first + batch, len(sizes)), width) for first in range(0, len(sizes), batch))
+    adler, done, written = 1, 0, 0
+    async for segment, segment_adler, length in pdf_pool.imap(_render_png_segment, segments, window=STREAM_WINDOW):
+        adler = _adler32_combine(adler, segment_adler, length)
+        written += len(segment)
+        done = min(done + batch, len(sizes))
+        yield _png_chunk(b"IDAT", segment)
+        if progress:
+            progress(done, len(sizes))
 
-    y_offset = 0
-    for img in images:
-        combined.paste(img, (0, y_offset))
-        y_offset += img.height
+    add_bytes("convert-to-image", "out", written)
+    yield _png_chunk(b"IDAT", DEFLATE_END + struct.pack(">I", adler))
+    yield _png_chunk(b"IEND", b"")
 
+async def stream_pdf_as_png(data: PdfSource, dpi: int = 150, progress: Optional[Progress] = None) -> AsyncIterator[bytes]:
+    """
+    Render all pages below each other as one PNG, streamed while it is rendered.
+    Batches of STREAM_BATCH_PAGES pages are rendered and deflated on the worker pool, this
+    process only frames them as IDAT chunks, so peak memory stays around one batch however
+    long the document is. The page sizes are read first, so invalid input fails before
+    streaming starts. `progress(done, total)` is called after every batch.
+    """
+    sizes = await pdf_pool.run(_read_png_layout, data, dpi)
+    return _stream_png(data, dpi, sizes, progress)
+
+def _convert_pdf_to_single_image(data: PdfSource, dpi: int = 150) -> bytes:
+    scale = dpi / 72
+    return b"".join(_iter_png_pages(_open_pdf(data, "convert-to-image"), fitz.Matrix(scale, scale)))
+
+async def convert_pdf_to_single_image(data: PdfSource, dpi: int = 150) -> bytes:
+    return await pdf_pool.run(_convert_pdf_to_single_image, data, dpi)
+
+IMAGE_FORMATS = {"png": "png", "jpeg": "jpg", "jpg": "jpg", "webp": "webp"}
+
+def _encode_pixmap(pix: fitz.Pixmap, image_format: str, quality: int) -> bytes:
+    if image_format == "png":
+        return pix.tobytes("png")
+    if image_format in ("jpeg", "jpg"):
+        return pix.tobytes("jpeg", jpg_quality=quality)
+
+    # MuPDF has no WebP encoder; wrap the pixmap buffer in PIL without copying it
+    mode = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}[pix.n]
+    img = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
     buf = io.BytesIO()
-    combined.save(buf, format="PNG")
-    buf.seek(0)
+    img.save(buf, format="WEBP", quality=quality)
     return buf.getvalue()
 
-async def convert_pdf_to_text(data: bytes) -> dict:
+def _iter_page_images(pdf: fitz.Document, pages: List[int], mat: fitz.Matrix, image_format: str, grayscale: bool, alpha: bool, quality: int, progress: Optional[Progress] = None):
+    try:
+        colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+        digits = len(str(len(pdf)))
+        extension = IMAGE_FORMATS[image_format]
+        for done, page_num in enumerate(pages, start=1):
+            with stage("convert-to-images", "render"):
+                pix = pdf[page_num].get_pixmap(matrix=mat, colorspace=colorspace, alpha=alpha)
+            with stage("convert-to-images", "encode"):
+                image = _encode_pixmap(pix, image_format, quality)
+            add_pages("convert-to-images", 1)
+            add_bytes("convert-to-images", "out", len(image))
+            yield f"page_{page_num + 1:0{digits}d}.{extension}", image
+            if progress:
+                progress(done, len(pages))
+    finally:
+        pdf.close()
+
+def _read_page_selection(data: PdfSource, pages: Optional[str]) -> List[int]:
+    pdf = _open_pdf(data, "convert-to-images")
+    try:
+        return parse_page_range(pages, len(pdf))
+    finally:
+        pdf.close()
+
+def _render_page_images(data: PdfSource, page_numbers: List[int], dpi: int, image_format: str, grayscale: bool, alpha: bool, quality: int) -> List[Tuple[str, bytes]]:
+    scale = dpi / 72
+    return list(_iter_page_images(_open_pdf(data), page_numbers, fitz.Matrix(scale, scale), image_format, grayscale, alpha, quality))
+
+async def _stream_page_images(data: PdfSource, page_numbers: List[int], options: tuple, progress: Optional[Progress]) -> AsyncIterator[Tuple[str, bytes]]:
+    batch = settings.STREAM_BATCH_PAGES
+    jobs = ((data, page_numbers[first:first + batch], *options) for first in range(0, len(page_numbers), batch))
+    done = 0
+    async for images in pdf_pool.imap(_render_page_images, jobs, window=STREAM_WINDOW):
+        for name, image in images:
+            yield name, image
+        done += len(images)
+        if progress:
+            progress(done, len(page_numbers))
+
+async def stream_pdf_pages_as_zip(data: PdfSource, pages: Optional[str] = None, dpi: int = 150, image_format: str = "png", grayscale: bool = False, alpha: bool = False, quality: int = 85, progress: Optional[Progress] = None) -> AsyncIterator[bytes]:
+    """
+    Render the selected pages to individual images and stream them back as a ZIP.
+    Only the requested pages are rendered, in batches of STREAM_BATCH_PAGES on the worker pool;
+    this process only adds the returned images to the ZIP. Arguments and the page selection
+    are validated before streaming starts, so errors surface as a normal response.
+    """
+    image_format = image_format.lower()
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format '{image_format}'. Use one of: png, jpeg, webp")
+    if alpha and image_format in ("jpeg", "jpg"):
+        raise ValueError("JPEG does not support an alpha channel")
+    if not 1 <= dpi <= settings.MAX_RENDER_DPI:
+        raise ValueError(f"DPI must be between 1 and {settings.MAX_RENDER_DPI}")
+    if not 1 <= quality <= 100:
+        raise ValueError("Quality must be between 1 and 100")
+
+    page_numbers = await pdf_pool.run(_read_page_selection, data, pages)
+    images = _stream_page_images(data, page_numbers, (dpi, image_format, grayscale, alpha, quality), progress)
+    # Encoded images are already compressed, deflating them again only costs CPU
+    return astream_zip(images, compression=zipfile.ZIP_STORED)
+
+PAGE_BREAK = "\n\n--- Page Break ---\n\n"
+
+def _extract_page_structure(page: fitz.Page) -> dict:
+    # One TextPage per page serves the plain text, the blocks and the words; images are kept
+    # in it so they show up as blocks, the text and words ignore them
+    textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT | fitz.TEXT_PRESERVE_IMAGES)
+    text = page.get_text(textpage=textpage)
+    blocks = page.get_text("blocks", textpage=textpage)
+    words = page.get_text("words", textpage=textpage)
+    return {
+        "page": page.number + 1,
+        "text": text,
+        "has_text": bool(text.strip()),
+        "word_count": len(words),
+        "blocks": [
+            {
+                "bbox": [round(x0, 2), round(y0, 2), round(x1, 2), round(y1, 2)],
+                "type": "image" if block_type == 1 else "text",
+                "text": block_text if block_type == 0 else ""
+            }
+            for x0, y0, x1, y1, block_text, _, block_type in blocks
+        ]
+    }
+
+def _extract_page_texts(data: PdfSource) -> List[str]:
+    # Extract every page exactly once; callers join at the end
+    pdf = _open_pdf(data, "convert-to-text")
+    with stage("convert-to-text", "extract"):
+        page_texts = [page.get_text() for page in pdf]
+    pdf.close()
+    add_pages("convert-to-text", len(page_texts))
+    return page_texts
+
+def _convert_pdf_to_text(data: PdfSource) -> dict:
     try:
-        # Open PDF from bytes
-        pdf = fitz.open(stream=data, filetype="pdf")
+        page_texts = _extract_page_texts(data)
+        has_text = any(page_text.strip() for page_text in page_texts)
         
-        # Initialize result
-        result = {
-            "success": True,
-            "text": "",
-            "page_count": len(pdf),
-            "has_text": False,
-            "error": None
+        return {
+            "success": has_text,
+            "text": PAGE_BREAK.join(page_texts) if has_text else "",
+            "page_count": len(page_texts),
+            "has_text": has_text,
+            "error": None if has_text else "No text found in PDF. The document might be scanned or image-based."
         }
-        
-        # Check if any page has text content
-        for page_num in range(len(pdf)):
-            page = pdf[page_num]
-            if page.get_text().strip():
-                result["has_text"] = True
-                break
-        
-        # If no text found in any page
-        if not result["has_text"]:
-            result["success"] = False
-            result["error"] = "No text found in PDF. The document might be scanned or image-based."
-            return result
-        
-        # Extract text from each page
-        for i, page in enumerate(pdf):
-            page_text = page.get_text()
-            result["text"] += page_text
-            if i < len(pdf) - 1:  # Don't add page break after last page
-                result["text"] += "\n\n--- Page Break ---\n\n"
-        
-        return result
     
     except Exception as e:
         return {
@@ -76,194 +350,441 @@ async def convert_pdf_to_text(data: bytes) -> dict:
             "has_text": False,
             "error": f"Error processing PDF: {str(e)}"
         }
-    
 
-    """Extract text from PDF using EasyOCR for scanned documents"""
+async def convert_pdf_to_text(data: PdfSource) -> dict:
+    return await pdf_pool.run(_convert_pdf_to_text, data)
+
+def _convert_pdf_to_structured_text(data: PdfSource) -> dict:
     try:
-        # Initialize reader inside the function
-        reader = easyocr.Reader(lang)
-        
-        # Open PDF from bytes
-        pdf = fitz.open(stream=data, filetype="pdf")
+        pdf = _open_pdf(data, "structured-text")
+        with stage("structured-text", "extract"):
+            pages = [_extract_page_structure(page) for page in pdf]
+        add_pages("structured-text", len(pages))
+        has_text = any(page["has_text"] for page in pages)
+        pdf.close()
         
-        # Initialize result
-        result = {
-            "success": True,
-            "text": "",
-            "page_count": len(pdf),
-            "used_ocr": True,
-            "error": None
+        return {
+            "success": has_text,
+            "page_count": len(pages),
+            "has_text": has_text,
+            "pages": pages,
+            "error": None if has_text else "No text found in PDF. The document might be scanned or image-based."
         }
-        
-        # Matrix for scaling according to DPI
-        scale = dpi / 72
-        mat = fitz.Matrix(scale, scale)
-        
-        for i, page in enumerate(pdf):
-            # Render page to image
-            pix = page.get_pixmap(matrix=mat)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Convert to numpy array for EasyOCR
-            img_np = np.array(img)
-            
-            # Apply OCR to extract text
-            ocr_result = reader.readtext(img_np)
-            
-            # Extract text from EasyOCR result
-            page_text = ""
-            for detection in ocr_result:
-                text = detection[1]  # text is in the second position
-                page_text += text + " "
-            
-            result["text"] += page_text.strip()
-            
-            if i < len(pdf) - 1:
-                result["text"] += "\n\n--- Page Break ---\n\n"
-        
-        return result
     
     except Exception as e:
         return {
             "success": False,
-            "text": "",
             "page_count": 0,
-            "used_ocr": False,
-            "error": f"Error processing PDF with EasyOCR: {str(e)}"
+            "has_text": False,
+            "pages": [],
+            "error": f"Error processing PDF: {str(e)}"
         }
-        
-async def convert_pdf_to_text_with_ocr(data: bytes, dpi: int = 300, lang: list = None) -> dict:
-    """Extract text from PDF using Tesseract OCR for scanned documents"""
+
+async def convert_pdf_to_structured_text(data: PdfSource) -> dict:
+    """Per-page text, text/image blocks with bounding boxes and word counts."""
+    return await pdf_pool.run(_convert_pdf_to_structured_text, data)
+
+def _read_page_count(data: PdfSource, operation: str) -> int:
+    with _open_pdf(data, operation) as pdf:
+        return len(pdf)
+
+def _extract_text_lines(data: PdfSource, first: int, last: int) -> bytes:
+    """Pages first..last-1 as NDJSON lines."""
+    lines = []
+    with _open_pdf(data) as pdf:
+        for page in pdf.pages(first, last):
+            with stage("structured-text", "extract"):
+                lines.append(json.dumps(_extract_page_structure(page)).encode() + b"\n")
+            add_pages("structured-text", 1)
+    return b"".join(lines)
+
+async def _stream_text_lines(data: PdfSource, page_count: int) -> AsyncIterator[bytes]:
+    batch = settings.STREAM_BATCH_PAGES
+    jobs = ((data, first, min(first + batch, page_count)) for first in range(0, page_count, batch))
+    async for lines in pdf_pool.imap(_extract_text_lines, jobs, window=STREAM_WINDOW):
+        yield lines
+
+async def stream_pdf_text_ndjson(data: PdfSource) -> AsyncIterator[bytes]:
+    """
+    Stream the structured extraction as NDJSON, one page per line, so very long
+    reports never have to be held in memory as a single JSON document.
+    Pages are extracted on the worker pool in batches of STREAM_BATCH_PAGES; the PDF is
+    opened there once before streaming starts, so a broken upload surfaces as a normal response.
+    """
+    page_count = await pdf_pool.run(_read_page_count, data, "structured-text")
+    return _stream_text_lines(data, page_count)
+
+# OCR fallback for pages without a text layer
+
+# ISO 639-1 codes accepted by the API mapped to Tesseract traineddata names
+TESSERACT_LANGUAGES = {
+    "en": "eng",
+    "id": "ind",
+    "ms": "msa",
+    "ar": "ara",
+    "zh": "chi_sim",
+    "ja": "jpn",
+    "ko": "kor",
+    "nl": "nld",
+    "de": "deu",
+    "fr": "fra",
+    "es": "spa",
+}
+
+_ocr_state = threading.local()
+
+def _init_ocr_worker(own_process: bool = False):
+    if own_process:
+        # Each worker process runs one single-threaded Tesseract, so N workers map onto N cores.
+        # Thread workers live in the API process, whose environment is left alone.
+        os.environ["OMP_THREAD_LIMIT"] = "1"
+    _ocr_state.engines = {}
+
+def ocr_dpi(dpi: int) -> int:
+    """The resolution OCR pages are rendered at for a requested `dpi`, capped by OCR_MAX_DPI."""
+    return max(1, min(dpi, settings.OCR_MAX_DPI))
+
+def _get_ocr_engine(language: str):
+    """
+    Return a callable turning a PIL image into text, created once per worker and language.
+    tesserocr keeps a loaded Tesseract API alive between pages; pytesseract is the fallback.
+    """
+    engines = getattr(_ocr_state, "engines", None)
+    if engines is None:
+        _init_ocr_worker()
+        engines = _ocr_state.engines
+    if language in engines:
+        return engines[language]
+
     try:
-        # Open PDF from bytes
-        pdf = fitz.open(stream=data, filetype="pdf")
-        
-        # Initialize result
-        result = {
-            "success": True,
-            "text": "",
-            "page_count": len(pdf),
-            "used_ocr": True,
-            "error": None
-        }
-        
-        # Matrix for scaling according to DPI
-        scale = dpi / 72
-        mat = fitz.Matrix(scale, scale)
-        
-        # Use the provided language or default to English
-        language = '+'.join(lang) if lang and len(lang) > 0 else 'eng'
-        
-        for i, page in enumerate(pdf):
-            try:
-                # Render page to image
-                pix = page.get_pixmap(matrix=mat)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                # Apply OCR to extract text with language support
-                page_text = pytesseract.image_to_string(img, lang=language)
-                result["text"] += page_text
-                
-                if i < len(pdf) - 1:
-                    result["text"] += "\n\n--- Page Break ---\n\n"
-            except Exception as page_error:
-                # If an individual page fails, log the error but continue with other pages
-                result["text"] += f"\n\n--- Error processing page {i+1}: {str(page_error)} ---\n\n"
-        
-        return result
+        import tesserocr
+        api = tesserocr.PyTessBaseAPI(lang=language)
+
+        def engine(img):
+            api.SetImage(img)
+            return api.GetUTF8Text()
+    except ImportError:
+        try:
+            import pytesseract
+        except ImportError:
+            raise RuntimeError("OCR is not available. Install tesseract and pytesseract (or tesserocr).")
+        if settings.TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
+
+        def engine(img):
+            return pytesseract.image_to_string(img, lang=language)
+
+    engines[language] = engine
+    return engine
+
+def _ocr_pages(data: PdfSource, page_numbers: List[int], dpi: int, language: str) -> List[dict]:
+    pdf = _open_pdf(data, "ocr")
+    scale = dpi / 72
+    mat = fitz.Matrix(scale, scale)
+    results = []
+    
+    for page_num in page_numbers:
+        started = time.perf_counter()
+        try:
+            engine = _get_ocr_engine(language)
+            with stage("ocr", "render"):
+                pix = pdf[page_num].get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+                img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+            with stage("ocr", "recognize"):
+                text, error = engine(img), None
+        except Exception as page_error:
+            # If an individual page fails, report it but continue with other pages
+            text, error = "", str(page_error)
+        results.append({
+            "page": page_num + 1,
+            "text": text,
+            "seconds": round(time.perf_counter() - started, 3),
+            "error": error
+        })
     
+    pdf.close()
+    add_pages("ocr", len(page_numbers))
+    return results
+
+ocr_pool = WorkerPool(
+    "ocr",
+    max_workers=settings.OCR_WORKERS,
+    max_queue=settings.OCR_MAX_QUEUE,
+    timeout=settings.OCR_JOB_TIMEOUT,
+    kind=settings.WORKER_POOL_KIND,
+    initializer=_init_ocr_worker,
+    initargs=(settings.WORKER_POOL_KIND != "thread",)
+)
+
+async def convert_pdf_to_text_with_ocr(data: PdfSource, dpi: int = 300, lang: list = None, progress: Optional[Progress] = None) -> dict:
+    """
+    Extract text from PDF, running Tesseract OCR only on pages without a text layer.
+    OCR pages are spread over the OCR worker pool and each one reports its timing.
+    `progress(done, total)` counts pages with a text layer as done straight away.
+    """
+    try:
+        page_texts = await pdf_pool.run(_extract_page_texts, data)
+    except HTTPException:
+        raise
     except Exception as e:
         return {
             "success": False,
             "text": "",
             "page_count": 0,
+            "has_text": False,
             "used_ocr": False,
-            "error": f"Error processing PDF with Tesseract OCR: {str(e)}"
+            "ocr_pages": [],
+            "error": f"Error processing PDF: {str(e)}"
         }
+    
+    empty_pages = [i for i, page_text in enumerate(page_texts) if not page_text.strip()]
+    ocr_pages = []
+    
+    if empty_pages:
+        dpi = ocr_dpi(dpi)
+        # Use the provided language or default to English
+        language = "+".join(TESSERACT_LANGUAGES.get(code.strip(), code.strip()) for code in lang if code.strip()) if lang else ""
+        language = language or "eng"
         
-async def replace_template_with_image(pdf_data: bytes, template_text: str, image_data: bytes, image_width: float = None, image_height: float = None) -> bytes:
-    try:
-        # Open the PDF
-        pdf = fitz.open(stream=pdf_data, filetype="pdf")
-        
-        # Load image
-        img_temp = tempfile.NamedTemporaryFile(delete=False)
-        img_temp.write(image_data)
-        img_temp.close()
+        # One chunk per worker, interleaved so expensive runs of pages are shared out
+        chunk_count = min(len(empty_pages), ocr_pool.max_workers)
+        chunks = [empty_pages[i::chunk_count] for i in range(chunk_count)]
+        done = len(page_texts) - len(empty_pages)
+        if progress:
+            progress(done, len(page_texts))
+
+        async def run_chunk(chunk):
+            nonlocal done
+            result = await ocr_pool.run(_ocr_pages, data, chunk, dpi, language)
+            done += len(chunk)
+            if progress:
+                progress(done, len(page_texts))
+            return result
+
+        chunk_results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
         
-        # Track if we found and replaced any instances
-        replacements_made = False
+        for page_result in sorted((r for chunk in chunk_results for r in chunk), key=lambda r: r["page"]):
+            page_texts[page_result["page"] - 1] = page_result.pop("text")
+            ocr_pages.append(page_result)
+    
+    has_text = any(page_text.strip() for page_text in page_texts)
+    error = None
+    if not has_text:
+        error = "No text found in PDF, including with OCR."
+        failures = [p["error"] for p in ocr_pages if p["error"]]
+        if failures:
+            error += f" OCR error: {failures[0]}"
+    
+    return {
+        "success": has_text,
+        "text": PAGE_BREAK.join(page_texts) if has_text else "",
+        "page_count": len(page_texts),
+        "has_text": has_text,
+        "used_ocr": bool(ocr_pages),
+        "ocr_pages": ocr_pages,
+        "error": error
+    }
+
+# Signing: replace template placeholders such as ${sign} with images
+
+def _template_fingerprint(pdf: fitz.Document) -> str:
+    """
+    Identify a generated form by its page count, first page size and where the text blocks
+    on page 1 start. Filled-in values change what blocks contain, not where they begin.
+    """
+    first_page = pdf[0]
+    layout = sorted((round(x0), round(y0)) for x0, y0, _, _, _, _, block_type in first_page.get_text("blocks") if block_type == 0)
+    raw = json.dumps([len(pdf), round(first_page.rect.width), round(first_page.rect.height), layout])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _search_template(pdf: fitz.Document, template_text: str) -> List[Tuple[int, fitz.Rect]]:
+    return [(page.number, rect) for page in pdf for rect in page.search_for(template_text)]
+
+def _cached_template_rects(pdf: fitz.Document, template_text: str, placements: List[list]) -> Optional[List[Tuple[int, fitz.Rect]]]:
+    # Reading the text inside a known rect is far cheaper than searching every page,
+    # and guards against a fingerprint collision placing images in the wrong spot
+    rects = []
+    for page_num, x0, y0, x1, y1 in placements:
+        rect = fitz.Rect(x0, y0, x1, y1)
+        if page_num >= len(pdf) or template_text not in pdf[page_num].get_textbox(rect + (-1, -1, 1, 1)):
+            return None
+        rects.append((page_num, rect))
+    return rects
+
+def _locate_templates(pdf_data: PdfSource, template_texts: List[str]) -> dict:
+    pdf = _open_pdf(pdf_data, "register-template")
+    with stage("register-template", "search"):
+        placements = {
+            template_text: [[page_num, rect.x0, rect.y0, rect.x1, rect.y1] for page_num, rect in _search_template(pdf, template_text)]
+            for template_text in template_texts
+        }
+    result = {
+        "fingerprint": _template_fingerprint(pdf),
+        "page_count": len(pdf),
+        "placements": {template_text: found for template_text, found in placements.items() if found}
+    }
+    pdf.close()
+    return result
+
+def _stamp_templates(pdf: fitz.Document, mappings: List[Tuple[str, bytes, Optional[float], Optional[float]]]) -> Tuple[dict, bool]:
+    """
+    Replace every occurrence of each mapping's template text with its image.
+
+    `mappings` holds (template_text, image_data, image_width, image_height) tuples and all of
+    them are applied in one pass over the open document. When the document's fingerprint is in
+    the template index, its registered placements are used instead of searching the pages.
+    Each image is embedded on its first hit only; later hits point at the same xref, so it is
+    stored once per document however often the template appears.
+
+    Returns the number of placements per template text and whether the template index was used.
+    """
+    placements = None
+    if not template_index.is_empty():
+        placements = template_index.placements(_template_fingerprint(pdf))
+    
+    counts = {}
+    index_used = False
+    for template_text, image_data, image_width, image_height in mappings:
+        rects = None
+        if placements and template_text in placements:
+            rects = _cached_template_rects(pdf, template_text, placements[template_text])
+            index_used = index_used or rects is not None
+        if rects is None:
+            rects = _search_template(pdf, template_text)
         
-        # Process each page
-        for page_num in range(len(pdf)):
+        xref = 0
+        for page_num, rect in rects:
             page = pdf[page_num]
             
-            # Search for the template text in the page
-            text_instances = page.search_for(template_text)
+            # If custom dimensions are provided, center the image at the midpoint of the found text
+            if image_width and image_height:
+                mid_x = (rect.x0 + rect.x1) / 2
+                mid_y = (rect.y0 + rect.y1) / 2
+                rect = fitz.Rect(
+                    mid_x - (image_width / 2),
+                    mid_y - (image_height / 2),
+                    mid_x + (image_width / 2),
+                    mid_y + (image_height / 2)
+                )
             
-            for inst in text_instances:
-                replacements_made = True
-                
-                # Calculate dimensions for the image
-                rect = inst
-                
-                # If custom dimensions are provided, adjust the rectangle
-                if image_width and image_height:
-                    # Center the image at the midpoint of the found text
-                    mid_x = (rect.x0 + rect.x1) / 2
-                    mid_y = (rect.y0 + rect.y1) / 2
-                    rect.x0 = mid_x - (image_width / 2)
-                    rect.x1 = mid_x + (image_width / 2)
-                    rect.y0 = mid_y - (image_height / 2)
-                    rect.y1 = mid_y + (image_height / 2)
-                
-                # Remove the template text by adding white rectangle
-                page.draw_rect(rect, color=(1, 1, 1), fill=(1, 1, 1))
-                
-                # Insert the image
-                page.insert_image(rect, filename=img_temp.name)
-        
-        # Clean up the temporary file
-        os.unlink(img_temp.name)
+            # Remove the template text by adding white rectangle
+            page.draw_rect(rect, color=(1, 1, 1), fill=(1, 1, 1))
+            
+            # Insert the image, reusing the already embedded one after the first hit
+            if xref:
+                page.insert_image(rect, xref=xref)
+            else:
+                xref = page.insert_image(rect, stream=image_data)
         
-        if not replacements_made:
+        counts[template_text] = len(rects)
+    
+    return counts, index_used
+
+def _replace_templates_with_images(pdf_data: PdfSource, mappings: List[Tuple[str, bytes, Optional[float], Optional[float]]], optimize: bool = False) -> dict:
+    try:
+        pdf = _open_pdf(pdf_data, "sign")
+        with stage("sign", "stamp"):
+            counts, index_used = _stamp_templates(pdf, mappings)
+        missing = [template_text for template_text, count in counts.items() if not count]
+        if len(missing) == len(counts):
+            pdf.close()
             return {
                 "success": False,
-                "error": f"Template text '{template_text}' not found in the document.",
-                "pdf_data": None
+                "error": f"Template text '{', '.join(missing)}' not found in the document.",
+                "pdf_data": None,
+                "placements": counts,
+                "template_index_used": index_used
             }
         
         # Save the modified PDF
-        output_buffer = io.BytesIO()
-        pdf.save(output_buffer)
+        pdf_bytes = _save_output(pdf, "sign", optimize)
+        add_pages("sign", len(pdf))
         pdf.close()
         
         return {
             "success": True,
             "error": None,
-            "pdf_data": output_buffer.getvalue()
+            "pdf_data": pdf_bytes,
+            "placements": counts,
+            "template_index_used": index_used
         }
         
     except Exception as e:
-        # Clean up the temporary file if it exists
-        try:
-            if 'img_temp' in locals() and os.path.exists(img_temp.name):
-                os.unlink(img_temp.name)
-        except:
-            pass
-        
         return {
             "success": False,
             "error": f"Error replacing template with image: {str(e)}",
-            "pdf_data": None
+            "pdf_data": None,
+            "placements": {},
+            "template_index_used": False
         }
+
+def _replace_template_with_image(pdf_data: PdfSource, template_text: str, image_data: bytes, image_width: float = None, image_height: float = None, optimize: bool = False) -> dict:
+    return _replace_templates_with_images(pdf_data, [(template_text, image_data, image_width, image_height)], optimize)
+        
+async def replace_template_with_image(pdf_data: PdfSource, template_text: str, image_data: bytes, image_width: float = None, image_height: float = None, optimize: bool = False) -> dict:
+    return await pdf_pool.run(_replace_template_with_image, pdf_data, template_text, image_data, image_width, image_height, optimize)
+
+async def replace_templates_with_images(pdf_data: PdfSource, mappings: List[Tuple[str, bytes, Optional[float], Optional[float]]], optimize: bool = False) -> dict:
+    """Apply several template -> image mappings in one pass and one save."""
+    return await pdf_pool.run(_replace_templates_with_images, pdf_data, mappings, optimize)
+
+async def register_template(pdf_data: PdfSource, template_texts: List[str]) -> dict:
+    """
+    Locate the template texts in a sample document and remember where they are, so
+    documents generated from the same form can skip searching for them.
+    """
+    located = await pdf_pool.run(_locate_templates, pdf_data, template_texts)
+    if not located["placements"]:
+        raise ValueError(f"None of the template texts {template_texts} were found in the document.")
+    return await asyncio.to_thread(template_index.register, located["fingerprint"], located["page_count"], located["placements"])
+
+async def sign_pdf_batch(documents: List[Tuple[str, PdfSource]], template_text: str, image_data: bytes, image_width: float = None, image_height: float = None, optimize: bool = False) -> AsyncIterator[bytes]:
+    """
+    Stamp one image into many PDFs in parallel and stream back a ZIP.
+    Signed documents are added as soon as their worker finishes; a manifest.json with
+    the status of every input is written last.
+    """
+    manifest = [None] * len(documents)
+    
+    async def members():
+        jobs = [(pdf_data, template_text, image_data, image_width, image_height, optimize) for _, pdf_data in documents]
+        async for index, result in pdf_pool.imap_unordered(_replace_template_with_image, jobs):
+            filename = documents[index][0]
+            if isinstance(result, HTTPException):
+                result = {"success": False, "error": result.detail, "pdf_data": None}
+            elif isinstance(result, Exception) or (not result["success"] and not result["placements"]):
+                # Errors of the PDF library name the spooled upload path; keep them in the server log
+                logger.warning(f"Batch signing of '{filename}' failed: {result if isinstance(result, Exception) else result['error']}")
+                result = {"success": False, "error": "The PDF could not be opened or signed.", "pdf_data": None}
+            
+            output_name = f"{index + 1:04d}_signed_{os.path.basename(filename)}" if result["success"] else None
+            manifest[index] = {"file": filename, "success": result["success"], "output": output_name, "error": result["error"]}
+            if result["success"]:
+                yield output_name, result["pdf_data"]
         
-async def is_page_body_empty(page: fitz.Page, header_margin: float = 0.15, footer_margin: float = 0.15, text_threshold: int = 20) -> bool:
+        yield "manifest.json", json.dumps(manifest, indent=2).encode()
+    
+    # PDF streams are mostly compressed already, storing keeps the event loop free
+    async for chunk in astream_zip(members(), compression=zipfile.ZIP_STORED):
+        yield chunk
+
+def is_page_body_empty(page: fitz.Page, header_margin: float = 0.15, footer_margin: float = 0.15, text_threshold: int = 20, ink_threshold: float = 0.001) -> bool:
     """
     Check if a page body is empty, ignoring headers and footers.
-    A page is considered empty if its body has very little text, no significant images, and no vector graphics.
     The body is the area of the page excluding the top and bottom margins.
+
+    Cheapest checks go first:
+    1. A page without content streams is empty.
+    2. More than `text_threshold` characters of text in the body means it is not empty.
+    3. Otherwise the body is rendered in grayscale at a low DPI, with the remaining text masked
+       out, and the page is empty when less than `ink_threshold` of the pixels carry ink.
+       This covers images and vector graphics without enumerating every drawing.
     """
+    # 1. Content stream check
+    doc = page.parent
+    if not any(doc.xref_stream_raw(xref) for xref in page.get_contents()):
+        return True
+    
     page_rect = page.rect
     page_height = page_rect.height
     
@@ -274,35 +795,33 @@ async def is_page_body_empty(page: fitz.Page, header_margin: float = 0.15, foote
         page_rect.x1,
         page_rect.y1 - page_height * footer_margin
     )
+    if body_rect.is_empty:
+        return True
 
-    # 1. Check for text content within the body
-    text = page.get_text("text", clip=body_rect)
-    if len(text.strip()) > text_threshold:
+    # 2. Check for text content within the body
+    words = page.get_text("words", clip=body_rect)
+    if len(" ".join(word[4] for word in words)) > text_threshold:
         return False
 
-    # 2. Check for images within the body
-    images = page.get_images(full=True)
-    for img_info in images:
-        img_rects = page.get_image_rects(img_info[0])
-        for rect in img_rects:
-            if rect.intersects(body_rect):
-                # Check if the intersection area is significant
-                if rect.intersect(body_rect).get_area() > 100: # ignore very small images/logos
-                    return False
-
-    # 3. Check for vector graphics (drawings) within the body
-    drawings = page.get_drawings()
-    for path in drawings:
-        if path["rect"].intersects(body_rect):
-            # If any drawing is in the body, it's not empty
-            return False
-
-    return True
-
-async def split_pdf_by_pages(data: bytes, start_page: int = 1, end_page: Optional[int] = None) -> bytes:
+    # 3. Measure the ink in a low resolution render of the body
+    scale = settings.EMPTY_PAGE_DPI / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=body_rect, colorspace=fitz.csGRAY, alpha=False)
+    if not pix.width or not pix.height:
+        return True
+    pixels = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width].copy()
+    
+    # The few characters tolerated by the text check must not count as ink
+    for x0, y0, x1, y1, *_ in words:
+        left = max(0, int((x0 - body_rect.x0) * scale))
+        top = max(0, int((y0 - body_rect.y0) * scale))
+        pixels[top:int((y1 - body_rect.y0) * scale) + 1, left:int((x1 - body_rect.x0) * scale) + 1] = 255
+    
+    ink_ratio = np.count_nonzero(pixels < 240) / pixels.size
+    return ink_ratio < ink_threshold
+
+def _split_pdf_by_pages(data: PdfSource, start_page: int = 1, end_page: Optional[int] = None, optimize: bool = False) -> bytes:
     try:
-        # Open the PDF
-        pdf = fitz.open(stream=data, filetype="pdf")
+        pdf = _open_pdf(data, "split")
         
         # Validate page numbers
         total_pages = len(pdf)
@@ -318,47 +837,462 @@ async def split_pdf_by_pages(data: bytes, start_page: int = 1, end_page: Optiona
         new_pdf = fitz.open()  # Create empty PDF
         
         # Copy pages (convert to 0-based indexing)
-        new_pdf.insert_pdf(pdf, from_page=start_page-1, to_page=end_page-1)
+        with stage("split", "copy"):
+            new_pdf.insert_pdf(pdf, from_page=start_page-1, to_page=end_page-1)
         
         # Save to bytes
-        output_buffer = io.BytesIO()
-        new_pdf.save(output_buffer)
+        pdf_bytes = _save_output(new_pdf, "split", optimize)
+        add_pages("split", len(new_pdf))
         new_pdf.close()
         pdf.close()
         
-        return output_buffer.getvalue()
+        return pdf_bytes
         
     except Exception as e:
         raise Exception(f"Error splitting PDF: {str(e)}")
 
-async def remove_empty_pages(data: bytes) -> bytes:
+async def split_pdf_by_pages(data: PdfSource, start_page: int = 1, end_page: Optional[int] = None, optimize: bool = False) -> bytes:
+    return await pdf_pool.run(_split_pdf_by_pages, data, start_page, end_page, optimize)
+
+# Save options for new documents: "speed" writes objects as they are, "size" deduplicates
+# and compresses everything, "balanced" drops unused objects and deflates streams
+SAVE_PROFILES = {
+    "speed": {"garbage": 0, "deflate": False},
+    "balanced": {"garbage": 1, "deflate": True},
+    "size": {"garbage": 4, "deflate": True, "deflate_images": True, "deflate_fonts": True, "use_objstms": 1, "clean": True},
+}
+
+def _contiguous_runs(pages: List[int]) -> List[Tuple[int, int]]:
+    runs = []
+    for page_num in pages:
+        if runs and page_num == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], page_num)
+        else:
+            runs.append((page_num, page_num))
+    return runs
+
+def _iter_split_outputs(pdf: fitz.Document, outputs: List[Tuple[str, List[int]]], profile: str, first_index: int = 1, digits: Optional[int] = None):
+    try:
+        digits = digits or len(str(len(outputs)))
+        for index, (label, pages) in enumerate(outputs, start=first_index):
+            part = fitz.open()
+            # Copy runs of consecutive pages with one insert_pdf call each
+            with stage("split", "copy"):
+                for from_page, to_page in _contiguous_runs(pages):
+                    part.insert_pdf(pdf, from_page=from_page, to_page=to_page)
+            output = _save_pdf(part, "split", **SAVE_PROFILES[profile])
+            add_pages("split", len(part))
+            part.close()
+            yield f"{index:0{digits}d}_{safe_member_name(label)}.pdf", output
+    finally:
+        pdf.close()
+
+def _plan_split(data: PdfSource, spec: str) -> List[Tuple[str, List[int]]]:
+    pdf = _open_pdf(data, "split")
+    try:
+        outputs = parse_split_spec(spec, len(pdf), pdf.get_toc(simple=True))
+    finally:
+        pdf.close()
+    if len(outputs) > settings.BATCH_MAX_FILES:
+        raise ValueError(f"A split may produce at most {settings.BATCH_MAX_FILES} files")
+    return outputs
+
+def _build_split_outputs(data: PdfSource, outputs: List[Tuple[str, List[int]]], profile: str, first_index: int, digits: int) -> List[Tuple[str, bytes]]:
+    return list(_iter_split_outputs(_open_pdf(data), outputs, profile, first_index, digits))
+
+def _split_batches(outputs: List[Tuple[str, List[int]]]) -> Iterator[Tuple[int, List[Tuple[str, List[int]]]]]:
+    # Whole outputs of together about STREAM_BATCH_PAGES pages per job, numbered from 1
+    batch, pages, first_index = [], 0, 1
+    for index, output in enumerate(outputs, start=1):
+        if not batch:
+            first_index = index
+        batch.append(output)
+        pages += len(output[1])
+        if pages >= settings.STREAM_BATCH_PAGES:
+            yield first_index, batch
+            batch, pages = [], 0
+    if batch:
+        yield first_index, batch
+
+async def _stream_split_outputs(data: PdfSource, outputs: List[Tuple[str, List[int]]], profile: str) -> AsyncIterator[Tuple[str, bytes]]:
+    digits = len(str(len(outputs)))
+    jobs = ((data, batch, profile, first_index, digits) for first_index, batch in _split_batches(outputs))
+    async for parts in pdf_pool.imap(_build_split_outputs, jobs, window=STREAM_WINDOW):
+        for name, part in parts:
+            yield name, part
+
+async def stream_pdf_split(data: PdfSource, spec: str, profile: str = "balanced") -> AsyncIterator[bytes]:
+    """
+    Split one upload into many PDFs described by `spec` (see parse_split_spec) and stream them as a ZIP.
+    The spec is resolved in a pool job before streaming starts; outputs are then built on the
+    worker pool in batches of about STREAM_BATCH_PAGES pages and sent in order.
+    """
+    if profile not in SAVE_PROFILES:
+        raise ValueError(f"Save profile must be one of: {', '.join(SAVE_PROFILES)}")
+
+    outputs = await pdf_pool.run(_plan_split, data, spec)
+    return astream_zip(_stream_split_outputs(data, outputs, profile), compression=zipfile.ZIP_STORED)
+
+def _remove_empty_pages(data: PdfSource, header_margin: float = 0.15, footer_margin: float = 0.15, text_threshold: int = 20, ink_threshold: float = 0.001, optimize: bool = False) -> bytes:
     """
     Removes empty pages from a PDF document.
     An empty page is defined by the 'is_page_body_empty' function.
     """
     try:
-        # Open the original PDF
-        pdf = fitz.open(stream=data, filetype="pdf")
-        
-        # Create a new PDF to store non-empty pages
-        new_pdf = fitz.open()
+        pdf = _open_pdf(data, "remove-empty-pages")
         
-        # Iterate through all pages and add non-empty ones to the new PDF
-        for page_num in range(len(pdf)):
-            page = pdf.load_page(page_num)
-            if not await is_page_body_empty(page):
-                new_pdf.insert_pdf(pdf, from_page=page_num, to_page=page_num)
+        with stage("remove-empty-pages", "detect"):
+            keep = [
+                page.number for page in pdf
+                if not is_page_body_empty(page, header_margin, footer_margin, text_threshold, ink_threshold)
+            ]
+        add_pages("remove-empty-pages", len(pdf))
         
-        if len(new_pdf) == 0:
+        if not keep:
             raise ValueError("All pages in the document were considered empty.")
 
+        # Keep the non-empty pages in one go; garbage collection drops objects only the removed pages used
+        if len(keep) < len(pdf):
+            pdf.select(keep)
+
         # Save the new PDF to a buffer
-        output_buffer = io.BytesIO()
-        new_pdf.save(output_buffer)
-        new_pdf.close()
+        pdf_bytes = _save_output(pdf, "remove-empty-pages", optimize)
         pdf.close()
         
-        return output_buffer.getvalue()
+        return pdf_bytes
         
+    except ValueError:
+        raise
     except Exception as e:
         raise Exception(f"Error removing empty pages: {str(e)}")
+
+async def remove_empty_pages(data: PdfSource, header_margin: float = 0.15, footer_margin: float = 0.15, text_threshold: int = 20, ink_threshold: float = 0.001, optimize: bool = False) -> bytes:
+    return await pdf_pool.run(_remove_empty_pages, data, header_margin, footer_margin, text_threshold, ink_threshold, optimize)
+
+# Optimization: fonts, embedded images and a compacting save
+
+# Images are only downsampled when shown noticeably above the target resolution
+DOWNSAMPLE_SLACK = 1.2
+# Filters whose data JPEG would make larger or worse (scans in bitonal compression)
+KEEP_IMAGE_FILTERS = ("JBIG2Decode", "CCITTFaxDecode")
+
+def _subset_fonts(pdf: fitz.Document):
+    try:
+        pdf.subset_fonts()
+    except Exception:
+        # Fonts MuPDF cannot subset stay as they are; the save still compacts everything else
+        pass
+
+def _image_resolutions(pdf: fitz.Document) -> dict:
+    """Lowest resolution (DPI) every image xref is shown at; the image must stay sharp there."""
+    resolutions = {}
+    for page in pdf:
+        for info in page.get_image_info(xrefs=True):
+            xref = info["xref"]
+            a, b, c, d, _, _ = info["transform"]
+            # Lengths of the image's unit vectors in points, correct for rotated placements too
+            shown_width, shown_height = math.hypot(a, b), math.hypot(c, d)
+            if not xref or not shown_width or not shown_height:
+                continue
+            resolution = min(info["width"] * 72 / shown_width, info["height"] * 72 / shown_height)
+            resolutions[xref] = min(resolutions.get(xref, resolution), resolution)
+    return resolutions
+
+def _decode_image(pdf: fitz.Document, xref: int) -> Optional[fitz.Pixmap]:
+    """The image as an RGB or gray pixmap, or None when it should be left alone (masks, transparency, bitonal)."""
+    if pdf.xref_get_key(xref, "SMask")[0] != "null" or pdf.xref_get_key(xref, "ImageMask")[1] == "true":
+        return None
+    if pdf.xref_get_key(xref, "BitsPerComponent")[1] == "1" or any(name in pdf.xref_get_key(xref, "Filter")[1] for name in KEEP_IMAGE_FILTERS):
+        return None
+    pix = fitz.Pixmap(pdf, xref)
+    if pix.alpha:
+        return None
+    if pix.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return pix
+
+def _encode_jpeg(pix: fitz.Pixmap, size: Tuple[int, int], quality: int) -> bytes:
+    # Runs on a thread: PIL releases the GIL while resampling and encoding, fitz is not touched
+    mode = "L" if pix.n == 1 else "RGB"
+    image = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+    if size != image.size:
+        image = image.resize(size, Image.LANCZOS)
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+def _replace_image_stream(pdf: fitz.Document, xref: int, jpeg: bytes, size: Tuple[int, int], gray: bool):
+    # Rewriting the object in place keeps every page and form that uses it pointing at the new data
+    pdf.update_stream(xref, jpeg, compress=False)
+    for key, value in (
+        ("Filter", "/DCTDecode"), ("Width", str(size[0])), ("Height", str(size[1])),
+        ("ColorSpace", "/DeviceGray" if gray else "/DeviceRGB"), ("BitsPerComponent", "8"),
+        ("DecodeParms", "null"), ("Decode", "null")
+    ):
+        pdf.xref_set_key(xref, key, value)
+
+def _optimize_images(pdf: fitz.Document, dpi: int, quality: int) -> int:
+    """
+    Downsample images shown above `dpi` and recompress JPEGs at `quality`, keeping each result only
+    when it is smaller. Decoding and writing back use fitz on this thread; resampling and encoding run
+    on OPTIMIZE_IMAGE_THREADS threads, a batch at a time so only a few decoded images are held at once.
+    Returns the number of images rewritten.
+    """
+    candidates = []
+    for xref, resolution in _image_resolutions(pdf).items():
+        downsample = resolution > dpi * DOWNSAMPLE_SLACK
+        if downsample or "DCTDecode" in pdf.xref_get_key(xref, "Filter")[1]:
+            candidates.append((xref, dpi / resolution if downsample else 1.0))
+
+    rewritten = 0
+    threads = max(1, settings.OPTIMIZE_IMAGE_THREADS)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for start in range(0, len(candidates), threads * 2):
+            batch = []
+            for xref, scale in candidates[start:start + threads * 2]:
+                pix = _decode_image(pdf, xref)
+                if pix is None:
+                    continue
+                size = (max(1, round(pix.width * scale)), max(1, round(pix.height * scale)))
+                batch.append((xref, pix, size, executor.submit(_encode_jpeg, pix, size, quality)))
+            for xref, pix, size, future in batch:
+                jpeg = future.result()
+                if len(jpeg) < len(pdf.xref_stream_raw(xref)):
+                    _replace_image_stream(pdf, xref, jpeg, size, pix.n == 1)
+                    rewritten += 1
+    return rewritten
+
+def _optimize_document(pdf: fitz.Document, operation: str, image_dpi: int, image_quality: int, subset_fonts: bool) -> dict:
+    """Apply the optimize options to an open document in place; the caller saves it with the "size" profile."""
+    images = 0
+    if subset_fonts:
+        with stage(operation, "subset-fonts"):
+            _subset_fonts(pdf)
+    if image_dpi:
+        with stage(operation, "images"):
+            images = _optimize_images(pdf, image_dpi, image_quality)
+    return {"images_rewritten": images}
+
+def validate_optimize_options(image_dpi: int, image_quality: int):
+    if not 0 <= image_dpi <= settings.MAX_RENDER_DPI:
+        raise ValueError(f"Image DPI must be between 0 (keep images) and {settings.MAX_RENDER_DPI}")
+    if not 1 <= image_quality <= 100:
+        raise ValueError("Image quality must be between 1 and 100")
+
+def _optimize_pdf(data: PdfSource, image_dpi: int = 150, image_quality: int = 75, subset_fonts: bool = True) -> dict:
+    pdf = _open_pdf(data, "optimize")
+    try:
+        stats = _optimize_document(pdf, "optimize", image_dpi, image_quality, subset_fonts)
+        output = _save_pdf(pdf, "optimize", **SAVE_PROFILES["size"])
+        add_pages("optimize", len(pdf))
+    finally:
+        pdf.close()
+
+    original_size = source_size(data)
+    if len(output) >= original_size:
+        # Already as compact as we can make it: hand back the original untouched
+        if isinstance(data, bytes):
+            output = data
+        else:
+            with open(data, "rb") as f:
+                output = f.read()
+    return {"pdf_data": output, "original_size": original_size, "optimized_size": len(output), **stats}
+
+async def optimize_pdf(data: PdfSource, image_dpi: int = 150, image_quality: int = 75, subset_fonts: bool = True) -> dict:
+    """
+    Shrink a PDF: subset fonts, downsample images shown above `image_dpi` (0 keeps images as they are)
+    and recompress them as JPEG at `image_quality`, then save with deduplication, deflate and object
+    streams. The original is returned when the result would not be smaller.
+    """
+    return await pdf_pool.run(_optimize_pdf, data, image_dpi, image_quality, subset_fonts)
+
+# Pipeline: several operations on one open document, saved or rendered once at the end
+
+# Steps that transform the document, with their options and defaults
+PIPELINE_STEPS = {
+    "remove-empty-pages": {"header_margin": 0.15, "footer_margin": 0.15, "text_threshold": 20, "ink_threshold": 0.001},
+    "split-by-range": {"start_page": 1, "end_page": None},
+    "sign": {"template_text": "${sign}", "image": None, "image_width": None, "image_height": None},
+}
+# Steps that produce the output; only allowed last, "save" is implied when none is given
+PIPELINE_OUTPUTS = {
+    "save": {"save_profile": "balanced"},
+    "convert-to-image": {"dpi": 150},
+    "convert-to-images": {"pages": None, "dpi": 150, "image_format": "png", "grayscale": False, "alpha": False, "quality": 85},
+    "split-multi": {"spec": None, "save_profile": "balanced"},
+    "optimize": {"image_dpi": 150, "image_quality": 75, "subset_fonts": True},
+}
+PIPELINE_MEDIA_TYPES = {
+    "save": ("application/pdf", "pipeline.pdf"),
+    "optimize": ("application/pdf", "optimized.pdf"),
+    "convert-to-image": ("image/png", "combined.png"),
+    "convert-to-images": ("application/zip", "pages.zip"),
+    "split-multi": ("application/zip", "split.zip"),
+}
+
+# Options that default to None but take a number when given; all others take the type of their default
+PIPELINE_NUMBER_OPTIONS = {"end_page": int, "image_width": float, "image_height": float}
+PIPELINE_OPTION_TYPES = {bool: "true or false", int: "a whole number", float: "a number"}
+
+def _pipeline_option(index: int, op: str, name: str, default, value):
+    if value is None:
+        return default
+    kind = PIPELINE_NUMBER_OPTIONS.get(name, type(default))
+    if kind is bool:
+        valid = isinstance(value, bool)
+    elif kind in (int, float):
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if valid and kind is int:
+            valid = float(value).is_integer()
+            value = int(value) if valid else value
+    else:
+        valid = isinstance(value, str)
+    if not valid:
+        raise ValueError(f"Step {index} ({op}): '{name}' must be {PIPELINE_OPTION_TYPES.get(kind, 'a string')}, got {json.dumps(value, default=str)}")
+    return value
+
+def parse_pipeline(steps: list, images: dict) -> List[dict]:
+    """
+    Validate a pipeline such as [{"op": "remove-empty-pages"}, {"op": "sign"}, {"op": "convert-to-image", "dpi": 100}]
+    and fill in defaults. `images` maps uploaded image filenames to their bytes; a sign step names
+    its image with "image" and may leave it out when exactly one was uploaded.
+    Raises ValueError on anything that would only fail after the work has been done.
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("Steps must be a non-empty JSON list")
+    if len(steps) > settings.PIPELINE_MAX_STEPS:
+        raise ValueError(f"A pipeline may have at most {settings.PIPELINE_MAX_STEPS} steps")
+
+    parsed = []
+    for index, step in enumerate(steps, start=1):
+        op = step.get("op") if isinstance(step, dict) else None
+        options = PIPELINE_STEPS.get(op) or PIPELINE_OUTPUTS.get(op)
+        if options is None:
+            raise ValueError(f"Step {index}: unknown op '{op}'. Use one of: {', '.join([*PIPELINE_STEPS, *PIPELINE_OUTPUTS])}")
+        if op in PIPELINE_OUTPUTS and index != len(steps):
+            raise ValueError(f"Step {index}: '{op}' produces the output and must be the last step")
+        unknown = set(step) - set(options) - {"op"}
+        if unknown:
+            raise ValueError(f"Step {index}: unknown option(s) {', '.join(sorted(unknown))} for '{op}'")
+        parsed.append({"op": op, **{name: _pipeline_option(index, op, name, default, step.get(name)) for name, default in options.items()}})
+
+    if parsed[-1]["op"] not in PIPELINE_OUTPUTS:
+        parsed.append({"op": "save", **PIPELINE_OUTPUTS["save"]})
+
+    for step in parsed:
+        op = step["op"]
+        if op == "remove-empty-pages":
+            if step["header_margin"] < 0 or step["footer_margin"] < 0 or step["header_margin"] + step["footer_margin"] >= 1:
+                raise ValueError("Margins must be positive and leave part of the page as body")
+            if not 0 <= step["ink_threshold"] <= 1:
+                raise ValueError("Ink threshold must be between 0 and 1")
+        elif op == "split-by-range":
+            if step["start_page"] < 1:
+                raise ValueError("Start page must be at least 1")
+            if step["end_page"] is not None and step["end_page"] < step["start_page"]:
+                raise ValueError(f"End page must be at least the start page ({step['start_page']})")
+        elif op == "sign":
+            name = step["image"] if step["image"] is not None else (next(iter(images)) if len(images) == 1 else None)
+            if name not in images:
+                raise ValueError(f"Sign step needs one of the uploaded images: {', '.join(images) or 'none uploaded'}")
+            step["image_data"] = images[name]
+        elif op in ("convert-to-image", "convert-to-images"):
+            if not 1 <= step["dpi"] <= settings.MAX_RENDER_DPI:
+                raise ValueError(f"DPI must be between 1 and {settings.MAX_RENDER_DPI}")
+            if op == "convert-to-images":
+                step["image_format"] = step["image_format"].lower()
+                if step["image_format"] not in IMAGE_FORMATS:
+                    raise ValueError(f"Unsupported image format '{step['image_format']}'. Use one of: png, jpeg, webp")
+                if step["alpha"] and step["image_format"] in ("jpeg", "jpg"):
+                    raise ValueError("JPEG does not support an alpha channel")
+                if not 1 <= step["quality"] <= 100:
+                    raise ValueError("Quality must be between 1 and 100")
+        elif op in ("save", "split-multi"):
+            if step["save_profile"] not in SAVE_PROFILES:
+                raise ValueError(f"Save profile must be one of: {', '.join(SAVE_PROFILES)}")
+            if op == "split-multi" and not step["spec"]:
+                raise ValueError("Split specification is required")
+        elif op == "optimize":
+            validate_optimize_options(step["image_dpi"], step["image_quality"])
+    return parsed
+
+def _apply_pipeline_step(pdf: fitz.Document, step: dict):
+    op = step["op"]
+    if op == "remove-empty-pages":
+        keep = [
+            page.number for page in pdf
+            if not is_page_body_empty(page, step["header_margin"], step["footer_margin"], step["text_threshold"], step["ink_threshold"])
+        ]
+        if not keep:
+            raise ValueError("All pages in the document were considered empty.")
+        if len(keep) < len(pdf):
+            pdf.select(keep)
+    elif op == "split-by-range":
+        start_page, end_page = step["start_page"], step["end_page"] or len(pdf)
+        if start_page < 1 or start_page > len(pdf):
+            raise ValueError(f"Start page must be between 1 and {len(pdf)}")
+        if end_page < start_page or end_page > len(pdf):
+            raise ValueError(f"End page must be between {start_page} and {len(pdf)}")
+        if end_page - start_page + 1 < len(pdf):
+            pdf.select(list(range(start_page - 1, end_page)))
+    elif op == "sign":
+        counts, _ = _stamp_templates(pdf, [(step["template_text"], step["image_data"], step["image_width"], step["image_height"])])
+        if not counts[step["template_text"]]:
+            raise ValueError(f"Template text '{step['template_text']}' not found in the document.")
+
+def _pipeline_output(pdf: fitz.Document, step: dict) -> bytes:
+    op = step["op"]
+    if op == "save":
+        return _save_pdf(pdf, "pipeline", **SAVE_PROFILES[step["save_profile"]])
+    if op == "optimize":
+        _optimize_document(pdf, "pipeline", step["image_dpi"], step["image_quality"], step["subset_fonts"])
+        return _save_pdf(pdf, "pipeline", **SAVE_PROFILES["size"])
+    if op == "convert-to-image":
+        scale = step["dpi"] / 72
+        return b"".join(_iter_png_pages(pdf, fitz.Matrix(scale, scale)))
+    if op == "convert-to-images":
+        scale = step["dpi"] / 72
+        images = _iter_page_images(
+            pdf, parse_page_range(step["pages"], len(pdf)), fitz.Matrix(scale, scale),
+            step["image_format"], step["grayscale"], step["alpha"], step["quality"]
+        )
+        return b"".join(stream_zip(images, compression=zipfile.ZIP_STORED))
+    outputs = parse_split_spec(step["spec"], len(pdf), pdf.get_toc(simple=True))
+    if len(outputs) > settings.BATCH_MAX_FILES:
+        raise ValueError(f"A split may produce at most {settings.BATCH_MAX_FILES} files")
+    return b"".join(stream_zip(_iter_split_outputs(pdf, outputs, step["save_profile"]), compression=zipfile.ZIP_STORED))
+
+def _run_pdf_pipeline(data: PdfSource, steps: List[dict]) -> dict:
+    timings = []
+    pdf = None
+    try:
+        started = time.perf_counter()
+        pdf = _open_pdf(data, "pipeline")
+        timings.append(["open", time.perf_counter() - started])
+        add_pages("pipeline", len(pdf))
+
+        for index, step in enumerate(steps, start=1):
+            started = time.perf_counter()
+            try:
+                if step["op"] in PIPELINE_OUTPUTS:
+                    output = _pipeline_output(pdf, step)
+                else:
+                    _apply_pipeline_step(pdf, step)
+            except ValueError as ve:
+                raise ValueError(f"Step {index} ({step['op']}): {ve}")
+            elapsed = time.perf_counter() - started
+            observe_stage("pipeline", step["op"], elapsed)
+            timings.append([step["op"], elapsed])
+
+        return {"output": output, "timings": timings}
+    finally:
+        # Output steps that stream close the document themselves
+        if pdf is not None and not pdf.is_closed:
+            pdf.close()
+
+async def run_pdf_pipeline(data: PdfSource, steps: List[dict]) -> dict:
+    """
+    Run parsed `steps` (see parse_pipeline) on one open document in a single worker job.
+    Returns the output bytes and [step, seconds] timings, starting with opening the document.
+    """
+    return await pdf_pool.run(_run_pdf_pipeline, data, steps)
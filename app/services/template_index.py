@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import time
+from typing import List, Optional
+from app.core.config import settings
+
+class TemplateIndex:
+    """
+    Registered form layouts and where their placeholders sit.
+
+    Keyed by the fingerprint computed in pdf_service, each entry maps a template text such as
+    ${sign} to [page, x0, y0, x1, y1] placements. Entries are JSON files in `directory`, so they
+    survive restarts and are shared by every app process; workers read only the entry matching
+    the document they stamp. Bounded to `max_entries`, least recently registered first out.
+    """
+
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"{fingerprint}.json")
+
+    def _read(self, path: str) -> Optional[dict]:
+        try:
+            with open(path, "rb") as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            # Removed meanwhile, or a file that is not ours
+            return None
+
+    def _files(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+
+    def register(self, fingerprint: str, page_count: int, placements: dict) -> dict:
+        entry = {
+            "template_id": fingerprint[:16],
+            "fingerprint": fingerprint,
+            "page_count": page_count,
+            "placements": placements,
+            "registered_at": int(time.time())
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(fingerprint)
+        # Write to a temp name first so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self._evict()
+        return entry
+
+    def _evict(self):
+        files = []
+        for path in self._files():
+            try:
+                files.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        for _, path in sorted(files)[:max(0, len(files) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def is_empty(self) -> bool:
+        """Cheap check that lets workers skip fingerprinting documents while nothing is registered."""
+        try:
+            with os.scandir(self.directory) as entries:
+                return not any(entry.name.endswith(".json") for entry in entries)
+        except FileNotFoundError:
+            return True
+
+    def placements(self, fingerprint: str) -> Optional[dict]:
+        """Placements registered for `fingerprint`, None when the layout is unknown. Called in the workers."""
+        entry = self._read(self._path(fingerprint))
+        return entry["placements"] if entry else None
+
+    def get(self, template_id: str) -> Optional[dict]:
+        if not re.fullmatch(r"[0-9a-f]{16}", template_id):
+            return None
+        for path in self._files():
+            if os.path.basename(path).startswith(template_id):
+                return self._read(path)
+        return None
+
+    def remove(self, template_id: str) -> bool:
+        entry = self.get(template_id)
+        if entry is None:
+            return False
+        try:
+            os.remove(self._path(entry["fingerprint"]))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list(self) -> List[dict]:
+        entries = [entry for entry in map(self._read, self._files()) if entry]
+        return sorted(entries, key=lambda entry: entry["registered_at"])
+
+template_index = TemplateIndex(settings.TEMPLATE_INDEX_DIR, settings.TEMPLATE_INDEX_SIZE)
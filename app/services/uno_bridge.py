@@ -0,0 +1,80 @@
+"""
+UNO access to one LibreOffice instance listening on a named pipe.
+
+Imported by the LibreOffice pool when the app's own interpreter has the `uno` module. Otherwise
+the pool runs this file as a script with a Python that does have it (LibreOffice's bundled
+python, or the system python3 with the distribution's UNO package):
+
+    python uno_bridge.py PIPE_NAME STARTUP_TIMEOUT
+
+The script connects to the instance, then answers one JSON request per stdin line with one JSON
+reply per stdout line: {"op": "convert", "source": path, "pdf": path} or {"op": "ping"}. It only
+uses the standard library and uno, so nothing from the app has to be importable there.
+"""
+import json
+import os
+import sys
+import time
+
+import uno
+from com.sun.star.beans import PropertyValue
+
+def _property(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+def connect(pipe_name):
+    """The Desktop of the instance listening on `pipe_name`; raises while it is still starting."""
+    local_context = uno.getComponentContext()
+    resolver = local_context.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local_context)
+    context = resolver.resolve(f"uno:pipe,name={pipe_name};urp;StarOffice.ComponentContext")
+    return context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+def convert(desktop, source_path, pdf_path):
+    document = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(os.path.abspath(source_path)),
+        "_blank",
+        0,
+        (_property("Hidden", True), _property("ReadOnly", True))
+    )
+    try:
+        document.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)), (_property("FilterName", "writer_pdf_Export"),))
+    finally:
+        document.close(True)
+
+def _reply(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+def main():
+    pipe_name, timeout = sys.argv[1], float(sys.argv[2])
+
+    # The first start creates the profile, which can take a few seconds
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            desktop = connect(pipe_name)
+            break
+        except Exception as e:
+            if time.monotonic() > deadline:
+                _reply({"error": f"could not connect to LibreOffice on pipe {pipe_name}: {e}"})
+                return 1
+            time.sleep(0.25)
+    _reply({"ready": True})
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            if request["op"] == "convert":
+                convert(desktop, request["source"], request["pdf"])
+            else:
+                desktop.getComponents()
+            _reply({"ok": True})
+        except Exception as e:
+            _reply({"error": str(e) or type(e).__name__})
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
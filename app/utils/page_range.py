@@ -0,0 +1,82 @@
+import re
+from typing import List, Optional, Tuple
+
+# "5", "1-3", "8-" (to the last page) or "-4" (from the first one)
+PAGE_RANGE = re.compile(r"(\d*)\s*(?:(-)\s*(\d*))?")
+
+def _whole_number(text: str, description: str) -> int:
+    if not re.fullmatch(r"\s*\d+\s*", text):
+        raise ValueError(f"{description} must be a whole number, got '{text.strip()}'")
+    return int(text)
+
+def parse_page_range(spec: Optional[str], page_count: int) -> List[int]:
+    """
+    Parse a 1-based page selection such as "1-3,5,8-" into 0-based page indexes.
+    An empty spec selects every page. Raises ValueError on malformed or out-of-range input.
+    """
+    if spec is None or not spec.strip():
+        return list(range(page_count))
+
+    pages = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = PAGE_RANGE.fullmatch(part)
+        if match is None or not (match.group(1) or match.group(3)):
+            raise ValueError(f"Invalid page range '{part}', expected a page such as '5' or a range such as '1-3' or '8-'")
+        start_text, dash, end_text = match.groups()
+        start = int(start_text) if start_text else 1
+        end = (int(end_text) if end_text else page_count) if dash else start
+
+        if start < 1 or end > page_count or start > end:
+            raise ValueError(f"Invalid page range '{part}', document has {page_count} pages")
+        pages.extend(range(start - 1, end))
+
+    if not pages:
+        raise ValueError("No pages selected")
+    return pages
+
+def parse_split_spec(spec: str, page_count: int, toc: Optional[List[list]] = None) -> List[Tuple[str, List[int]]]:
+    """
+    Parse a split specification into (label, 0-based pages) outputs.
+
+    - "1-3,5;8-12;13-20": one output per ";" separated page range
+    - "every:N": consecutive chunks of N pages
+    - "bookmarks" or "bookmarks:LEVEL": one output per bookmark of that level (default 1),
+      running until the next one; pages before the first bookmark become their own output
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        raise ValueError("Split specification is required")
+    keyword, _, argument = spec.partition(":")
+    keyword = keyword.strip().lower()
+
+    if keyword == "every":
+        size = _whole_number(argument, f"Chunk size in '{spec}'")
+        if size < 1:
+            raise ValueError("Chunk size must be at least 1")
+        return [
+            (f"pages_{start + 1}-{min(start + size, page_count)}", list(range(start, min(start + size, page_count))))
+            for start in range(0, page_count, size)
+        ]
+
+    if keyword == "bookmarks":
+        level = _whole_number(argument, f"Bookmark level in '{spec}'") if argument.strip() else 1
+        starts = []
+        for entry_level, title, page in toc or []:
+            # Bookmarks without a target page (page < 1) cannot start an output
+            if entry_level == level and page >= 1 and (not starts or page - 1 > starts[-1][1]):
+                starts.append((title, page - 1))
+        if not starts:
+            raise ValueError(f"Document has no level {level} bookmarks")
+        if starts[0][1] > 0:
+            starts.insert(0, ("front_matter", 0))
+        ends = [start for _, start in starts[1:]] + [page_count]
+        return [(title, list(range(start, end))) for (title, start), end in zip(starts, ends)]
+
+    outputs = []
+    for part in spec.split(";"):
+        if part.strip():
+            outputs.append((f"pages_{part.strip().replace(',', '_')}", parse_page_range(part, page_count)))
+    return outputs
@@ -0,0 +1,127 @@
+import io
+import os
+import uuid
+import zipfile
+import zlib
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Tuple, Union
+
+class _ZipSink:
+    """Write-only file object that hands out whatever ZipFile wrote since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(members: Iterable[Tuple[str, bytes]], compression: int = zipfile.ZIP_DEFLATED) -> Iterator[bytes]:
+    """
+    Build a ZIP archive incrementally from (name, payload) pairs.
+    The sink is not seekable, so ZipFile writes data descriptors and each member
+    can be sent to the client as soon as it has been produced.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=compression) as archive:
+        for name, payload in members:
+            archive.writestr(name, payload)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+async def astream_zip(members: AsyncIterable[Tuple[str, bytes]], compression: int = zipfile.ZIP_STORED) -> AsyncIterator[bytes]:
+    """Async variant of stream_zip for members produced by coroutines (e.g. a worker pool)."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=compression) as archive:
+        async for name, payload in members:
+            archive.writestr(name, payload)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+def safe_member_name(label: str) -> str:
+    """Reduce a user supplied label to something safe to use as a ZIP member name."""
+    cleaned = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in label).strip("._")
+    return cleaned[:80] or "part"
+
+# Members are extracted in chunks of this size, so memory stays flat whatever the archive holds
+READ_CHUNK_SIZE = 1024 * 1024
+# Small members may compress very well (blank pages, empty documents) without being a risk
+RATIO_GRACE_BYTES = 1024 * 1024
+
+def _check_member(name: str, size: int, compressed: int, max_member_bytes: int, max_ratio: int):
+    if size > max_member_bytes:
+        raise ValueError(f"'{name}' exceeds the maximum size of {max_member_bytes} bytes")
+    if size > RATIO_GRACE_BYTES and size > max(compressed, 1) * max_ratio:
+        raise ValueError(f"'{name}' expands to more than {max_ratio} times its compressed size")
+
+def read_zip_members(data: Union[bytes, str], extensions: Tuple[str, ...], max_files: int, max_member_bytes: int, max_total_bytes: int, max_ratio: int, directory: str) -> List[Tuple[str, str]]:
+    """
+    Extract the files with one of `extensions` from an uploaded ZIP, given as bytes or a path,
+    into `directory` and return (name, path) pairs; the caller removes the files.
+    The central directory is checked first, then every member is decompressed in chunks and
+    the bytes actually produced are counted against the per-file, total and compression ratio
+    limits, so a header that understates sizes gets no further than one chunk past them.
+    Raises ValueError on invalid archives or limits being exceeded, after removing what was extracted.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data) if isinstance(data, bytes) else data)
+    except zipfile.BadZipFile:
+        raise ValueError("Archive is not a valid ZIP file")
+
+    members = []
+    try:
+        with archive:
+            infos = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and info.filename.lower().endswith(extensions)
+                and not os.path.basename(info.filename).startswith(("._", "~$"))
+            ]
+            if len(infos) > max_files:
+                raise ValueError(f"Archive contains more than {max_files} files")
+            for info in infos:
+                _check_member(info.filename, info.file_size, info.compress_size, max_member_bytes, max_ratio)
+            if sum(info.file_size for info in infos) > max_total_bytes:
+                raise ValueError(f"Archive expands to more than {max_total_bytes} bytes")
+
+            os.makedirs(directory, exist_ok=True)
+            total = 0
+            for info in infos:
+                path = os.path.join(directory, uuid.uuid4().hex)
+                members.append((info.filename, path))
+                size = 0
+                try:
+                    with archive.open(info) as source, open(path, "wb") as target:
+                        while chunk := source.read(READ_CHUNK_SIZE):
+                            size += len(chunk)
+                            total += len(chunk)
+                            _check_member(info.filename, size, info.compress_size, max_member_bytes, max_ratio)
+                            if total > max_total_bytes:
+                                raise ValueError(f"Archive expands to more than {max_total_bytes} bytes")
+                            target.write(chunk)
+                except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError, RuntimeError) as e:
+                    raise ValueError(f"'{info.filename}' could not be extracted: {e}")
+    except BaseException:
+        for _, path in members:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        raise
+    return members
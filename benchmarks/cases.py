@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from benchmarks.fixtures import PDF_KINDS, SIGN_TEMPLATE
+
+@dataclass
+class Inputs:
+    """What one case invocation works on: the fixture bytes and how many pages (or items) it has."""
+    kind: str
+    pages: int
+    data: bytes
+    signature: bytes
+
+@dataclass
+class Case:
+    """
+    One benchmarked operation. `direct` calls the service the way the route does and returns the
+    number of output bytes; `http` returns the request (url and httpx keyword arguments) for the
+    same work through the ASGI app.
+    """
+    name: str
+    kinds: Tuple[str, ...]
+    direct: Callable[[Inputs], Awaitable[int]]
+    http: Callable[[Inputs], Tuple[str, dict]]
+    max_pages: int = 1000
+    requires: Tuple[str, ...] = field(default_factory=tuple)
+
+    def available(self) -> Optional[str]:
+        """None when the case can run here, otherwise the reason it is skipped."""
+        for binary in self.requires:
+            if binary == "soffice" and os.getenv("LIBREOFFICE_PATH"):
+                continue
+            if binary == "tesseract" and os.getenv("TESSERACT_CMD"):
+                continue
+            if shutil.which(binary) is None:
+                return f"{binary} not found"
+        return None
+
+def _pdf_file(inputs: Inputs, field_name: str = "file") -> dict:
+    return {field_name: (f"{inputs.kind}-{inputs.pages}.pdf", inputs.data, "application/pdf")}
+
+def _signature_file(inputs: Inputs, field_name: str = "image_file") -> tuple:
+    return (field_name, ("signature.png", inputs.signature, "image/png"))
+
+def _items(inputs: Inputs) -> list:
+    return [{"data": f"INV-{number:06d}", "label": f"Invoice {number}"} for number in range(inputs.pages)]
+
+async def _drain(chunks) -> int:
+    return sum([len(chunk) async for chunk in chunks])
+
+async def _drain_stream(stream: Awaitable) -> int:
+    # Streaming services validate first, then return the chunks
+    return await _drain(await stream)
+
+def _pdf_cases() -> Dict[str, Case]:
+    from app.services import pdf_service as pdf
+
+    pipeline_steps = [{"op": "remove-empty-pages"}, {"op": "sign"}, {"op": "save"}]
+
+    async def sign(inputs: Inputs) -> int:
+        result = await pdf.replace_template_with_image(inputs.data, SIGN_TEMPLATE, inputs.signature)
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        return len(result["pdf_data"])
+
+    async def pipeline(inputs: Inputs) -> int:
+        steps = pdf.parse_pipeline(pipeline_steps, {"signature.png": inputs.signature})
+        return len((await pdf.run_pdf_pipeline(inputs.data, steps))["output"])
+
+    cases = [
+        Case(
+            "convert-to-image", PDF_KINDS,
+            lambda inputs: _length(pdf.convert_pdf_to_single_image(inputs.data, dpi=150)),
+            lambda inputs: ("/v1/pdf/convert-to-image", {"files": _pdf_file(inputs)}),
+            max_pages=100
+        ),
+        Case(
+            "convert-to-images", PDF_KINDS,
+            lambda inputs: _drain_stream(pdf.stream_pdf_pages_as_zip(inputs.data, dpi=150, image_format="png")),
+            lambda inputs: ("/v1/pdf/convert-to-images", {"files": _pdf_file(inputs)}),
+            max_pages=100
+        ),
+        Case(
+            "convert-to-text", ("text", "vector"),
+            lambda inputs: _length(pdf.convert_pdf_to_text(inputs.data), key="text"),
+            lambda inputs: ("/v1/pdf/convert-to-text", {"files": _pdf_file(inputs), "params": {"ocr": "false"}})
+        ),
+        Case(
+            "convert-to-text-structured", ("text", "vector"),
+            lambda inputs: _length(pdf.convert_pdf_to_structured_text(inputs.data), key="pages"),
+            lambda inputs: ("/v1/pdf/convert-to-text", {"files": _pdf_file(inputs), "params": {"mode": "structured"}})
+        ),
+        Case(
+            "convert-to-text-ocr", ("scanned",),
+            lambda inputs: _length(pdf.convert_pdf_to_text_with_ocr(inputs.data, 300, ["en"]), key="text"),
+            lambda inputs: ("/v1/pdf/convert-to-text", {"files": _pdf_file(inputs), "params": {"language": "en"}}),
+            max_pages=10,
+            requires=("tesseract",)
+        ),
+        Case(
+            "sign", ("text",),
+            sign,
+            lambda inputs: ("/v1/pdf/sign", {"files": [("pdf_file", _pdf_file(inputs)["file"]), _signature_file(inputs)]})
+        ),
+        Case(
+            "split-by-range", PDF_KINDS,
+            lambda inputs: _length(pdf.split_pdf_by_pages(inputs.data, 1, max(1, inputs.pages // 2))),
+            lambda inputs: ("/v1/pdf/split-by-range", {"files": _pdf_file(inputs), "data": {"start_page": 1, "end_page": max(1, inputs.pages // 2)}})
+        ),
+        Case(
+            "split-multi", PDF_KINDS,
+            lambda inputs: _drain_stream(pdf.stream_pdf_split(inputs.data, "every:10")),
+            lambda inputs: ("/v1/pdf/split-multi", {"files": _pdf_file(inputs), "data": {"spec": "every:10"}})
+        ),
+        Case(
+            "remove-empty-pages", PDF_KINDS,
+            lambda inputs: _length(pdf.remove_empty_pages(inputs.data)),
+            lambda inputs: ("/v1/pdf/remove-empty-pages", {"files": _pdf_file(inputs)})
+        ),
+        Case(
+            "optimize", PDF_KINDS,
+            lambda inputs: _length(pdf.optimize_pdf(inputs.data), key="pdf_data"),
+            lambda inputs: ("/v1/pdf/optimize", {"files": _pdf_file(inputs)}),
+            max_pages=100
+        ),
+        Case(
+            "pipeline", ("text",),
+            pipeline,
+            lambda inputs: ("/v1/pdf/pipeline", {
+                "files": [("file", _pdf_file(inputs)["file"]), _signature_file(inputs, "image_files")],
+                "data": {"steps": json.dumps(pipeline_steps)}
+            })
+        ),
+    ]
+    return {case.name: case for case in cases}
+
+def _barcode_cases() -> Dict[str, Case]:
+    from app.services.barcode_service import barcode_service
+
+    def single(barcode_type: str, width: int, height: int, render: str) -> Case:
+        return Case(
+            f"barcode-{barcode_type}", ("items",),
+            lambda inputs: _length(barcode_service.generate_barcode("INV-000001", barcode_type, "PNG", width, height, render=render)),
+            lambda inputs: ("/v1/barcode/generate-barcode", {"data": {"data": "INV-000001", "barcode_type": barcode_type, "width": width, "height": height, "render": render}}),
+            max_pages=1
+        )
+
+    layout = {"page_size": "a4", "columns": 3, "rows": 8, "margin_mm": 10}
+    cases = [
+        single("qr", 250, 250, "resample"),
+        # Resampled 1D codes take width and height as module sizes, exact ones as pixels
+        single("code128", 400, 150, "exact"),
+        Case(
+            "barcode-bulk-zip", ("items",),
+            lambda inputs: _drain(barcode_service.generate_bulk_zip(_items(inputs), "qr", "PNG", 250, 250)),
+            lambda inputs: ("/v1/barcode/generate-bulk", {"data": {"items": json.dumps(_items(inputs)), "output": "zip"}})
+        ),
+        Case(
+            "barcode-label-sheet", ("items",),
+            lambda inputs: _label_sheet(barcode_service, inputs, layout),
+            lambda inputs: ("/v1/barcode/generate-bulk", {"data": {"items": json.dumps(_items(inputs)), "output": "pdf", **layout}})
+        ),
+    ]
+    return {case.name: case for case in cases}
+
+async def _label_sheet(service, inputs: Inputs, layout: dict) -> int:
+    sheet, failed = await service.generate_label_sheet(
+        _items(inputs), "qr", 250, 250, layout["page_size"], layout["columns"], layout["rows"], layout["margin_mm"] * 72 / 25.4, True
+    )
+    if failed:
+        raise RuntimeError(f"{len(failed)} labels failed")
+    return len(sheet)
+
+def _docx_cases() -> Dict[str, Case]:
+    from app.services.docx_service import docx_service
+
+    async def convert(inputs: Inputs) -> int:
+        path = await docx_service.convert_file_to_pdf(f"docx-{inputs.pages}.docx", inputs.data)
+        try:
+            return os.path.getsize(path)
+        finally:
+            docx_service.cleanup(path)
+
+    case = Case(
+        "docx-to-pdf", ("docx",),
+        convert,
+        lambda inputs: ("/v1/docx/docx-to-pdf", {
+            "files": {"file": (f"docx-{inputs.pages}.docx", inputs.data, "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+        }),
+        max_pages=100,
+        requires=("soffice",)
+    )
+    return {case.name: case}
+
+async def _length(result: Awaitable, key: Optional[str] = None) -> int:
+    value = await result
+    if key is not None:
+        if isinstance(value, dict) and value.get("success") is False:
+            raise RuntimeError(value.get("error"))
+        value = value[key]
+    return len(value)
+
+def all_cases() -> Dict[str, Case]:
+    """Every case by name. Imports the services, so call it after the environment is set up."""
+    return {**_pdf_cases(), **_barcode_cases(), **_docx_cases()}
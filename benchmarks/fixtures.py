@@ -0,0 +1,156 @@
+import io
+import os
+import random
+import zipfile
+import fitz
+from PIL import Image, ImageDraw
+
+# Synthetic inputs for the benchmarks. Every generator is seeded, so the same name always
+# produces the same document; generated files are kept in the fixtures directory.
+
+PDF_KINDS = ("text", "scanned", "vector")
+PAGE_COUNTS = (1, 10, 100, 1000)
+SIGN_TEMPLATE = "${sign}"
+
+WORDS = (
+    "invoice amount payment due date customer account number total balance service period "
+    "agreement contract party hereby signed witness schedule annex clause section article "
+    "delivery order quantity unit price tax discount reference office address city region"
+).split()
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def _write_text_page(page: fitz.Page, rng: random.Random, number: int, pages: int):
+    page.insert_text((72, 50), f"Synthetic document - page {number + 1} of {pages}", fontsize=9)
+    # Every seventh page has nothing but its header and footer, so remove-empty-pages has work to do
+    if number % 7 != 6:
+        body = "\n".join(_sentence(rng, rng.randint(8, 14)) for _ in range(38))
+        page.insert_textbox(fitz.Rect(72, 72, page.rect.width - 72, page.rect.height - 90), body, fontsize=10)
+    if number == pages - 1:
+        page.insert_text((400, page.rect.height - 110), SIGN_TEMPLATE, fontsize=11)
+    page.insert_text((72, page.rect.height - 40), f"Footer {number + 1}", fontsize=8)
+
+def make_text_pdf(pages: int, seed: int = 1) -> bytes:
+    """Text-only pages with a text layer, the ${sign} placeholder on the last page."""
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    for number in range(pages):
+        _write_text_page(pdf.new_page(), rng, number, pages)
+    data = pdf.tobytes(garbage=1, deflate=True)
+    pdf.close()
+    return data
+
+def make_scanned_pdf(pages: int, seed: int = 2, dpi: int = 100) -> bytes:
+    """Every page one grayscale JPEG with light noise and no text layer, like an office scanner produces."""
+    rng = random.Random(seed)
+    scale = dpi / 72
+    pdf = fitz.open()
+    source = fitz.open()
+    for number in range(pages):
+        text_page = source.new_page()
+        _write_text_page(text_page, rng, number, pages)
+        pix = text_page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+        image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        draw = ImageDraw.Draw(image)
+        for _ in range(400):
+            x, y = rng.randrange(pix.width), rng.randrange(pix.height)
+            draw.point((x, y), fill=rng.randint(150, 230))
+        buf = io.BytesIO()
+        image.rotate(rng.uniform(-0.6, 0.6), fillcolor=255).save(buf, format="JPEG", quality=70)
+
+        page = pdf.new_page()
+        page.insert_image(page.rect, stream=buf.getvalue())
+        source.delete_page(0)
+    data = pdf.tobytes(garbage=1)
+    pdf.close()
+    source.close()
+    return data
+
+def make_vector_pdf(pages: int, seed: int = 3, shapes: int = 400) -> bytes:
+    """Pages of lines, curves and filled shapes (drawings, plans, charts) with a little text."""
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    for number in range(pages):
+        page = pdf.new_page()
+        width, height = page.rect.width, page.rect.height
+        point = lambda: fitz.Point(rng.uniform(36, width - 36), rng.uniform(72, height - 72))
+        shape = page.new_shape()
+        for index in range(shapes):
+            kind = index % 4
+            if kind == 0:
+                shape.draw_line(point(), point())
+            elif kind == 1:
+                shape.draw_bezier(point(), point(), point(), point())
+            elif kind == 2:
+                shape.draw_rect(fitz.Rect(point(), point()))
+            else:
+                shape.draw_circle(point(), rng.uniform(2, 30))
+            shape.finish(color=(rng.random(), rng.random(), rng.random()), fill=(rng.random(), rng.random(), rng.random()) if kind >= 2 else None, width=rng.uniform(0.2, 2))
+        shape.commit()
+        page.insert_text((72, 50), f"Drawing sheet {number + 1}", fontsize=12)
+    data = pdf.tobytes(garbage=1, deflate=True)
+    pdf.close()
+    return data
+
+PDF_GENERATORS = {"text": make_text_pdf, "scanned": make_scanned_pdf, "vector": make_vector_pdf}
+
+def make_docx(pages: int, seed: int = 4) -> bytes:
+    """A minimal WordprocessingML document of roughly `pages` pages (a heading and twelve paragraphs each)."""
+    rng = random.Random(seed)
+    paragraphs = []
+    for number in range(pages):
+        paragraphs.append(f'<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:rPr><w:b/><w:sz w:val="32"/></w:rPr><w:t>Section {number + 1}</w:t></w:r></w:p>')
+        for _ in range(12):
+            paragraphs.append(f'<w:p><w:r><w:t xml:space="preserve">{" ".join(_sentence(rng, rng.randint(8, 14)) for _ in range(3))}</w:t></w:r></w:p>')
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+        + "".join(paragraphs)
+        + '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/><w:pgMar w:top="1440" w:right="1440" w:bottom="1440" w:left="1440"/></w:sectPr>'
+        '</w:body></w:document>'
+    )
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        )
+        archive.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+            '</Relationships>'
+        )
+        archive.writestr("word/document.xml", document)
+    return buf.getvalue()
+
+def signature_png() -> bytes:
+    image = Image.new("RGBA", (240, 80), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(image)
+    draw.line([(10, 60), (60, 15), (90, 65), (140, 20), (180, 60), (230, 30)], fill=(20, 40, 140, 255), width=4)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+def load(fixtures_dir: str, kind: str, pages: int) -> bytes:
+    """The fixture `kind` ("text", "scanned", "vector" or "docx") with `pages` pages, generated on first use."""
+    extension = "docx" if kind == "docx" else "pdf"
+    path = os.path.join(fixtures_dir, f"{kind}-{pages}.{extension}")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    data = make_docx(pages) if kind == "docx" else PDF_GENERATORS[kind](pages)
+    os.makedirs(fixtures_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return data
@@ -0,0 +1,274 @@
+"""
+Benchmark every PDF, barcode and DOCX operation, in-process and through the ASGI app.
+
+    python -m benchmarks.run --pages 1,10 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --pages 1,10 --baseline benchmarks/baseline.json
+
+Each measurement runs in a fresh process, so peak RSS belongs to that case alone (the process
+itself or its largest worker, whichever is higher). With --baseline the run exits with status 1
+when a case got slower, lost throughput or grew in memory beyond the tolerances.
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+from benchmarks import fixtures
+
+API_KEY = "benchmark"
+MODES = ("direct", "http")
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures")
+
+# The app reads its settings at import time. These keep the rate limiter, page quota, result
+# cache and a local .env out of the measurements; anything else set in the shell still applies.
+ENVIRONMENT = {
+    "ENV_PATH": os.devnull,
+    "API_KEY": API_KEY,
+    "RATE_LIMIT": "1000000/minute",
+    "RATE_LIMIT_COST_BYTES": "0",
+    "PAGE_QUOTA": "",
+    "CACHE_ENABLED": "false",
+    "MAX_UPLOAD_BYTES": str(4 * 1024 * 1024 * 1024),
+    "ADMISSION_WAIT_TIMEOUT": "3600",
+    "PDF_JOB_TIMEOUT": "3600",
+    "OCR_JOB_TIMEOUT": "3600",
+    "LIBREOFFICE_JOB_TIMEOUT": "3600",
+}
+
+def result_key(mode: str, case: str, kind: str, pages: int) -> str:
+    return f"{mode}/{case}/{kind}-{pages}"
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile, so small samples report a latency that was actually measured."""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak * unit / (1024 * 1024), 1)
+
+async def _shutdown_pools():
+    from app.core.worker_pool import pdf_pool
+    from app.services.pdf_service import ocr_pool
+    from app.services.libreoffice_pool import libreoffice_pool
+
+    pdf_pool.shutdown()
+    ocr_pool.shutdown()
+    await libreoffice_pool.stop()
+    # Reap the workers so RUSAGE_CHILDREN includes them
+    for child in multiprocessing.active_children():
+        child.join(timeout=30)
+
+async def _measure(mode: str, case_name: str, kind: str, pages: int, fixtures_dir: str, iterations: int, warmup: int, concurrency: int) -> dict:
+    from benchmarks.cases import Inputs, all_cases
+
+    case = all_cases()[case_name]
+    data = b"" if kind == "items" else fixtures.load(fixtures_dir, kind, pages)
+    inputs = Inputs(kind, pages, data, fixtures.signature_png())
+
+    client = None
+    if mode == "http":
+        import httpx
+        from app.main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", headers={"X-API-Key": API_KEY}, timeout=None)
+
+    async def run_once() -> int:
+        if client is None:
+            return await case.direct(inputs)
+        url, request = case.http(inputs)
+        response = await client.post(url, **request)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return len(response.content)
+
+    try:
+        # Every warmup round has `concurrency` calls in flight, so the pools have started all the
+        # workers the timed calls will use and process start-up stays out of the latencies
+        for _ in range(warmup):
+            await asyncio.gather(*(run_once() for _ in range(concurrency)))
+
+        latencies = []
+        output_bytes = []
+        remaining = iterations
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                output_bytes.append(await run_once())
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, iterations))))
+        elapsed = time.perf_counter() - started
+    finally:
+        if client is not None:
+            await client.aclose()
+        await _shutdown_pools()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "ops_per_s": round(iterations / elapsed, 3),
+        "pages_per_s": round(iterations * pages / elapsed, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+        "output_bytes": round(sum(output_bytes) / len(output_bytes)),
+    }
+
+def measure(*args) -> dict:
+    """Entry point of the per-measurement process."""
+    return asyncio.run(_measure(*args))
+
+def plan(cases: dict, args) -> List[tuple]:
+    """(mode, case, kind, pages) for every measurement the arguments select, in a stable order."""
+    modes = MODES if args.mode == "both" else (args.mode,)
+    selected = []
+    for name, case in cases.items():
+        if args.cases and name not in args.cases:
+            continue
+        for kind in case.kinds:
+            if args.kinds and kind not in args.kinds and kind in fixtures.PDF_KINDS:
+                continue
+            for pages in args.pages:
+                if pages <= case.max_pages:
+                    selected.extend((mode, name, kind, pages) for mode in modes)
+    return selected
+
+def compare(results: dict, baseline: dict, tolerance: float, rss_tolerance: float) -> List[str]:
+    """Every way in which `results` is worse than `baseline`; cases measured on only one side are ignored."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None or "p95_ms" not in previous:
+            continue
+        if "p95_ms" not in current:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["ops_per_s"] < previous["ops_per_s"] / (1 + tolerance):
+            regressions.append(f"{key}: throughput {previous['ops_per_s']} -> {current['ops_per_s']} ops/s")
+        if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + rss_tolerance):
+            regressions.append(f"{key}: peak RSS {previous['peak_rss_mb']}MB -> {current['peak_rss_mb']}MB")
+    return regressions
+
+def _print_row(key: str, result: dict, previous: Optional[dict]):
+    if "skipped" in result or "error" in result:
+        print(f"{key:<52} {'skipped: ' + result['skipped'] if 'skipped' in result else 'ERROR: ' + result['error']}", flush=True)
+        return
+    change = ""
+    if previous and previous.get("p95_ms"):
+        change = f"{(result['p95_ms'] / previous['p95_ms'] - 1) * 100:+.0f}%"
+    print(
+        f"{key:<52} {result['ops_per_s']:>9.2f} {result['pages_per_s']:>10.1f} {result['p50_ms']:>10.1f} "
+        f"{result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} {result['peak_rss_mb']:>8.1f} {change:>8}",
+        flush=True
+    )
+
+def _page_counts(value: str) -> List[int]:
+    return sorted({int(part) for part in value.split(",") if part.strip()})
+
+def _names(value: str) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Benchmark the utility API services and endpoints.")
+    parser.add_argument("--mode", choices=("direct", "http", "both"), default="both", help="call the services directly, through the ASGI app, or both")
+    parser.add_argument("--cases", type=_names, help="comma separated case names (default: all, see --list)")
+    parser.add_argument("--kinds", type=_names, help=f"comma separated PDF fixture kinds: {', '.join(fixtures.PDF_KINDS)}")
+    parser.add_argument("--pages", type=_page_counts, default=list(fixtures.PAGE_COUNTS), help="comma separated page (or barcode item) counts, default 1,10,100,1000")
+    parser.add_argument("--iterations", type=int, default=5, help="timed calls per measurement")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed rounds of --concurrency calls before the timed ones")
+    parser.add_argument("--concurrency", type=int, default=1, help="calls in flight at once")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against this results file and exit with 1 on regressions")
+    parser.add_argument("--save-baseline", help="write the results to this file to compare later runs against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 latency growth and throughput loss, default 0.25 (25%%)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.25, help="allowed peak RSS growth, default 0.25 (25%%)")
+    parser.add_argument("--fixtures-dir", default=DEFAULT_FIXTURES_DIR, help="where generated fixtures are kept")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = parser.parse_args(argv)
+    if args.iterations < 1 or args.warmup < 0 or args.concurrency < 1:
+        parser.error("iterations and concurrency must be at least 1, warmup at least 0")
+
+    os.environ.update(ENVIRONMENT)
+    from benchmarks.cases import all_cases
+
+    cases = all_cases()
+    if args.list:
+        for name, case in cases.items():
+            print(f"{name:<28} {', '.join(case.kinds):<22} up to {case.max_pages} {'(needs ' + ', '.join(case.requires) + ')' if case.requires else ''}")
+        return 0
+    unknown = set(args.cases or ()) - set(cases)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    measurements = plan(cases, args)
+    # Generate fixtures up front, so their cost never lands in a measurement
+    for kind, pages in sorted({(kind, pages) for _, _, kind, pages in measurements if kind != "items"}):
+        fixtures.load(args.fixtures_dir, kind, pages)
+
+    print(f"{'case':<52} {'ops/s':>9} {'pages/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'RSS MB':>8} {'p95 Δ':>8}")
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for mode, name, kind, pages in measurements:
+        key = result_key(mode, name, kind, pages)
+        reason = cases[name].available()
+        if reason:
+            results[key] = {"skipped": reason}
+        else:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                try:
+                    results[key] = executor.submit(
+                        measure, mode, name, kind, pages, args.fixtures_dir, args.iterations, args.warmup, args.concurrency
+                    ).result()
+                except Exception as e:
+                    results[key] = {"error": str(e) or type(e).__name__}
+        _print_row(key, results[key], baseline.get(key))
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    # A case that stopped working counts as a regression too
+    regressions = [f"{key}: failed ({result['error']})" for key, result in results.items() if "error" in result]
+    regressions += compare(results, baseline, args.tolerance, args.rss_tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
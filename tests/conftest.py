@@ -0,0 +1,15 @@
+import os
+
+# The app reads its settings at import time, so the test environment has to be in place before
+# anything from app is imported. A local .env never applies; counters live in memory and the
+# worker pools run threads, so monkeypatches reach the work they run.
+os.environ.update({
+    "ENV_PATH": os.devnull,
+    "API_KEY": "test",
+    "RATE_LIMIT": "1000/minute",
+    "RATE_LIMIT_STORAGE_URI": "memory://",
+    "RATE_LIMIT_COST_BYTES": "0",
+    "PAGE_QUOTA": "",
+    "CACHE_ENABLED": "false",
+    "WORKER_POOL_KIND": "thread",
+})
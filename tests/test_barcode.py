@@ -0,0 +1,178 @@
+import io
+import re
+from xml.etree import ElementTree
+import fitz
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.api.v1.routers import barcode as barcode_router
+from app.core.cache import ResultCache
+from app.services import barcode_service
+from app.main import app
+
+HEADERS = {"X-API-Key": "test"}
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResultCache("barcode-test", memory_bytes=1024 * 1024, ttl=60)
+    monkeypatch.setattr(barcode_router, "barcode_cache", cache)
+    return cache
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def _generate(client, headers=None, **form):
+    form.setdefault("data", "https://example.com")
+    return client.post("/v1/barcode/generate-barcode", headers={**HEADERS, **(headers or {})}, data=form)
+
+@pytest.mark.parametrize("barcode_type, image_format, render, media_type", [
+    ("qr", "PNG", "resample", "image/png"),
+    ("qr", "jpeg", "resample", "image/jpeg"),
+    ("code128", "PNG", "exact", "image/png"),
+    ("ean13", "webp", "exact", "image/webp"),
+])
+def test_barcode_is_encoded_in_the_requested_format_and_size(client, cache, barcode_type, image_format, render, media_type):
+    data = "590123412345" if barcode_type == "ean13" else "ABC-123"
+
+    response = _generate(client, data=data, barcode_type=barcode_type, image_format=image_format, render=render, width="200", height="120")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == media_type
+    image = Image.open(io.BytesIO(response.content))
+    assert image.format == image_format.upper()
+    assert image.size == (200, 120)
+
+def test_repeated_request_is_served_from_the_cache(client, cache):
+    first = _generate(client)
+    second = _generate(client)
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert first.headers["etag"] == second.headers["etag"]
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert first.headers["cache-control"].startswith("private, max-age=")
+
+def test_matching_if_none_match_gets_304(client, cache):
+    etag = _generate(client).headers["etag"]
+
+    response = _generate(client, headers={"If-None-Match": f'W/"other", {etag}'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert _generate(client, headers={"If-None-Match": '"other"'}).status_code == 200
+
+@pytest.mark.parametrize("change", [
+    {"data": "something else"},
+    {"image_format": "gif"},
+    {"width": "300"},
+    {"render": "exact"},
+])
+def test_every_parameter_is_part_of_the_etag(client, cache, change):
+    assert _generate(client).headers["etag"] != _generate(client, **change).headers["etag"]
+
+def test_logo_is_part_of_the_cache_key(client, cache):
+    def logo(color):
+        buffer = io.BytesIO()
+        Image.new("RGB", (20, 20), color).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def with_logo(color):
+        return client.post(
+            "/v1/barcode/generate-barcode",
+            headers=HEADERS,
+            data={"data": "logo"},
+            files={"logo_file": ("logo.png", logo(color), "image/png")}
+        )
+
+    assert with_logo("red").headers["etag"] != with_logo("blue").headers["etag"]
+    assert with_logo("red").content == with_logo("red").content
+
+@pytest.mark.parametrize("form, detail", [
+    ({"barcode_type": "ean13", "data": "not digits"}, "Invalid barcode"),
+    ({"image_format": "tiff"}, "Unsupported image format"),
+    ({"render": "smooth"}, "render must be one of"),
+    ({"width": "0"}, "width and height must be positive"),
+])
+def test_invalid_requests_are_400_and_not_cached(client, cache, form, detail):
+    response = _generate(client, **form)
+
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+    assert cache.hits == 0
+
+def _sample(image: Image.Image, matrix: np.ndarray) -> np.ndarray:
+    """Read the modules back by sampling the centre of every cell of the drawn code."""
+    pixels = np.asarray(image)
+    rows, cols = matrix.shape
+    dark = np.argwhere(pixels == 0)
+    (top, left), (bottom, right) = dark.min(axis=0), dark.max(axis=0) + 1
+    first_dark = np.argwhere(matrix)
+    # Extend the dark bounding box to the full matrix, quiet zone included
+    scale_y = (bottom - top) / (first_dark[:, 0].max() + 1 - first_dark[:, 0].min())
+    scale_x = (right - left) / (first_dark[:, 1].max() + 1 - first_dark[:, 1].min())
+    origin_y, origin_x = top - first_dark[:, 0].min() * scale_y, left - first_dark[:, 1].min() * scale_x
+    ys = (origin_y + (np.arange(rows) + 0.5) * scale_y).astype(int)
+    xs = (origin_x + (np.arange(cols) + 0.5) * scale_x).astype(int)
+    return pixels[np.ix_(ys, xs)] == 0
+
+@pytest.mark.parametrize("barcode_type, data, width, height", [
+    ("qr", "https://example.com/exact", 333, 250),
+    ("code128", "ABC-123", 500, 80),
+])
+def test_exact_render_draws_whole_pixel_modules(barcode_type, data, width, height):
+    matrix = barcode_service._module_matrix(data, barcode_type)
+
+    image = barcode_service._render_exact(matrix, width, height)
+
+    assert image.size == (width, height)
+    # No anti-aliasing: only black and white pixels
+    assert set(np.unique(np.asarray(image))) <= {0, 255}
+    assert np.array_equal(_sample(image, matrix), matrix)
+
+def test_exact_render_is_never_smaller_than_one_pixel_per_module():
+    matrix = barcode_service._module_matrix("https://example.com/exact", "qr")
+
+    image = barcode_service._render_exact(matrix, 5, 5)
+
+    assert image.size == (matrix.shape[1], matrix.shape[0])
+    assert np.array_equal(np.asarray(image) == 0, matrix)
+
+def test_exact_1d_bars_run_the_full_height():
+    matrix = barcode_service._module_matrix("590123412345", "ean13")
+
+    pixels = np.asarray(barcode_service._render_exact(matrix, 300, 60))
+
+    assert (pixels == pixels[0]).all()
+    assert (pixels[0] == 0).any()
+
+@pytest.mark.parametrize("barcode_type, data", [("qr", "vector"), ("code128", "ABC-123")])
+def test_svg_draws_the_module_matrix_in_module_units(client, cache, barcode_type, data):
+    response = _generate(client, data=data, barcode_type=barcode_type, image_format="svg", width="400", height="200")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+    svg = ElementTree.fromstring(response.content)
+    namespace = "{http://www.w3.org/2000/svg}"
+    matrix = barcode_service._module_matrix(data, barcode_type)
+    assert (svg.get("width"), svg.get("height")) == ("400", "200")
+    assert svg.get("viewBox") == f"0 0 {matrix.shape[1]} {matrix.shape[0]}"
+
+    # Every dark module is covered by exactly one rectangle of the path
+    drawn = np.zeros(matrix.shape, dtype=int)
+    for x, y, run in re.findall(r"M(\d+),(\d+)h(\d+)v1h-\d+z", svg.find(f"{namespace}path").get("d")):
+        drawn[int(y), int(x):int(x) + int(run)] += 1
+    assert np.array_equal(drawn, matrix.astype(int))
+
+def test_pdf_output_is_a_single_vector_page(client, cache):
+    response = _generate(client, data="vector", image_format="pdf", width="300", height="300")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    with fitz.open(stream=response.content, filetype="pdf") as document:
+        assert document.page_count == 1
+        page = document[0]
+        assert page.get_images() == []
+        assert page.get_drawings()
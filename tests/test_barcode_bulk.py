@@ -0,0 +1,118 @@
+import io
+import json
+import zipfile
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.services.barcode_service import parse_bulk_items
+
+HEADERS = {"X-API-Key": "test"}
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def _bulk(client, files=None, **form):
+    return client.post("/v1/barcode/generate-bulk", headers=HEADERS, data=form, files=files)
+
+def test_zip_holds_one_image_per_item_and_a_manifest(client):
+    items = ["first", {"data": "second", "label": "Box 2/3"}, "third"]
+
+    response = _bulk(client, items=json.dumps(items), image_format="png", width="100", height="100")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    assert sorted(archive.namelist()) == ["1_first.png", "2_Box_2_3.png", "3_third.png", "manifest.json"]
+    assert archive.namelist()[-1] == "manifest.json"
+    for name in ("1_first.png", "2_Box_2_3.png", "3_third.png"):
+        assert Image.open(io.BytesIO(archive.read(name))).size == (100, 100)
+    assert json.loads(archive.read("manifest.json")) == [
+        {"data": "first", "label": "first", "success": True, "output": "1_first.png", "error": None},
+        {"data": "second", "label": "Box 2/3", "success": True, "output": "2_Box_2_3.png", "error": None},
+        {"data": "third", "label": "third", "success": True, "output": "3_third.png", "error": None}
+    ]
+
+def test_invalid_item_is_reported_in_the_manifest(client):
+    items = ["590123412345", "not digits", "400638133393"]
+
+    response = _bulk(client, items=json.dumps(items), barcode_type="ean13", render="exact", width="200", height="80")
+
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    manifest = json.loads(archive.read("manifest.json"))
+    assert [entry["success"] for entry in manifest] == [True, False, True]
+    assert manifest[1]["output"] is None and manifest[1]["error"].startswith("Invalid barcode")
+    assert len(archive.namelist()) == 3
+
+def test_pdf_label_sheet_has_a_cell_per_item(client):
+    items = [f"item-{number}" for number in range(5)] + ["item-0"]
+
+    response = _bulk(client, items=json.dumps(items), output="pdf", columns="2", rows="2", page_size="a5")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["x-barcodes-generated"] == "6"
+    assert response.headers["x-barcodes-failed"] == ""
+    with fitz.open(stream=response.content, filetype="pdf") as document:
+        # Six labels at four per page
+        assert document.page_count == 2
+        assert document[0].rect == fitz.paper_rect("a5")
+        assert len(document[0].get_image_info()) == 4
+        assert len(document[1].get_image_info()) == 2
+        assert "item-4" in document[1].get_text()
+        # The repeated code is embedded once
+        assert len({xref for page in document for xref, *_ in page.get_images()}) == 5
+
+def test_pdf_label_sheet_reports_failed_items(client):
+    items = ["not digits", "590123412345", "bad"]
+
+    response = _bulk(client, items=json.dumps(items), output="pdf", barcode_type="ean13", render="exact", show_labels="false")
+
+    assert response.status_code == 200
+    assert response.headers["x-barcodes-generated"] == "1"
+    assert response.headers["x-barcodes-failed"] == "1,3"
+    with fitz.open(stream=response.content, filetype="pdf") as document:
+        assert len(document[0].get_image_info()) == 1
+        assert document[0].get_text() == ""
+
+def test_csv_upload_is_read(client):
+    csv_file = b"\xef\xbb\xbfdata,label\nA-1,First\nA-2,\n"
+
+    response = _bulk(client, files={"csv_file": ("codes.csv", csv_file, "text/csv")})
+
+    manifest = json.loads(zipfile.ZipFile(io.BytesIO(response.content)).read("manifest.json"))
+    assert [(entry["data"], entry["label"]) for entry in manifest] == [("A-1", "First"), ("A-2", "A-2")]
+
+@pytest.mark.parametrize("items, csv_data, expected", [
+    ('["a", {"data": "b"}, 3]', None, [("a", "a"), ("b", "b"), ("3", "3")]),
+    (None, b"x,Label X\ny,Label Y\n", [("x", "Label X"), ("y", "Label Y")]),
+    (None, b"id,data\n1,x\n", [("x", "x")]),
+    ('["a"]', b"b\n\n", [("a", "a"), ("b", "b")]),
+])
+def test_bulk_items_are_parsed_from_json_and_csv(items, csv_data, expected):
+    assert [(item["data"], item["label"]) for item in parse_bulk_items(items, csv_data)] == expected
+
+@pytest.mark.parametrize("form, detail", [
+    ({"items": "not json"}, "items is not valid JSON"),
+    ({"items": '{"data": "a"}'}, "items must be a JSON array"),
+    ({"items": '["a", ""]'}, "non-empty data"),
+    ({"items": "[]"}, "at least one payload"),
+    ({"items": '["a"]', "output": "tar"}, "output must be"),
+    ({"items": '["a"]', "output": "pdf", "page_size": "nope"}, "Unknown page size"),
+])
+def test_invalid_bulk_requests_are_400(client, form, detail):
+    response = _bulk(client, **form)
+
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+
+def test_item_limit_is_enforced(client, monkeypatch):
+    monkeypatch.setattr("app.api.v1.routers.barcode.settings.BARCODE_BULK_MAX_ITEMS", 2)
+
+    response = _bulk(client, items='["a", "b", "c"]')
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "At most 2 barcodes can be generated per request"
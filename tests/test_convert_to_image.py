@@ -0,0 +1,81 @@
+import asyncio
+import io
+import struct
+import zlib
+import fitz
+import pytest
+from PIL import Image
+from app.services import pdf_service
+from app.services.pdf_service import _adler32_combine, convert_pdf_to_single_image, stream_pdf_as_png
+
+def _pdf(*widths) -> bytes:
+    """One page per width, with some text and a filled box so the rows are not all white."""
+    doc = fitz.open()
+    for number, width in enumerate(widths, start=1):
+        page = doc.new_page(width=width, height=60 + 10 * number)
+        page.insert_text((10, 30), f"page {number}")
+        page.draw_rect(fitz.Rect(5, 40, width - 5, 50 + number), color=(0, 0, 1), fill=(1, 0, 0))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _chunks(png: bytes) -> list:
+    """(tag, payload) of every chunk, checking each CRC on the way."""
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, offset = [], 8
+    while offset < len(png):
+        length, tag = struct.unpack(">I4s", png[offset:offset + 8])
+        payload = png[offset + 8:offset + 8 + length]
+        crc, = struct.unpack(">I", png[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(tag + payload), tag
+        chunks.append((tag, payload))
+        offset += 12 + length
+    return chunks
+
+def _scanlines(png: bytes) -> bytes:
+    # zlib.decompress rejects a stream whose Adler-32 trailer is wrong
+    return zlib.decompress(b"".join(payload for tag, payload in _chunks(png) if tag == b"IDAT"))
+
+def _streamed(data: bytes, dpi: int = 72) -> bytes:
+    async def collect():
+        return b"".join([chunk async for chunk in await stream_pdf_as_png(data, dpi)])
+    return asyncio.run(collect())
+
+def _buffered(data: bytes, dpi: int = 72) -> bytes:
+    return asyncio.run(convert_pdf_to_single_image(data, dpi))
+
+@pytest.mark.parametrize("batch", [1, 2, 3, 50])
+def test_streamed_png_has_the_pixels_of_the_buffered_png(monkeypatch, batch):
+    monkeypatch.setattr(pdf_service.settings, "STREAM_BATCH_PAGES", batch)
+    data = _pdf(200, 150, 250, 120, 180)
+
+    streamed, buffered = _streamed(data), _buffered(data)
+
+    assert _chunks(streamed)[0] == _chunks(buffered)[0]
+    assert _chunks(streamed)[-1] == (b"IEND", b"")
+    assert _scanlines(streamed) == _scanlines(buffered)
+    assert Image.open(io.BytesIO(streamed)).tobytes() == Image.open(io.BytesIO(buffered)).tobytes()
+
+def test_pages_are_stacked_and_padded_to_the_widest(monkeypatch):
+    monkeypatch.setattr(pdf_service.settings, "STREAM_BATCH_PAGES", 1)
+
+    image = Image.open(io.BytesIO(_streamed(_pdf(100, 200), dpi=144)))
+
+    assert image.size == (400, 140 + 160)
+    # Right of the narrow first page is white padding
+    assert image.getpixel((399, 10)) == (255, 255, 255)
+
+@pytest.mark.parametrize("first, second", [
+    (b"", b"abc"),
+    (b"abc", b""),
+    (b"hello ", b"world"),
+    (bytes(range(256)) * 300, b"\xff" * 70000),
+])
+def test_adler32_combine_matches_zlib(first, second):
+    combined = _adler32_combine(zlib.adler32(first), zlib.adler32(second), len(second))
+
+    assert combined == zlib.adler32(first + second)
+
+def test_invalid_pdf_fails_before_streaming_starts():
+    with pytest.raises(fitz.FileDataError):
+        asyncio.run(stream_pdf_as_png(b"%PDF-1.7 broken", 72))
@@ -0,0 +1,80 @@
+import io
+import zipfile
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.services import pdf_service
+
+HEADERS = {"X-API-Key": "test"}
+
+def _pdf(page_count: int) -> bytes:
+    doc = fitz.open()
+    for number in range(1, page_count + 1):
+        doc.new_page(width=100 + number, height=50).insert_text((10, 30), f"page {number}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+@pytest.fixture
+def client(monkeypatch):
+    # Several batches even for short documents
+    monkeypatch.setattr(pdf_service.settings, "STREAM_BATCH_PAGES", 2)
+    return TestClient(app)
+
+def _convert(client, data: bytes, **form):
+    return client.post("/v1/pdf/convert-to-images", headers=HEADERS, data=form, files={"file": ("a.pdf", data, "application/pdf")})
+
+def _archive(response) -> zipfile.ZipFile:
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    return archive
+
+def test_every_page_is_a_member_in_page_order(client):
+    archive = _archive(_convert(client, _pdf(12), dpi="72"))
+
+    assert archive.namelist() == [f"page_{number:02d}.png" for number in range(1, 13)]
+    # Encoded images are stored, not deflated again
+    assert {info.compress_type for info in archive.infolist()} == {zipfile.ZIP_STORED}
+    sizes = [Image.open(archive.open(name)).size for name in archive.namelist()]
+    assert sizes == [(100 + number, 50) for number in range(1, 13)]
+
+def test_only_the_selected_pages_are_rendered_in_the_requested_order(client):
+    archive = _archive(_convert(client, _pdf(5), pages="4,1-2"))
+
+    assert archive.namelist() == ["page_4.png", "page_1.png", "page_2.png"]
+
+@pytest.mark.parametrize("image_format, extension, mode", [
+    ("jpeg", "jpg", "L"),
+    ("webp", "webp", "RGB"),
+])
+def test_format_and_grayscale_apply_to_every_member(client, image_format, extension, mode):
+    archive = _archive(_convert(client, _pdf(3), image_format=image_format, grayscale="true", quality="50"))
+
+    for name in archive.namelist():
+        assert name.endswith(f".{extension}")
+        image = Image.open(archive.open(name))
+        assert image.format == image_format.upper()
+        # WebP has no grayscale mode; the gray pixels come back as RGB
+        assert image.mode == mode
+
+def test_alpha_keeps_transparency(client):
+    archive = _archive(_convert(client, _pdf(1), alpha="true"))
+
+    assert Image.open(archive.open("page_1.png")).mode == "RGBA"
+
+@pytest.mark.parametrize("form, detail", [
+    ({"image_format": "gif"}, "Unsupported image format 'gif'. Use one of: png, jpeg, webp"),
+    ({"image_format": "jpeg", "alpha": "true"}, "JPEG does not support an alpha channel"),
+    ({"quality": "0"}, "Quality must be between 1 and 100"),
+    ({"pages": "7"}, None),
+])
+def test_invalid_options_are_refused_before_streaming(client, form, detail):
+    response = _convert(client, _pdf(3), **form)
+
+    assert response.status_code == 400
+    if detail:
+        assert response.json() == {"detail": detail}
@@ -0,0 +1,88 @@
+import io
+import json
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.services import pdf_service
+from app.services.pdf_service import PAGE_BREAK
+
+HEADERS = {"X-API-Key": "test"}
+
+def _pdf(*pages) -> bytes:
+    """A string becomes a page with that text, None a page with only an image."""
+    doc = fitz.open()
+    for page_text in pages:
+        page = doc.new_page(width=300, height=200)
+        if page_text is None:
+            buffer = io.BytesIO()
+            Image.new("RGB", (10, 10), "red").save(buffer, format="PNG")
+            page.insert_image(fitz.Rect(50, 50, 100, 100), stream=buffer.getvalue())
+        else:
+            page.insert_text((20, 40), page_text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(pdf_service.settings, "STREAM_BATCH_PAGES", 2)
+    return TestClient(app)
+
+def _convert(client, data: bytes, **params):
+    params.setdefault("ocr", "false")
+    return client.post("/v1/pdf/convert-to-text", headers=HEADERS, params=params, files={"file": ("a.pdf", data, "application/pdf")})
+
+def test_text_mode_joins_the_pages(client):
+    response = _convert(client, _pdf("first page", "second page"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["page_count"] == 2 and body["used_ocr"] is False
+    assert [page.strip() for page in body["text"].split(PAGE_BREAK)] == ["first page", "second page"]
+
+def test_text_mode_without_any_text_is_422(client):
+    response = _convert(client, _pdf(None))
+
+    assert response.status_code == 422
+    assert response.json() == {
+        "detail": "No text found in PDF. The document might be scanned or image-based.",
+        "page_count": 1
+    }
+
+def test_structured_mode_reports_blocks_and_words_per_page(client):
+    response = _convert(client, _pdf("three small words", None), mode="structured")
+
+    assert response.status_code == 200
+    first, second = response.json()["pages"]
+    assert first["page"] == 1 and first["has_text"] and first["word_count"] == 3
+    assert [block["type"] for block in first["blocks"]] == ["text"]
+    assert first["blocks"][0]["text"].strip() == "three small words"
+    assert first["text"].strip() == "three small words"
+    x0, y0, x1, y1 = first["blocks"][0]["bbox"]
+    assert 0 <= x0 < x1 <= 300 and 0 <= y0 < y1 <= 200
+    assert second == {
+        "page": 2,
+        "text": "",
+        "has_text": False,
+        "word_count": 0,
+        "blocks": [{"bbox": [50.0, 50.0, 100.0, 100.0], "type": "image", "text": ""}]
+    }
+
+def test_ndjson_mode_streams_the_structured_pages(client):
+    data = _pdf(*(f"page {number}" for number in range(1, 6)))
+
+    response = _convert(client, data, mode="ndjson")
+    structured = _convert(client, data, mode="structured").json()["pages"]
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == structured
+
+def test_unknown_mode_is_400(client):
+    response = _convert(client, _pdf("text"), mode="xml")
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Mode must be one of: text, structured, ndjson"}
@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import docx_service as service_module
+from app.services.docx_service import docx_service
+
+HEADERS = {"X-API-Key": "test"}
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+@pytest.fixture
+def office(tmp_path, monkeypatch):
+    """Stands in for the LibreOffice pool: the "PDF" is the source with a header, FAIL fails."""
+    calls = []
+
+    async def convert_many(source_paths, out_dir):
+        calls.append(list(source_paths))
+        for source_path in reversed(source_paths):
+            with open(source_path, "rb") as f:
+                content = f.read()
+            if b"FAIL" in content:
+                yield source_path, RuntimeError("conversion failed")
+                continue
+            with open(os.path.join(out_dir, os.path.splitext(os.path.basename(source_path))[0] + ".pdf"), "wb") as f:
+                f.write(b"%PDF-" + content)
+            yield source_path, None
+
+    monkeypatch.setattr(service_module.libreoffice_pool, "convert_many", convert_many)
+    monkeypatch.setattr(docx_service, "work_dir", str(tmp_path / "work"))
+    monkeypatch.setattr(service_module.settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    os.makedirs(docx_service.work_dir)
+    return calls
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def _zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def _batch(client, files=(), archive=None):
+    upload = [("files", (name, data, DOCX)) for name, data in files]
+    if archive is not None:
+        upload.append(("archive", ("batch.zip", archive, "application/zip")))
+    return client.post("/v1/docx/docx-to-pdf-batch", headers=HEADERS, files=upload)
+
+def test_files_and_archive_members_come_back_as_pdfs_with_a_manifest(client, office):
+    response = _batch(client, files=[("a.docx", b"first")], archive=_zip({"dir/b.docx": b"second", "readme.txt": b"skipped"}))
+
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert sorted(archive.namelist()) == ["0001_a.pdf", "0002_b.pdf", "manifest.json"]
+    assert archive.namelist()[-1] == "manifest.json"
+    assert archive.read("0001_a.pdf") == b"%PDF-first"
+    assert archive.read("0002_b.pdf") == b"%PDF-second"
+    assert json.loads(archive.read("manifest.json")) == [
+        {"file": "a.docx", "success": True, "output": "0001_a.pdf", "error": None},
+        {"file": "dir/b.docx", "success": True, "output": "0002_b.pdf", "error": None}
+    ]
+    # The whole set goes to the pool in one call
+    assert len(office) == 1 and len(office[0]) == 2
+    assert os.listdir(docx_service.work_dir) == []
+
+def test_failed_document_is_reported_and_the_others_kept(client, office):
+    response = _batch(client, files=[("a.docx", b"first"), ("b.docx", b"FAIL"), ("c.docx", b"third")])
+
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    manifest = json.loads(archive.read("manifest.json"))
+    assert [entry["success"] for entry in manifest] == [True, False, True]
+    assert manifest[1] == {"file": "b.docx", "success": False, "output": None, "error": "conversion failed"}
+    assert "0002_b.pdf" not in archive.namelist()
+
+def test_wrong_file_type_is_refused(client, office):
+    response = client.post("/v1/docx/docx-to-pdf-batch", headers=HEADERS, files=[("files", ("a.txt", b"text", "text/plain"))])
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "'a.txt' is not a .docx or .doc file"}
+
+def test_empty_batch_is_refused(client, office):
+    response = _batch(client, archive=_zip({"readme.txt": b"no documents"}))
+
+    assert response.status_code == 400
+    assert office == []
+
+def test_batch_over_the_file_limit_is_refused(client, office, monkeypatch):
+    monkeypatch.setattr(service_module.settings, "BATCH_MAX_FILES", 2)
+
+    response = _batch(client, files=[(f"{number}.docx", b"doc") for number in range(3)])
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "A batch may contain at most 2 files"}
+    assert office == []
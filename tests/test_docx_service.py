@@ -0,0 +1,113 @@
+import asyncio
+import io
+import os
+import time
+import pytest
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+from app.main import app
+from app.services import docx_service as service_module
+from app.services.docx_service import docx_service
+
+HEADERS = {"X-API-Key": "test"}
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+class FakeOffice:
+    """Stands in for the LibreOffice pool: the "PDF" is the source with a header, FAIL fails."""
+
+    def __init__(self):
+        self.converted = []
+
+    async def convert(self, source_path: str, pdf_path: str):
+        with open(source_path, "rb") as f:
+            content = f.read()
+        self.converted.append(os.path.dirname(source_path))
+        if b"FAIL" in content:
+            raise RuntimeError("conversion failed")
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-" + content)
+
+@pytest.fixture
+def office(tmp_path, monkeypatch):
+    fake = FakeOffice()
+    monkeypatch.setattr(service_module.libreoffice_pool, "convert", fake.convert)
+    monkeypatch.setattr(docx_service, "work_dir", str(tmp_path))
+    return fake
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def _convert(client, content: bytes, content_type: str = DOCX):
+    return client.post("/v1/docx/docx-to-pdf", headers=HEADERS, files={"file": ("letter.docx", content, content_type)})
+
+def test_converted_pdf_is_sent_and_the_request_directory_removed(client, office, tmp_path):
+    response = _convert(client, b"PK letter")
+
+    assert response.status_code == 200
+    assert response.content == b"%PDF-PK letter"
+    assert os.path.dirname(office.converted[0]) == str(tmp_path)
+    assert os.listdir(tmp_path) == []
+
+def test_oversized_upload_is_refused_before_conversion(client, office, tmp_path, monkeypatch):
+    monkeypatch.setattr(service_module.settings, "DOCX_MAX_BYTES", 64)
+
+    response = _convert(client, b"x" * 100)
+
+    assert response.status_code == 413
+    assert office.converted == []
+    assert os.listdir(tmp_path) == []
+
+def test_upload_of_unknown_size_is_cut_off_while_spooling(office, tmp_path, monkeypatch):
+    monkeypatch.setattr(service_module.settings, "DOCX_MAX_BYTES", 64)
+    monkeypatch.setattr(service_module.settings, "UPLOAD_CHUNK_SIZE", 16)
+    upload = UploadFile(io.BytesIO(b"x" * 100), filename="big.docx", headers=Headers({"content-type": DOCX}))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(docx_service.convert_to_pdf(upload))
+
+    assert error.value.status_code == 413
+    assert office.converted == []
+    assert os.listdir(tmp_path) == []
+
+def test_failed_conversion_leaves_nothing_behind(office, tmp_path):
+    with pytest.raises(RuntimeError):
+        asyncio.run(docx_service.convert_file_to_pdf("broken.docx", b"FAIL"))
+
+    assert os.listdir(tmp_path) == []
+
+def test_wrong_type_is_refused(client, office):
+    response = _convert(client, b"PK", "text/plain")
+
+    assert response.status_code == 400
+
+def test_document_on_disk_is_converted_from_its_path(office, tmp_path):
+    source = tmp_path / "spooled"
+    source.write_bytes(b"from disk")
+
+    pdf_path = asyncio.run(docx_service.convert_file_to_pdf("old.doc", str(source)))
+    try:
+        assert open(pdf_path, "rb").read() == b"%PDF-from disk"
+        assert sorted(os.listdir(os.path.dirname(pdf_path))) == ["document.doc", "document.pdf"]
+    finally:
+        docx_service.cleanup(pdf_path)
+    assert sorted(os.listdir(tmp_path)) == ["spooled"]
+
+def test_janitor_sweeps_only_expired_directories(office, tmp_path, monkeypatch):
+    monkeypatch.setattr(service_module.settings, "DOCX_WORK_TTL", 60)
+    old, fresh = tmp_path / "old", tmp_path / "fresh"
+    old.mkdir()
+    fresh.mkdir()
+    os.utime(old, (time.time() - 120, time.time() - 120))
+
+    assert docx_service.sweep_orphans() == 1
+    assert sorted(os.listdir(tmp_path)) == ["fresh"]
+
+def test_cleanup_never_leaves_the_work_directory(office, tmp_path):
+    outside = tmp_path.parent / "outside_work_dir"
+    outside.mkdir(exist_ok=True)
+
+    docx_service.cleanup(str(outside / "document.pdf"))
+
+    assert outside.exists()
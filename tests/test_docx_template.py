@@ -0,0 +1,144 @@
+import io
+import json
+import os
+import re
+import zipfile
+from xml.dom import minidom
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import docx_service as service_module
+from app.services import docx_template as template_module
+from app.services.docx_service import docx_service
+from app.services.docx_template import DocxTemplate, DocxTemplateStore
+
+HEADERS = {"X-API-Key": "test"}
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+def _docx(*paragraphs, header: str = None) -> bytes:
+    """A minimal DOCX; every paragraph is a list of run texts."""
+    def body(paragraph_runs):
+        return "".join(
+            "<w:p>" + "".join(f"<w:r><w:t>{text}</w:t></w:r>" for text in runs) + "</w:p>"
+            for runs in paragraph_runs
+        )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("word/document.xml", f"<w:document {W}><w:body>{body(paragraphs)}</w:body></w:document>")
+        if header is not None:
+            archive.writestr("word/header1.xml", f"<w:hdr {W}>{body([[header]])}</w:hdr>")
+    return buffer.getvalue()
+
+def _zip_without_document() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("readme.txt", "hello")
+    return buffer.getvalue()
+
+def _text(docx: bytes, part: str = "word/document.xml") -> str:
+    """The visible text of a part: text nodes joined, breaks as newlines, paragraphs as lines."""
+    xml = zipfile.ZipFile(io.BytesIO(docx)).read(part).decode()
+    xml = xml.replace("<w:br/>", "\n").replace("</w:p>", "\n")
+    return re.sub(r"<[^>]+>", "", xml).replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+def test_placeholders_are_replaced_in_body_and_header():
+    template = DocxTemplate("t", _docx(["Dear {{name}},"], ["Your order {{ order.id }} ships."], header="Ref {{order.id}}"))
+
+    rendered = template.render({"name": "Ana", "order.id": 42})
+
+    assert template.fields == ["name", "order.id"]
+    assert _text(rendered) == "Dear Ana,\nYour order 42 ships.\n"
+    assert _text(rendered, "word/header1.xml") == "Ref 42\n"
+
+def test_placeholder_split_across_runs_is_found():
+    template = DocxTemplate("t", _docx(["Hello {", "{na", "me}", "} and {{other}}!"]))
+
+    assert template.fields == ["name", "other"]
+    assert _text(template.render({"name": "Budi", "other": "you"})) == "Hello Budi and you!\n"
+
+def test_values_are_xml_escaped_and_newlines_become_breaks():
+    template = DocxTemplate("t", _docx(["Note: {{note}}"]))
+
+    rendered = template.render({"note": "a < b & c\nsecond line"})
+
+    assert _text(rendered) == "Note: a < b & c\nsecond line\n"
+    # Still well-formed XML
+    minidom.parseString(zipfile.ZipFile(io.BytesIO(rendered)).read("word/document.xml"))
+
+def test_missing_values_render_empty():
+    template = DocxTemplate("t", _docx(["[{{present}}][{{absent}}]"]))
+
+    assert _text(template.render({"present": "x"})) == "[x][]\n"
+
+def test_non_docx_is_refused(tmp_path):
+    store = DocxTemplateStore(str(tmp_path), 4)
+
+    with pytest.raises(ValueError):
+        store.save(b"not a zip")
+    with pytest.raises(ValueError):
+        store.save(_zip_without_document())
+
+def test_store_keeps_templates_by_content_hash(tmp_path):
+    store = DocxTemplateStore(str(tmp_path), 1)
+    first = store.save(_docx(["{{a}}"]))
+    second = store.save(_docx(["{{b}}"]))
+
+    # Only one stays compiled in memory, both are read back from disk
+    assert store.get(first.template_id).fields == ["a"]
+    assert store.get(second.template_id).fields == ["b"]
+    assert [entry["template_id"] for entry in store.list()] == sorted([first.template_id, second.template_id])
+    assert store.remove(first.template_id) and store.get(first.template_id) is None
+    assert store.get("../etc/passwd") is None
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    converted = []
+
+    async def convert_many(source_paths, out_dir):
+        for source_path in source_paths:
+            with open(source_path, "rb") as f:
+                converted.append(_text(f.read()))
+            with open(os.path.join(out_dir, os.path.splitext(os.path.basename(source_path))[0] + ".pdf"), "wb") as f:
+                f.write(b"%PDF-" + converted[-1].encode())
+            yield source_path, None
+
+    monkeypatch.setattr(service_module.libreoffice_pool, "convert_many", convert_many)
+    monkeypatch.setattr(docx_service, "work_dir", str(tmp_path / "work"))
+    monkeypatch.setattr(template_module.docx_template_store, "directory", str(tmp_path / "templates"))
+    os.makedirs(docx_service.work_dir)
+    return TestClient(app)
+
+def test_merge_endpoint_fills_one_pdf_per_record(client):
+    upload = client.post("/v1/docx/templates", headers=HEADERS, files={"file": ("t.docx", _docx(["Hi {{name}} from {{city}}"]), DOCX)})
+    assert upload.status_code == 200
+    template_id = upload.json()["template_id"]
+    assert upload.json()["fields"] == ["name", "city"]
+
+    records = [{"name": "Ana", "city": "Bandung"}, {"name": "Budi/../x"}]
+    response = client.post(
+        f"/v1/docx/templates/{template_id}/merge",
+        headers=HEADERS,
+        data={"records": json.dumps(records), "filename_field": "name"}
+    )
+
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    manifest = json.loads(archive.read("manifest.json"))
+    assert [entry["missing_fields"] for entry in manifest] == [[], ["city"]]
+    outputs = [entry["output"] for entry in manifest]
+    assert outputs[0] == "0001_Ana.pdf" and "/" not in outputs[1]
+    assert archive.read(outputs[0]) == b"%PDF-Hi Ana from Bandung\n"
+    assert archive.read(outputs[1]) == b"%PDF-Hi Budi/../x from \n"
+
+@pytest.mark.parametrize("records", ["[]", "{}", "[1]", "not json"])
+def test_merge_endpoint_refuses_invalid_records(client, records):
+    response = client.post(f"/v1/docx/templates/{'0' * 64}/merge", headers=HEADERS, data={"records": records})
+
+    assert response.status_code == 400
+
+def test_merge_with_unknown_template_is_404(client):
+    response = client.post(f"/v1/docx/templates/{'0' * 64}/merge", headers=HEADERS, data={"records": '[{"a": 1}]'})
+
+    assert response.status_code == 404
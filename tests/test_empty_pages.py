@@ -0,0 +1,76 @@
+import asyncio
+import io
+import fitz
+import pytest
+from PIL import Image
+from app.services.pdf_service import is_page_body_empty, remove_empty_pages
+
+def _page(doc: fitz.Document, draw=None) -> fitz.Page:
+    page = doc.new_page(width=200, height=200)
+    if draw:
+        draw(page)
+    return page
+
+def _empty(draw=None, **options) -> bool:
+    doc = fitz.open()
+    _page(doc, draw)
+    # Round-trip so the page is read back like an upload, content streams and all
+    reopened = fitz.open(stream=doc.tobytes(), filetype="pdf")
+    return is_page_body_empty(reopened[0], **options)
+
+def _image(page: fitz.Page):
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 20), "black").save(buffer, format="PNG")
+    page.insert_image(fitz.Rect(60, 60, 140, 140), stream=buffer.getvalue())
+
+def test_page_without_content_is_empty():
+    assert _empty()
+
+def test_body_text_makes_a_page_non_empty():
+    assert not _empty(lambda page: page.insert_text((20, 100), "A line of body text on the page"))
+
+def test_header_and_footer_text_is_ignored():
+    def draw(page):
+        page.insert_text((20, 15), "Confidential - company header text")
+        page.insert_text((20, 195), "Page 1 of 10 - footer text goes here")
+    assert _empty(draw)
+
+def test_short_text_below_the_threshold_is_not_ink():
+    # A few characters are neither enough text nor counted as ink by the raster check
+    assert _empty(lambda page: page.insert_text((90, 100), "x"))
+
+def test_image_in_the_body_makes_a_page_non_empty():
+    assert not _empty(_image)
+
+def test_vector_drawing_in_the_body_makes_a_page_non_empty():
+    assert not _empty(lambda page: page.draw_rect(fitz.Rect(50, 50, 150, 150), color=(0, 0, 0), fill=(0, 0, 0)))
+
+def test_white_drawing_is_no_ink():
+    assert _empty(lambda page: page.draw_rect(fitz.Rect(50, 50, 150, 150), color=(1, 1, 1), fill=(1, 1, 1)))
+
+def test_ink_threshold_decides_for_small_marks():
+    def dot(page):
+        page.draw_rect(fitz.Rect(100, 100, 104, 104), color=(0, 0, 0), fill=(0, 0, 0))
+    assert not _empty(dot, ink_threshold=0.0001)
+    assert _empty(dot, ink_threshold=0.01)
+
+def test_remove_empty_pages_keeps_the_others_in_order():
+    doc = fitz.open()
+    _page(doc, lambda page: page.insert_text((20, 100), "First page with enough body text"))
+    _page(doc)
+    _page(doc, _image)
+    _page(doc, lambda page: page.insert_text((20, 15), "Only a header on this page here"))
+
+    result = fitz.open(stream=asyncio.run(remove_empty_pages(doc.tobytes())), filetype="pdf")
+
+    assert result.page_count == 2
+    assert "First page" in result[0].get_text()
+    assert result[1].get_images()
+
+def test_all_empty_pages_is_an_error():
+    doc = fitz.open()
+    _page(doc)
+    _page(doc)
+
+    with pytest.raises(ValueError, match="All pages in the document were considered empty."):
+        asyncio.run(remove_empty_pages(doc.tobytes()))
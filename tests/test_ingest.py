@@ -0,0 +1,179 @@
+import asyncio
+import io
+import os
+import zipfile
+import fitz
+import pytest
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.api.v1 import ingest
+from app.api.v1.routers import pdf as pdf_router
+from app.main import app
+
+HEADERS = {"X-API-Key": "test"}
+
+def _pdf() -> bytes:
+    doc = fitz.open()
+    doc.new_page(width=200, height=100).insert_text((20, 50), "sign ${sign}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 10), "black").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest.settings, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def _sign_batch(client, archive: bytes):
+    return client.post(
+        "/v1/pdf/sign-batch",
+        headers=HEADERS,
+        data={"template_text": "${sign}"},
+        files={"archive": ("batch.zip", archive, "application/zip"), "image_file": ("sign.png", _png(), "image/png")}
+    )
+
+def test_archive_members_are_extracted_and_signed(client, upload_dir):
+    response = _sign_batch(client, _zip({"a.pdf": _pdf(), "notes.txt": b"skipped"}))
+
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert names == ["0001_signed_a.pdf", "manifest.json"]
+    assert list(upload_dir.iterdir()) == []
+
+def test_archive_member_that_is_not_a_pdf_is_refused(client, upload_dir):
+    response = _sign_batch(client, _zip({"a.pdf": _pdf(), "fake.pdf": b"MZ\x90\x00 not a pdf"}))
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "'fake.pdf' is not a PDF"}
+    # The members already extracted are removed with the refused request
+    assert list(upload_dir.iterdir()) == []
+
+def test_signature_image_over_the_image_limit_is_refused(client, upload_dir, monkeypatch):
+    monkeypatch.setattr(ingest.settings, "IMAGE_MAX_BYTES", 64)
+
+    response = client.post(
+        "/v1/pdf/sign",
+        headers=HEADERS,
+        files={"pdf_file": ("a.pdf", _pdf(), "application/pdf"), "image_file": ("sign.png", _png() + b"\0" * 64, "image/png")}
+    )
+
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Upload exceeds the 64 byte limit."}
+
+def test_signature_image_within_the_limit_is_stamped(client, upload_dir):
+    response = client.post(
+        "/v1/pdf/sign",
+        headers=HEADERS,
+        files={"pdf_file": ("a.pdf", _pdf(), "application/pdf"), "image_file": ("sign.png", _png(), "image/png")}
+    )
+
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF-")
+
+def _convert(client, data: bytes, content_type: str = "application/pdf", route: str = "convert-to-text"):
+    return client.post(f"/v1/pdf/{route}", headers=HEADERS, params={"ocr": "false"} if route == "convert-to-text" else None, files={"file": ("a.pdf", data, content_type)})
+
+def test_content_length_over_the_limit_is_refused_before_the_body_is_read(client, upload_dir, monkeypatch):
+    monkeypatch.setattr(ingest.settings, "MAX_UPLOAD_BYTES", 256)
+
+    response = _convert(client, _pdf())
+
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Upload exceeds the 256 byte limit."}
+
+def test_route_limit_overrides_the_default(client, upload_dir, monkeypatch):
+    monkeypatch.setenv("MAX_UPLOAD_BYTES_CONVERT_TO_TEXT", "256")
+
+    assert _convert(client, _pdf()).status_code == 413
+    assert _convert(client, _pdf(), route="convert-to-image").status_code == 200
+
+def test_body_without_content_length_is_cut_off_at_the_limit(client, upload_dir, monkeypatch):
+    monkeypatch.setattr(ingest.settings, "MAX_UPLOAD_BYTES", 2048)
+    body = (
+        b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="a.pdf"\r\n'
+        b"Content-Type: application/pdf\r\n\r\n" + _pdf() + b"\0" * 4096 + b"\r\n--boundary--\r\n"
+    )
+
+    def chunks():
+        for offset in range(0, len(body), 512):
+            yield body[offset:offset + 512]
+
+    response = client.post(
+        "/v1/pdf/convert-to-text",
+        params={"ocr": "false"},
+        headers={**HEADERS, "Content-Type": "multipart/form-data; boundary=boundary"},
+        content=chunks()
+    )
+
+    assert response.status_code == 413
+    assert "content-length" not in response.request.headers
+    assert list(upload_dir.iterdir()) == []
+
+@pytest.mark.parametrize("data, content_type", [
+    (b"junk before the header\n" + _pdf(), "application/pdf"),
+    (_pdf(), "application/octet-stream"),
+])
+def test_pdf_is_recognised_by_its_magic_bytes(client, data, content_type):
+    response = _convert(client, data, content_type)
+
+    assert response.status_code == 200
+    assert response.json()["page_count"] == 1
+
+@pytest.mark.parametrize("data", [b"MZ\x90\x00 not a pdf", b"\0" * 2048 + b"%PDF-1.7", b""])
+def test_upload_without_pdf_magic_is_refused(client, upload_dir, data):
+    response = _convert(client, data)
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "'a.pdf' is not a PDF"}
+
+def test_large_upload_is_spooled_to_disk_and_removed_after_the_response(client, upload_dir, monkeypatch):
+    monkeypatch.setattr(ingest.settings, "UPLOAD_SPOOL_BYTES", 64)
+    monkeypatch.setattr(ingest.settings, "UPLOAD_CHUNK_SIZE", 64)
+    spooled = []
+    original = ingest.ingest
+
+    async def recording_ingest(*args, **kwargs):
+        upload = await original(*args, **kwargs)
+        spooled.append((upload.path, os.path.exists(upload.path), upload.size))
+        return upload
+
+    monkeypatch.setattr(pdf_router, "ingest", recording_ingest)
+    data = _pdf()
+
+    response = _convert(client, data)
+
+    assert response.status_code == 200
+    assert "sign ${sign}" in response.json()["text"]
+    [(path, existed, size)] = spooled
+    assert os.path.dirname(path) == str(upload_dir) and existed and size == len(data)
+    assert list(upload_dir.iterdir()) == []
+
+def test_spooled_upload_over_the_limit_leaves_no_file(upload_dir, monkeypatch):
+    monkeypatch.setattr(ingest.settings, "UPLOAD_SPOOL_BYTES", 64)
+    monkeypatch.setattr(ingest.settings, "UPLOAD_CHUNK_SIZE", 64)
+    request = Request({"type": "http", "headers": [], "state": {}})
+    # No declared size, as with a chunked request body
+    upload = UploadFile(io.BytesIO(_pdf() + b"\0" * 1024), filename="a.pdf")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ingest.ingest(request, upload, limit=1024))
+
+    assert error.value.status_code == 413
+    assert list(upload_dir.iterdir()) == []
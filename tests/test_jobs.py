@@ -0,0 +1,144 @@
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.main import app
+from app.services.job_service import FAILED, FINISHED, JOB_KINDS, QUEUED, RUNNING, SUCCEEDED, LocalJobStorage, job_service
+
+HEADERS = {"X-API-Key": "test"}
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def test_docx_job_is_held_to_the_docx_size_limit(client, monkeypatch):
+    monkeypatch.setattr(JOB_KINDS["docx-to-pdf"], "max_bytes", 64)
+
+    response = client.post("/v1/jobs/docx-to-pdf", headers=HEADERS, files={"file": ("a.docx", b"PK" + b"\0" * 100, DOCX)})
+
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Upload exceeds the 64 byte limit."}
+
+def test_unknown_job_kind_is_404(client):
+    response = client.post("/v1/jobs/fax", headers=HEADERS, files={"file": ("a.pdf", b"%PDF-1.7", "application/pdf")})
+
+    assert response.status_code == 404
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    """A running app (so jobs outlive their request) with job storage in a temporary directory."""
+    monkeypatch.setattr(job_service, "storage", LocalJobStorage(str(tmp_path)))
+    with TestClient(app) as client:
+        yield client
+
+def _pdf(pages: int = 2) -> bytes:
+    document = fitz.open()
+    for number in range(pages):
+        document.new_page(width=200, height=200).insert_text((20, 100), f"Page {number + 1}")
+    data = document.tobytes()
+    document.close()
+    return data
+
+def _submit(client, kind: str, options: dict = None):
+    return client.post(
+        f"/v1/jobs/{kind}",
+        headers=HEADERS,
+        files={"file": ("a.pdf", _pdf(), "application/pdf")},
+        data={"options": json.dumps(options or {})}
+    )
+
+def _wait(client, job_id: str, statuses=FINISHED) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        status = client.get(f"/v1/jobs/{job_id}", headers=HEADERS).json()
+        if status["status"] in statuses:
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} is still {status['status']}")
+
+def test_job_runs_in_the_background_and_its_result_can_be_fetched_once_and_deleted(jobs, tmp_path):
+    response = _submit(jobs, "convert-to-text", {"ocr": False})
+
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.headers["location"].endswith(f"/v1/jobs/{job_id}")
+    assert response.json()["status"] in (QUEUED, RUNNING, SUCCEEDED)
+
+    status = _wait(jobs, job_id)
+    assert status["status"] == SUCCEEDED
+    assert status["progress"] == {"done": 2, "total": 2}
+    assert status["links"]["result"].endswith(f"/v1/jobs/{job_id}/result")
+    assert status["expires_at"] == status["finished_at"] + settings.JOB_TTL
+
+    result = jobs.get(f"/v1/jobs/{job_id}/result", headers=HEADERS)
+    assert result.status_code == 200
+    assert result.headers["content-type"] == "application/json"
+    assert result.headers["content-disposition"] == "attachment; filename=extracted_text.json"
+    assert int(result.headers["content-length"]) == status["result"]["size"] == len(result.content)
+    assert "Page 1" in result.json()["text"] and result.json()["page_count"] == 2
+
+    assert jobs.delete(f"/v1/jobs/{job_id}", headers=HEADERS).json() == {"deleted": job_id}
+    assert jobs.get(f"/v1/jobs/{job_id}", headers=HEADERS).status_code == 404
+    assert jobs.get(f"/v1/jobs/{job_id}/result", headers=HEADERS).status_code == 404
+    assert os.listdir(tmp_path) == []
+
+def test_streamed_job_result_is_written_whole(jobs):
+    job_id = _submit(jobs, "convert-to-images", {"dpi": 30}).json()["job_id"]
+
+    assert _wait(jobs, job_id)["status"] == SUCCEEDED
+    archive = zipfile.ZipFile(io.BytesIO(jobs.get(f"/v1/jobs/{job_id}/result", headers=HEADERS).content))
+    assert sorted(archive.namelist()) == ["page_1.png", "page_2.png"]
+
+def test_pending_job_has_no_result_and_can_be_cancelled(jobs, monkeypatch):
+    started = threading.Event()
+
+    async def run(job, source, options, filename):
+        started.set()
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(JOB_KINDS["convert-to-image"], "run", run)
+    job_id = _submit(jobs, "convert-to-image").json()["job_id"]
+    assert started.wait(5)
+
+    assert _wait(jobs, job_id, (RUNNING,))["status"] == RUNNING
+    response = jobs.get(f"/v1/jobs/{job_id}/result", headers=HEADERS)
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Job is running, the result is not ready yet"}
+
+    assert jobs.delete(f"/v1/jobs/{job_id}", headers=HEADERS).status_code == 200
+    assert jobs.get(f"/v1/jobs/{job_id}", headers=HEADERS).status_code == 404
+    assert job_service.pending == 0
+
+def test_failed_job_reports_its_error(jobs, monkeypatch):
+    async def run(job, source, options, filename):
+        raise ValueError("the PDF has no pages")
+
+    monkeypatch.setattr(JOB_KINDS["convert-to-image"], "run", run)
+    job_id = _submit(jobs, "convert-to-image").json()["job_id"]
+
+    status = _wait(jobs, job_id)
+    assert (status["status"], status["error"], status["result"]) == (FAILED, "the PDF has no pages", None)
+    assert "result" not in status["links"]
+    response = jobs.get(f"/v1/jobs/{job_id}/result", headers=HEADERS)
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Job failed: the PDF has no pages"}
+
+@pytest.mark.parametrize("options", ['{"dpi": 0}', '{"ocr": "yes"}', "[]", "not json"])
+def test_invalid_options_are_refused_before_queueing(client, options):
+    response = client.post("/v1/jobs/convert-to-text", headers=HEADERS, files={"file": ("a.pdf", _pdf(), "application/pdf")}, data={"options": options})
+
+    assert response.status_code == 400
+    assert job_service.pending == 0
+
+@pytest.mark.parametrize("job_id", ["0" * 32, "not-a-job-id"])
+def test_unknown_job_is_404(client, job_id):
+    assert client.get(f"/v1/jobs/{job_id}", headers=HEADERS).status_code == 404
+    assert client.delete(f"/v1/jobs/{job_id}", headers=HEADERS).status_code == 404
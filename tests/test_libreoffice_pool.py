@@ -0,0 +1,170 @@
+import ast
+import asyncio
+import os
+import subprocess
+import sys
+import types
+import pytest
+from fastapi import HTTPException
+from app.services import libreoffice_pool as pool_module
+from app.services.libreoffice_pool import CONVERT_TO, UNO, LibreOfficePool, OfficeWorker
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the fake soffice is a POSIX script")
+
+# Stands in for `soffice --convert-to pdf --outdir DIR FILE...`: writes DIR/<name>.pdf for every
+# file, logs each call, fails on documents containing FAIL and sleeps on those containing SLOW
+FAKE_SOFFICE = """#!{python}
+import os, sys, time
+args = sys.argv[1:]
+with open(os.path.join(os.path.dirname(__file__), "calls.log"), "a") as log:
+    log.write(repr(args) + "\\n")
+out_dir = args[args.index("--outdir") + 1]
+sources = args[args.index("--outdir") + 2:]
+for source in sources:
+    content = open(source, "rb").read()
+    if b"SLOW" in content:
+        time.sleep(5)
+    if b"FAIL" in content:
+        sys.exit(1)
+    name = os.path.splitext(os.path.basename(source))[0] + ".pdf"
+    with open(os.path.join(out_dir, name), "wb") as f:
+        f.write(b"%PDF-converted " + content)
+"""
+
+@pytest.fixture
+def office(tmp_path, monkeypatch):
+    soffice = tmp_path / "office" / "soffice"
+    soffice.parent.mkdir()
+    soffice.write_text(FAKE_SOFFICE.format(python=sys.executable))
+    soffice.chmod(0o755)
+    monkeypatch.setattr(pool_module.settings, "LIBREOFFICE_PATH", str(soffice))
+    monkeypatch.setattr(pool_module.settings, "LIBREOFFICE_PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(pool_module.settings, "LIBREOFFICE_BATCH_SIZE", 2)
+    # No UNO anywhere: every job runs soffice --convert-to
+    monkeypatch.setattr(pool_module, "uno_bridge", None)
+    monkeypatch.setattr(LibreOfficePool, "_bridge_pythons", lambda self, soffice_path: [])
+
+    work = tmp_path / "work"
+    work.mkdir()
+
+    def document(name: str, content: bytes = b"text") -> str:
+        path = work / name
+        path.write_bytes(content)
+        return str(path)
+
+    def calls() -> list:
+        log = soffice.parent / "calls.log"
+        return [ast.literal_eval(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+    return types.SimpleNamespace(document=document, calls=calls, work=work, profiles=tmp_path / "profiles")
+
+def test_conversion_runs_on_a_private_profile_per_process(office):
+    async def run():
+        pool = LibreOfficePool(2, 4, 10, 100)
+        await pool.convert(office.document("a.docx", b"hello"), str(office.work / "out.pdf"))
+        assert pool.mode == CONVERT_TO
+        await pool.stop()
+
+    asyncio.run(run())
+
+    assert (office.work / "out.pdf").read_bytes() == b"%PDF-converted hello"
+    profile = next(arg for arg in office.calls()[0] if arg.startswith("-env:UserInstallation="))
+    assert f"/profiles/{os.getpid()}/worker_" in profile
+    # Our profiles are removed with the pool
+    assert not (office.profiles / str(os.getpid())).exists()
+
+def test_many_documents_are_grouped_per_soffice_call(office):
+    sources = [office.document(f"doc{number}.docx") for number in range(5)]
+    failing = office.document("broken.docx", b"FAIL")
+
+    async def run():
+        pool = LibreOfficePool(2, 4, 10, 100)
+        results = [result async for result in pool.convert_many(sources + [failing], str(office.work))]
+        await pool.stop()
+        return dict(results)
+
+    results = asyncio.run(run())
+
+    # Six documents in groups of LIBREOFFICE_BATCH_SIZE: three soffice calls
+    assert len(office.calls()) == 3
+    assert set(results) == set(sources) | {failing}
+    failed_group = [path for path, error in results.items() if error is not None]
+    assert failing in failed_group and len(failed_group) == 2
+    for path in set(sources) - set(failed_group):
+        assert (office.work / (os.path.basename(path)[:-5] + ".pdf")).exists()
+
+def test_slow_conversion_times_out_with_504(office):
+    async def run():
+        pool = LibreOfficePool(1, 4, 0.5, 100)
+        try:
+            await pool.convert(office.document("slow.docx", b"SLOW"), str(office.work / "slow.pdf"))
+        finally:
+            await pool.stop()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+
+    assert error.value.status_code == 504
+
+def test_full_queue_is_refused_with_503(office):
+    async def run():
+        pool = LibreOfficePool(1, 0, 10, 100)
+        busy = asyncio.create_task(pool.convert(office.document("slow.docx", b"SLOW"), str(office.work / "slow.pdf")))
+        await asyncio.sleep(0.2)
+        try:
+            await pool.convert(office.document("a.docx"), str(office.work / "a.pdf"))
+        finally:
+            busy.cancel()
+            await asyncio.gather(busy, return_exceptions=True)
+            await pool.stop()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+
+    assert error.value.status_code == 503
+
+def test_profiles_of_exited_processes_are_removed(office):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    (office.profiles / str(exited.pid) / "worker_0").mkdir(parents=True)
+    (office.profiles / str(os.getppid()) / "worker_0").mkdir(parents=True)
+
+    async def run():
+        pool = LibreOfficePool(1, 4, 10, 100)
+        await pool.convert(office.document("a.docx"), str(office.work / "a.pdf"))
+        remaining = sorted(os.listdir(office.profiles))
+        await pool.stop()
+        return remaining
+
+    remaining = asyncio.run(run())
+
+    # The parent is alive and keeps its profile; the exited process's is gone
+    assert str(exited.pid) not in remaining
+    assert str(os.getppid()) in remaining
+
+def test_every_start_listens_on_a_new_pipe(tmp_path, monkeypatch):
+    started = []
+    spawn = asyncio.create_subprocess_exec
+
+    async def create_subprocess_exec(*args, **kwargs):
+        # Record the soffice command line, run something that lives until it is killed
+        started.append(args)
+        return await spawn("sleep", "30", start_new_session=True)
+
+    monkeypatch.setattr(pool_module.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    monkeypatch.setattr(pool_module, "uno_bridge", types.SimpleNamespace(connect=lambda pipe_name: object()))
+
+    async def run():
+        worker = OfficeWorker(3, "soffice", str(tmp_path), UNO)
+        await worker.start()
+        first = worker.pipe_name
+        await worker.restart()
+        second = worker.pipe_name
+        await worker.stop()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first != second
+    assert first.startswith(f"utility_api_{os.getpid()}_3_")
+    assert [f"--accept=pipe,name={name};urp;StarOffice.ComponentContext" in args for name, args in zip((first, second), started)] == [True, True]
@@ -0,0 +1,86 @@
+import re
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from app.core import metrics
+from app.core.metrics import apply_samples, call_collecting, stage
+from app.main import app
+
+HEADERS = {"X-API-Key": "test"}
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def _pdf(pages: int) -> bytes:
+    document = fitz.open()
+    for number in range(pages):
+        document.new_page(width=100, height=100).insert_text((10, 50), f"Page {number + 1}")
+    data = document.tobytes()
+    document.close()
+    return data
+
+def _value(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def _convert(client):
+    return client.post("/v1/pdf/convert-to-image", headers=HEADERS, files={"file": ("a.pdf", _pdf(3), "application/pdf")})
+
+def test_request_is_counted_under_its_route_template(client):
+    before = _value("utility_api_request_duration_seconds_count", method="GET", route="/v1/jobs/{job_id}", status="404")
+
+    client.get("/v1/jobs/0123456789abcdef0123456789abcdef", headers=HEADERS)
+    client.get("/v1/jobs/fedcba9876543210fedcba9876543210", headers=HEADERS)
+
+    assert _value("utility_api_request_duration_seconds_count", method="GET", route="/v1/jobs/{job_id}", status="404") == before + 2
+
+def test_pages_bytes_and_stages_rendered_in_a_worker_are_recorded(client):
+    pages = _value("utility_api_pages_processed_total", operation="convert-to-image")
+    renders = _value("utility_api_stage_duration_seconds_count", operation="convert-to-image", stage="render")
+    written = _value("utility_api_bytes_processed_total", operation="convert-to-image", direction="out")
+
+    response = _convert(client)
+
+    assert response.status_code == 200
+    assert _value("utility_api_pages_processed_total", operation="convert-to-image") == pages + 3
+    assert _value("utility_api_stage_duration_seconds_count", operation="convert-to-image", stage="render") == renders + 3
+    assert _value("utility_api_bytes_processed_total", operation="convert-to-image", direction="out") > written
+
+def test_server_timing_lists_the_stages_of_the_request(client, monkeypatch):
+    assert "server-timing" not in _convert(client).headers
+
+    monkeypatch.setattr(metrics.settings, "SERVER_TIMING_ENABLED", True)
+    header = _convert(client).headers["server-timing"]
+
+    entries = dict(re.fullmatch(r"([\w-]+);dur=([\d.]+)", entry).groups() for entry in header.split(", "))
+    assert {"admission-bulk", "convert-to-image-render", "convert-to-image-encode", "total"} <= set(entries)
+    assert float(entries["total"]) >= float(entries["convert-to-image-render"])
+
+def test_worker_samples_are_applied_only_once_shipped_back():
+    before = _value("utility_api_stage_duration_seconds_count", operation="test", stage="work")
+
+    def work():
+        with stage("test", "work"):
+            return "done"
+
+    result, samples = call_collecting(work)
+
+    assert result == "done"
+    assert [(kind, labels) for kind, labels, _ in samples] == [("stage", ("test", "work"))]
+    assert _value("utility_api_stage_duration_seconds_count", operation="test", stage="work") == before
+    apply_samples(samples)
+    assert _value("utility_api_stage_duration_seconds_count", operation="test", stage="work") == before + 1
+
+def test_metrics_endpoint_exposes_pool_cache_and_queue_state(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for line in (
+        'utility_api_pool_workers{pool="pdf"}',
+        'utility_api_cache_hit_ratio{cache="pdf"}',
+        'utility_api_admission_running{lane="bulk"}',
+        "utility_api_jobs_pending",
+    ):
+        assert line in response.text
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import sys
+import threading
+import fitz
+import pytest
+import pytesseract
+from app.services import pdf_service
+from app.services.pdf_service import PAGE_BREAK, convert_pdf_to_text_with_ocr, ocr_dpi
+
+def _pdf(*pages) -> bytes:
+    """One page per entry: a string becomes a page with that text layer, a number a blank page that many points wide."""
+    doc = fitz.open()
+    for page in pages:
+        if isinstance(page, str):
+            doc.new_page(width=200, height=100).insert_text((20, 50), page)
+        else:
+            doc.new_page(width=page, height=72)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _ocr(data: bytes, dpi: int = 72, lang=None) -> dict:
+    return asyncio.run(convert_pdf_to_text_with_ocr(data, dpi, lang))
+
+class StubTesseract:
+    """Stands in for pytesseract.image_to_string: records every image and echoes its size back."""
+
+    def __init__(self):
+        self.calls = []
+        self.failing_widths = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, img, lang=None):
+        with self._lock:
+            self.calls.append({"size": img.size, "lang": lang, "cmd": pytesseract.pytesseract.tesseract_cmd})
+        if img.width in self.failing_widths:
+            raise pytesseract.TesseractError(1, "stub failure")
+        return f"scanned {img.width}x{img.height}"
+
+@pytest.fixture
+def tesseract(tmp_path, monkeypatch):
+    binary = tmp_path / "tesseract"
+    binary.write_text("#!/bin/sh\nexit 1\n")
+    binary.chmod(0o755)
+    monkeypatch.setattr(pdf_service.settings, "TESSERACT_CMD", str(binary))
+    monkeypatch.setattr(pytesseract.pytesseract, "tesseract_cmd", pytesseract.pytesseract.tesseract_cmd)
+    # The pytesseract engine is used even where tesserocr is installed, and no engine is cached yet
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+    monkeypatch.setattr(pdf_service, "_ocr_state", threading.local())
+
+    stub = StubTesseract()
+    monkeypatch.setattr(pytesseract, "image_to_string", stub)
+    return stub
+
+def test_only_pages_without_text_are_recognized(tesseract):
+    result = _ocr(_pdf("first page", 100, "third page"))
+
+    assert result["success"] and result["used_ocr"]
+    assert [page["page"] for page in result["ocr_pages"]] == [2]
+    assert result["ocr_pages"][0]["error"] is None
+    pages = result["text"].split(PAGE_BREAK)
+    assert "first page" in pages[0] and pages[1] == "scanned 100x72" and "third page" in pages[2]
+    assert len(tesseract.calls) == 1
+
+def test_text_layer_only_never_runs_tesseract(tesseract):
+    result = _ocr(_pdf("first page", "second page"))
+
+    assert result["success"] and not result["used_ocr"]
+    assert result["ocr_pages"] == []
+    assert tesseract.calls == []
+
+def test_uses_the_configured_tesseract_binary(tesseract):
+    _ocr(_pdf(100))
+
+    assert tesseract.calls[0]["cmd"] == pdf_service.settings.TESSERACT_CMD
+
+def test_dpi_is_capped_at_ocr_max_dpi(tesseract, monkeypatch):
+    monkeypatch.setattr(pdf_service.settings, "OCR_MAX_DPI", 144)
+
+    _ocr(_pdf(100), dpi=1200)
+
+    # 144 dpi renders 100x72 points at twice the size
+    assert tesseract.calls[0]["size"] == (200, 144)
+
+def test_dpi_below_the_cap_is_kept(tesseract, monkeypatch):
+    monkeypatch.setattr(pdf_service.settings, "OCR_MAX_DPI", 300)
+
+    _ocr(_pdf(100), dpi=36)
+
+    assert tesseract.calls[0]["size"] == (50, 36)
+
+@pytest.mark.parametrize("dpi, expected", [(1200, 144), (144, 144), (36, 36), (0, 1), (-5, 1)])
+def test_ocr_dpi_is_the_render_resolution_used_in_cache_keys(monkeypatch, dpi, expected):
+    monkeypatch.setattr(pdf_service.settings, "OCR_MAX_DPI", 144)
+
+    assert ocr_dpi(dpi) == expected
+
+def test_thread_workers_leave_the_process_environment_alone(monkeypatch):
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+    monkeypatch.setattr(pdf_service, "_ocr_state", threading.local())
+
+    pdf_service._init_ocr_worker()
+    assert "OMP_THREAD_LIMIT" not in os.environ
+
+    pdf_service._init_ocr_worker(own_process=True)
+    assert os.environ["OMP_THREAD_LIMIT"] == "1"
+
+@pytest.mark.parametrize("lang, expected", [
+    (None, "eng"),
+    ([], "eng"),
+    (["en"], "eng"),
+    (["en", " id"], "eng+ind"),
+    (["zh", "ja"], "chi_sim+jpn"),
+    # Codes without a mapping are passed on as Tesseract names
+    (["eng", "ita"], "eng+ita"),
+    (["", " "], "eng"),
+])
+def test_language_codes_map_to_tesseract_names(tesseract, lang, expected):
+    _ocr(_pdf(100), lang=lang)
+
+    assert tesseract.calls[0]["lang"] == expected
+
+def test_failing_page_is_reported_and_the_others_are_kept(tesseract):
+    tesseract.failing_widths.add(100)
+
+    result = _ocr(_pdf("first page", 100, 120))
+
+    assert result["success"]
+    by_page = {page["page"]: page for page in result["ocr_pages"]}
+    assert "stub failure" in by_page[2]["error"]
+    assert by_page[3]["error"] is None
+    pages = result["text"].split(PAGE_BREAK)
+    assert pages[1] == "" and pages[2] == "scanned 120x72"
+
+def test_no_text_at_all_reports_the_ocr_error(tesseract):
+    tesseract.failing_widths.add(100)
+
+    result = _ocr(_pdf(100))
+
+    assert not result["success"] and result["text"] == ""
+    assert result["error"].startswith("No text found in PDF, including with OCR. OCR error:")
+    assert "stub failure" in result["error"]
+
+def test_every_blank_page_is_recognized_once_and_in_order(tesseract):
+    widths = [60 + 10 * i for i in range(12)]
+
+    result = _ocr(_pdf(*widths))
+
+    assert sorted(call["size"][0] for call in tesseract.calls) == widths
+    assert [page["page"] for page in result["ocr_pages"]] == list(range(1, 13))
+    assert result["text"].split(PAGE_BREAK) == [f"scanned {width}x72" for width in widths]
+
+def test_progress_counts_text_pages_as_done_first(tesseract):
+    reports = []
+
+    asyncio.run(convert_pdf_to_text_with_ocr(_pdf("first page", 100, 120), 72, None, lambda done, total: reports.append((done, total))))
+
+    assert reports[0] == (1, 3)
+    assert reports[-1] == (3, 3)
@@ -0,0 +1,105 @@
+import io
+import fitz
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.services.pdf_service import DOWNSAMPLE_SLACK
+
+HEADERS = {"X-API-Key": "test"}
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def _photo(size: int) -> bytes:
+    """A noisy gradient, so neither PNG nor a downsampled JPEG of it is trivially small."""
+    rng = np.random.default_rng(7)
+    gradient = np.linspace(0, 200, size, dtype=np.float32)
+    pixels = gradient[None, :, None] + gradient[:, None, None] / 4 + rng.integers(0, 40, (size, size, 3))
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8), "RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _pdf(pages: int = 2) -> bytes:
+    """Pages with the same 600px photo shown one inch wide (600 dpi), saved without compression."""
+    photo = _photo(600)
+    document = fitz.open()
+    xref = 0
+    for number in range(pages):
+        page = document.new_page(width=300, height=300)
+        page.insert_text((20, 30), f"Page {number + 1}")
+        xref = page.insert_image(fitz.Rect(100, 100, 172, 172), stream=photo, xref=xref)
+    data = document.tobytes(garbage=0, deflate=False)
+    document.close()
+    return data
+
+def _optimize(client, data: bytes, **form):
+    return client.post("/v1/pdf/optimize", headers=HEADERS, data=form, files={"file": ("report.pdf", data, "application/pdf")})
+
+def test_optimized_pdf_is_smaller_and_keeps_its_content(client):
+    data = _pdf()
+
+    response = _optimize(client, data)
+
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == "attachment; filename=report_optimized.pdf"
+    assert int(response.headers["x-original-size"]) == len(data)
+    assert int(response.headers["x-optimized-size"]) == len(response.content) < len(data) / 4
+    # One shared image object, rewritten once
+    assert response.headers["x-images-rewritten"] == "1"
+    with fitz.open(stream=response.content, filetype="pdf") as document:
+        assert document.page_count == 2
+        assert [page.get_text().strip() for page in document] == ["Page 1", "Page 2"]
+        [(xref, *_)] = {image for page in document for image in page.get_images()}
+        info = document[0].get_image_info()[0]
+        shown_inches = (info["bbox"][2] - info["bbox"][0]) / 72
+        assert info["width"] / shown_inches <= 150 * DOWNSAMPLE_SLACK
+        assert document.xref_get_key(xref, "Filter") == ("name", "/DCTDecode")
+
+def test_zero_image_dpi_leaves_images_alone(client):
+    response = _optimize(client, _pdf(), image_dpi="0")
+
+    assert response.status_code == 200
+    assert response.headers["x-images-rewritten"] == "0"
+    with fitz.open(stream=response.content, filetype="pdf") as document:
+        assert document[0].get_image_info()[0]["width"] == 600
+
+def test_pdf_that_cannot_shrink_is_returned_unchanged(client):
+    optimized = _optimize(client, _pdf()).content
+
+    response = _optimize(client, optimized)
+
+    assert response.status_code == 200
+    assert response.content == optimized
+    assert response.headers["x-original-size"] == response.headers["x-optimized-size"]
+
+@pytest.mark.parametrize("form, detail", [
+    ({"image_dpi": "-1"}, "Image DPI must be between"),
+    ({"image_quality": "0"}, "Image quality must be between 1 and 100"),
+    ({"image_quality": "101"}, "Image quality must be between 1 and 100"),
+])
+def test_invalid_options_are_refused(client, form, detail):
+    response = _optimize(client, _pdf(1), **form)
+
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+
+def test_optimize_option_on_a_save_path_gives_a_smaller_valid_pdf(client):
+    data = _pdf(3)
+
+    def split(optimize: str):
+        return client.post(
+            "/v1/pdf/split-by-range",
+            headers=HEADERS,
+            data={"start_page": "2", "optimize": optimize},
+            files={"file": ("a.pdf", data, "application/pdf")}
+        )
+
+    plain, optimized = split("false"), split("true")
+
+    assert plain.status_code == optimized.status_code == 200
+    assert len(optimized.content) < len(plain.content)
+    with fitz.open(stream=optimized.content, filetype="pdf") as document:
+        assert [page.get_text().strip() for page in document] == ["Page 2", "Page 3"]
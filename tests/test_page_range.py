@@ -0,0 +1,49 @@
+import pytest
+from app.utils.page_range import parse_page_range, parse_split_spec
+
+@pytest.mark.parametrize("spec, expected", [
+    (None, [0, 1, 2, 3, 4]),
+    ("", [0, 1, 2, 3, 4]),
+    ("2", [1]),
+    ("1-2,4", [0, 1, 3]),
+    (" 2 - 3 ", [1, 2]),
+    ("4-", [3, 4]),
+    ("-2", [0, 1]),
+])
+def test_page_range(spec, expected):
+    assert parse_page_range(spec, 5) == expected
+
+@pytest.mark.parametrize("spec", ["1-a", "abc", "3--", "-", "1-2-3", "1 2", "²"])
+def test_malformed_page_range_names_the_range(spec):
+    with pytest.raises(ValueError, match=f"Invalid page range '{spec}', expected"):
+        parse_page_range(spec, 5)
+
+@pytest.mark.parametrize("spec", ["0", "6", "4-2", "2-6"])
+def test_page_range_outside_the_document(spec):
+    with pytest.raises(ValueError, match=f"Invalid page range '{spec}', document has 5 pages"):
+        parse_page_range(spec, 5)
+
+def test_split_spec_ranges():
+    assert parse_split_spec("1-2;3-", 5) == [("pages_1-2", [0, 1]), ("pages_3-", [2, 3, 4])]
+
+def test_split_spec_names_the_malformed_range():
+    with pytest.raises(ValueError, match="Invalid page range '3-a'"):
+        parse_split_spec("1-2;3-a", 5)
+
+def test_split_spec_every():
+    assert parse_split_spec("every:2", 5) == [("pages_1-2", [0, 1]), ("pages_3-4", [2, 3]), ("pages_5-5", [4])]
+
+@pytest.mark.parametrize("spec, message", [
+    ("every:x", "Chunk size in 'every:x' must be a whole number"),
+    ("every:", "Chunk size in 'every:' must be a whole number"),
+    ("every:0", "Chunk size must be at least 1"),
+    ("bookmarks:top", "Bookmark level in 'bookmarks:top' must be a whole number"),
+])
+def test_split_spec_invalid_argument(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_split_spec(spec, 5)
+
+def test_split_spec_bookmarks():
+    toc = [[1, "Intro", 2], [2, "Detail", 3], [1, "Appendix", 4]]
+    assert parse_split_spec("bookmarks", 5, toc) == [("front_matter", [0]), ("Intro", [1, 2]), ("Appendix", [3, 4])]
+    assert parse_split_spec("bookmarks:2", 5, toc) == [("front_matter", [0, 1]), ("Detail", [2, 3, 4])]
@@ -0,0 +1,59 @@
+import re
+import pytest
+from app.services.pdf_service import parse_pipeline
+
+IMAGES = {"signature.png": b"png"}
+
+def _step(steps, index=0):
+    return parse_pipeline(steps, IMAGES)[index]
+
+def test_defaults_are_filled_in_and_save_is_implied():
+    parsed = parse_pipeline([{"op": "split-by-range"}], IMAGES)
+
+    assert parsed[0] == {"op": "split-by-range", "start_page": 1, "end_page": None}
+    assert parsed[1] == {"op": "save", "save_profile": "balanced"}
+
+def test_whole_numbers_written_as_floats_become_ints():
+    step = _step([{"op": "split-by-range", "start_page": 2.0, "end_page": 3.0}])
+
+    assert step["start_page"] == 2 and isinstance(step["start_page"], int)
+    assert step["end_page"] == 3 and isinstance(step["end_page"], int)
+
+@pytest.mark.parametrize("name, value, expected", [
+    ("start_page", 1.5, "'start_page' must be a whole number, got 1.5"),
+    ("start_page", "2", "'start_page' must be a whole number, got \"2\""),
+    ("start_page", True, "'start_page' must be a whole number, got true"),
+    ("end_page", 2.5, "'end_page' must be a whole number, got 2.5"),
+    ("end_page", "last", "'end_page' must be a whole number, got \"last\""),
+    ("end_page", [3], "'end_page' must be a whole number, got [3]"),
+])
+def test_invalid_page_options_name_the_step_and_option(name, value, expected):
+    with pytest.raises(ValueError) as error:
+        parse_pipeline([{"op": "remove-empty-pages"}, {"op": "split-by-range", name: value}], IMAGES)
+
+    assert str(error.value) == f"Step 2 (split-by-range): {expected}"
+
+@pytest.mark.parametrize("step, expected", [
+    ({"op": "sign", "image_width": "wide"}, "Step 1 (sign): 'image_width' must be a number, got \"wide\""),
+    ({"op": "convert-to-images", "grayscale": 1}, "Step 1 (convert-to-images): 'grayscale' must be true or false, got 1"),
+    ({"op": "convert-to-images", "pages": 3}, "Step 1 (convert-to-images): 'pages' must be a string, got 3"),
+    ({"op": "remove-empty-pages", "ink_threshold": "low"}, "Step 1 (remove-empty-pages): 'ink_threshold' must be a number, got \"low\""),
+])
+def test_invalid_option_types(step, expected):
+    with pytest.raises(ValueError) as error:
+        parse_pipeline([step], IMAGES)
+
+    assert str(error.value) == expected
+
+def test_fractional_sizes_are_kept():
+    step = _step([{"op": "sign", "image_width": 40.5, "image_height": 20}])
+
+    assert step["image_width"] == 40.5 and step["image_height"] == 20
+
+@pytest.mark.parametrize("options, expected", [
+    ({"start_page": 0}, "Start page must be at least 1"),
+    ({"start_page": 3, "end_page": 2}, "End page must be at least the start page (3)"),
+])
+def test_page_range_is_checked_before_running(options, expected):
+    with pytest.raises(ValueError, match=re.escape(expected)):
+        parse_pipeline([{"op": "split-by-range", **options}], IMAGES)
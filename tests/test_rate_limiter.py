@@ -0,0 +1,172 @@
+from unittest import mock
+import fakeredis
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from limits import parse
+from slowapi.errors import RateLimitExceeded
+from slowapi.middleware import SlowAPIMiddleware
+from app.api.v1 import rate_limiter
+from app.api.v1.rate_limiter import charge_pages, create_limiter, limit, rate_limit_exceeded
+
+class Backend:
+    """A limiter on one storage, with a small app wired like app.main using it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.server = None
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setenv("RATE_LIMIT_TEST_LIMITED", "3/minute")
+            patch.setenv("RATE_LIMIT_PER_IP_TEST_LIMITED", "5/minute")
+            # What the in-memory fallback allows while Redis is down
+            patch.setattr(rate_limiter.settings, "RATE_LIMIT", "4/minute")
+            if name == "redis":
+                self.server = fakeredis.FakeServer()
+                with mock.patch("redis.from_url", lambda *args, **kwargs: fakeredis.FakeStrictRedis(server=self.server)):
+                    self.limiter = create_limiter("redis://localhost:6379/0")
+            else:
+                self.limiter = create_limiter("memory://")
+            # The route decorators register their limits on the module's limiter
+            patch.setattr(rate_limiter, "limiter", self.limiter)
+            self.app = self._build_app()
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+        app.state.limiter = self.limiter
+        app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded)
+        app.add_middleware(SlowAPIMiddleware)
+
+        @app.post("/limited")
+        @limit("test-limited")
+        async def limited(request: Request):
+            return {"ok": True}
+
+        @app.post("/pages/{count}")
+        @limit("test-pages")
+        async def pages(request: Request, count: int):
+            await charge_pages(request, count)
+            return {"pages": count}
+
+        return app
+
+    def reset(self):
+        if self.server is not None:
+            self.server.connected = True
+            fakeredis.FakeStrictRedis(server=self.server).flushall()
+            self.limiter._storage_dead = False
+        self.limiter.reset()
+
+    def stored_keys(self) -> list:
+        if self.server is not None:
+            return [key.decode() for key in fakeredis.FakeStrictRedis(server=self.server).keys("*")]
+        return list(self.limiter.limiter.storage.storage)
+
+@pytest.fixture(scope="module", params=["memory", "redis"])
+def backend(request):
+    # Built once per storage: slowapi adds the limits of every decoration to the same endpoint name
+    return Backend(request.param)
+
+@pytest.fixture
+def client(backend, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "limiter", backend.limiter)
+    monkeypatch.setattr(rate_limiter, "page_quota", parse("10/minute"))
+    backend.reset()
+
+    def make(address: str = "10.0.0.1") -> TestClient:
+        return TestClient(backend.app, client=(address, 50000))
+    return make
+
+def _post(client, url, api_key="first", **kwargs):
+    return client.post(url, headers={"X-API-Key": api_key}, **kwargs)
+
+def test_request_limit_returns_429_with_retry_after(client):
+    for _ in range(3):
+        assert _post(client(), "/limited").status_code == 200
+
+    response = _post(client(), "/limited")
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Rate limit of 3 per 1 minute exceeded."}
+    assert 1 <= int(response.headers["Retry-After"]) <= 60
+
+def test_api_key_limit_holds_across_addresses(client):
+    for address in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        assert _post(client(address), "/limited").status_code == 200
+
+    assert _post(client("10.0.0.4"), "/limited").status_code == 429
+    assert _post(client("10.0.0.4"), "/limited", api_key="second").status_code == 200
+
+def test_address_limit_holds_across_api_keys(client):
+    for number in range(5):
+        assert _post(client(), "/limited", api_key=f"key-{number}").status_code == 200
+
+    response = _post(client(), "/limited", api_key="key-5")
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Rate limit of 5 per 1 minute exceeded."}
+    assert _post(client("10.0.0.2"), "/limited", api_key="key-5").status_code == 200
+
+def test_rate_limit_key_hashes_the_api_key(client, backend):
+    _post(client(), "/limited", api_key="secret-key")
+
+    keys = backend.stored_keys()
+    assert keys and not any("secret-key" in key for key in keys)
+
+def test_request_cost_grows_with_upload_size(client, monkeypatch):
+    monkeypatch.setattr(rate_limiter.settings, "RATE_LIMIT_COST_BYTES", 100)
+
+    # 250 bytes cost three units, the whole 3/minute budget of the key
+    assert _post(client(), "/limited", content=b"x" * 250).status_code == 200
+    assert _post(client(), "/limited", content=b"x").status_code == 429
+
+def test_pages_are_charged_against_the_quota(client):
+    assert _post(client(), "/pages/6").status_code == 200
+    assert _post(client(), "/pages/4").status_code == 200
+
+    response = _post(client(), "/pages/1")
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Page quota of 10 per 1 minute exceeded (1 pages requested)."}
+    assert 1 <= int(response.headers["Retry-After"]) <= 60
+
+def test_page_quota_is_per_api_key(client):
+    assert _post(client("10.0.0.1"), "/pages/10", api_key="first").status_code == 200
+    assert _post(client("10.0.0.2"), "/pages/1", api_key="first").status_code == 429
+    assert _post(client("10.0.0.1"), "/pages/10", api_key="second").status_code == 200
+
+def test_request_larger_than_the_page_quota_is_refused(client):
+    response = _post(client(), "/pages/11")
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+def test_no_page_quota_charges_nothing(client, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "page_quota", None)
+
+    for _ in range(3):
+        assert _post(client(), "/pages/1000").status_code == 200
+
+def test_page_quota_storage_failure_lets_the_request_through(client, backend, monkeypatch):
+    hit = backend.limiter.limiter.hit
+
+    def pages_unavailable(item, *identifiers, cost=1):
+        if "pages" in identifiers:
+            raise ConnectionError("storage down")
+        return hit(item, *identifiers, cost=cost)
+    monkeypatch.setattr(backend.limiter.limiter, "hit", pages_unavailable)
+
+    assert _post(client(), "/pages/100").status_code == 200
+
+def test_redis_outage_falls_back_to_limiting_in_memory(client, backend):
+    if backend.server is None:
+        pytest.skip("only Redis storage has a fallback")
+    assert _post(client(), "/limited").status_code == 200
+
+    backend.server.connected = False
+    # Served from the in-memory fallback, which allows RATE_LIMIT (4/minute) per key
+    for _ in range(4):
+        assert _post(client(), "/limited").status_code == 200
+    response = _post(client(), "/limited")
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 60
+
+def test_app_returns_retry_after_for_request_limits():
+    from app.main import app
+
+    assert app.exception_handlers[RateLimitExceeded] is rate_limit_exceeded
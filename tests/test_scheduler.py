@@ -0,0 +1,152 @@
+import asyncio
+import fitz
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.api.v1.routers import pdf as pdf_router
+from app.core.cache import ResultCache
+from app.core.scheduler import BULK, INTERACTIVE, AdmissionScheduler, Lane, admission
+from app.main import app
+
+HEADERS = {"X-API-Key": "test"}
+
+async def _queue(lane: Lane, order: list, *clients: str, background: bool = False):
+    """Start a waiting acquire per client, in order; each records its client and releases once granted."""
+    async def wait(client):
+        ticket = await lane.acquire(client, 1.0, background)
+        order.append(client)
+        await asyncio.sleep(0)
+        ticket.release()
+
+    tasks = []
+    for client in clients:
+        tasks.append(asyncio.create_task(wait(client)))
+        await asyncio.sleep(0)
+    return tasks
+
+def test_freed_slots_go_to_waiting_clients_in_turn():
+    async def run():
+        lane = Lane("test", 1, 10, 5)
+        order = []
+        first = await lane.acquire("a", 1.0)
+        tasks = await _queue(lane, order, "a", "a", "a", "b", "c")
+        assert lane.stats() == {"concurrency": 1, "running": 1, "waiting": 5, "clients_waiting": 3}
+
+        first.release()
+        await asyncio.gather(*tasks)
+        return lane, order
+
+    lane, order = asyncio.run(run())
+
+    # "a" queued three jobs first, but "b" and "c" do not wait behind all of them
+    assert order == ["a", "b", "c", "a", "a"]
+    assert lane.stats() == {"concurrency": 1, "running": 0, "waiting": 0, "clients_waiting": 0}
+
+def test_full_queue_is_refused_but_background_jobs_still_wait():
+    async def run():
+        lane = Lane("test", 1, 1, 5)
+        order = []
+        ticket = await lane.acquire("a", 1.0)
+        tasks = await _queue(lane, order, "b")
+        with pytest.raises(HTTPException) as error:
+            await lane.acquire("c", 1.0)
+        tasks += await _queue(lane, order, "job", background=True)
+        ticket.release()
+        # Releasing twice frees the slot once
+        ticket.release()
+        assert lane.stats()["running"] == 1
+        await asyncio.gather(*tasks)
+        return lane, order, error.value
+
+    lane, order, error = asyncio.run(run())
+
+    assert error.status_code == 503
+    assert "queue is full" in error.detail
+    assert "Retry-After" in error.headers
+    assert order == ["b", "job"]
+    assert lane.stats()["running"] == 0
+
+def test_wait_timeout_gives_503_and_leaves_the_queue():
+    async def run():
+        lane = Lane("test", 1, 10, 0.05)
+        ticket = await lane.acquire("a", 1.0)
+        with pytest.raises(HTTPException) as error:
+            await lane.acquire("b", 1.0)
+        stats = lane.stats()
+        ticket.release()
+        return error.value, stats, lane.stats()
+
+    error, waiting, after = asyncio.run(run())
+
+    assert error.status_code == 503
+    assert "within 0.05 seconds" in error.detail
+    assert waiting["waiting"] == 0
+    assert after["running"] == 0
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    async def run():
+        lane = Lane("test", 1, 10, 5)
+        order = []
+        ticket = await lane.acquire("a", 1.0)
+        cancelled, waiting = await _queue(lane, order, "b", "c")
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        ticket.release()
+        await waiting
+        return lane, order
+
+    lane, order = asyncio.run(run())
+
+    assert order == ["c"]
+    assert lane.stats()["running"] == 0
+
+def test_expensive_interactive_work_is_demoted_to_the_bulk_lane():
+    async def run():
+        scheduler = AdmissionScheduler(interactive=2, bulk=1, max_waiting=10, wait_timeout=5, interactive_max_cost=50)
+        cheap = await scheduler.acquire("a", INTERACTIVE, cost=10)
+        expensive = await scheduler.acquire("a", INTERACTIVE, cost=80)
+        return scheduler, cheap, expensive
+
+    scheduler, cheap, expensive = asyncio.run(run())
+
+    assert cheap.lane.name == INTERACTIVE
+    assert expensive.lane.name == BULK
+    assert scheduler.stats()[BULK]["running"] == 1
+
+def test_disabled_scheduler_admits_everything():
+    scheduler = AdmissionScheduler(interactive=1, bulk=1, max_waiting=0, wait_timeout=5, interactive_max_cost=50, enabled=False)
+
+    assert asyncio.run(scheduler.acquire("a", BULK, cost=1000)) is None
+
+def _pdf() -> bytes:
+    document = fitz.open()
+    document.new_page(width=100, height=100).insert_text((10, 50), "cached")
+    data = document.tobytes()
+    document.close()
+    return data
+
+def test_cache_hit_does_not_wait_for_a_slot(monkeypatch):
+    cache = ResultCache("pdf-test", memory_bytes=16 * 1024 * 1024, ttl=60)
+    monkeypatch.setattr(pdf_router, "pdf_cache", cache)
+    acquired = []
+    acquire = admission.acquire
+
+    async def counting_acquire(client, lane, cost=1.0, background=False):
+        acquired.append(lane)
+        return await acquire(client, lane, cost, background)
+
+    monkeypatch.setattr(admission, "acquire", counting_acquire)
+    client = TestClient(app)
+    pdf = _pdf()
+
+    responses = [
+        client.post("/v1/pdf/convert-to-image", headers=HEADERS, files={"file": ("a.pdf", pdf, "application/pdf")})
+        for _ in range(2)
+    ]
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[0].content == responses[1].content
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert acquired == [BULK]
+    # Every slot was handed back once the responses were sent
+    assert all(stats["running"] == 0 for stats in admission.stats().values())
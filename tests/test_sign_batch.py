@@ -0,0 +1,45 @@
+import asyncio
+import io
+import json
+import zipfile
+import fitz
+from PIL import Image
+from app.services.pdf_service import sign_pdf_batch
+
+def _pdf(text: str) -> bytes:
+    doc = fitz.open()
+    doc.new_page(width=200, height=100).insert_text((20, 50), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 10), "black").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _sign(documents) -> zipfile.ZipFile:
+    async def collect():
+        return b"".join([chunk async for chunk in sign_pdf_batch(documents, "${sign}", _png())])
+    return zipfile.ZipFile(io.BytesIO(asyncio.run(collect())))
+
+def test_signed_documents_and_manifest_are_zipped():
+    archive = _sign([("a.pdf", _pdf("sign here ${sign}")), ("b.pdf", _pdf("no placeholder"))])
+
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest[0] == {"file": "a.pdf", "success": True, "output": "0001_signed_a.pdf", "error": None}
+    assert manifest[1]["success"] is False
+    assert manifest[1]["error"] == "Template text '${sign}' not found in the document."
+    assert fitz.open(stream=archive.read("0001_signed_a.pdf"), filetype="pdf").page_count == 1
+
+def test_unreadable_document_does_not_leak_its_spool_path(tmp_path):
+    spooled = tmp_path / "0123456789abcdef"
+    spooled.write_bytes(b"not a pdf at all")
+
+    archive = _sign([("broken.pdf", str(spooled)), ("gone.pdf", str(tmp_path / "missing"))])
+
+    manifest = json.loads(archive.read("manifest.json"))
+    for entry in manifest:
+        assert entry["success"] is False
+        assert entry["error"] == "The PDF could not be opened or signed."
+    assert str(tmp_path) not in archive.read("manifest.json").decode()
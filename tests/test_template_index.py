@@ -0,0 +1,49 @@
+import os
+from app.services.template_index import TemplateIndex
+
+PLACEMENTS = {"${sign}": [[0, 300.0, 588.0, 333.0, 603.0]]}
+
+def _fingerprint(n: int) -> str:
+    return f"{n:064x}"
+
+def test_entries_survive_a_new_index_on_the_same_directory(tmp_path):
+    entry = TemplateIndex(str(tmp_path), 8).register(_fingerprint(1), 2, PLACEMENTS)
+
+    index = TemplateIndex(str(tmp_path), 8)
+    assert index.get(entry["template_id"]) == entry
+    assert index.placements(_fingerprint(1)) == PLACEMENTS
+    assert index.placements(_fingerprint(2)) is None
+
+def test_empty_until_something_is_registered(tmp_path):
+    index = TemplateIndex(str(tmp_path / "index"), 8)
+    assert index.is_empty() and index.list() == []
+
+    index.register(_fingerprint(1), 1, PLACEMENTS)
+    assert not index.is_empty()
+
+def test_least_recently_registered_is_evicted_first(tmp_path):
+    index = TemplateIndex(str(tmp_path), 2)
+    for n in (1, 2, 3):
+        index.register(_fingerprint(n), 1, PLACEMENTS)
+        os.utime(index._path(_fingerprint(n)), (n, n))
+    index.register(_fingerprint(1), 1, PLACEMENTS)
+
+    assert index.placements(_fingerprint(1)) == PLACEMENTS
+    assert index.placements(_fingerprint(2)) is None
+    assert index.placements(_fingerprint(3)) == PLACEMENTS
+
+def test_remove(tmp_path):
+    index = TemplateIndex(str(tmp_path), 8)
+    entry = index.register(_fingerprint(1), 1, PLACEMENTS)
+
+    assert index.remove(entry["template_id"])
+    assert not index.remove(entry["template_id"])
+    assert index.placements(_fingerprint(1)) is None and index.is_empty()
+
+def test_malformed_template_ids_are_not_found(tmp_path):
+    index = TemplateIndex(str(tmp_path), 8)
+    index.register(_fingerprint(1), 1, PLACEMENTS)
+
+    assert index.get("../" + _fingerprint(1)[:13]) is None
+    assert index.get("") is None
+    assert not index.remove("0")
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+import pytest
+from fastapi import HTTPException
+from app.core.worker_pool import WorkerPool
+
+def _pid():
+    return os.getpid()
+
+def _sleep(seconds: float) -> int:
+    time.sleep(seconds)
+    return os.getpid()
+
+def _crash():
+    os._exit(1)
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+async def _wait_until(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.05)
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool("test", max_workers=2, max_queue=2, timeout=30, kind="process")
+    yield pool
+    pool.shutdown()
+
+async def _warm_up(pool: WorkerPool) -> set:
+    """Start both worker processes before the timeout is lowered, and return their pids."""
+    pids = set(await asyncio.gather(pool.run(_sleep, 0.5), pool.run(_sleep, 0.5)))
+    pool.timeout = 1
+    return pids
+
+def test_timed_out_job_is_killed_and_frees_its_slot(pool):
+    async def scenario():
+        pids = await _warm_up(pool)
+        with pytest.raises(HTTPException) as error:
+            await pool.run(_sleep, 60)
+        assert error.value.status_code == 504
+
+        await _wait_until(lambda: pool.pending == 0)
+        await _wait_until(lambda: not any(_alive(pid) for pid in pids))
+        # The next job runs on a fresh process, which takes a while to spawn
+        pool.timeout = 30
+        assert await pool.run(_pid) not in pids
+
+    asyncio.run(scenario())
+
+def test_other_jobs_finish_before_a_timed_out_executor_is_recycled(pool):
+    async def scenario():
+        await _warm_up(pool)
+        hung = asyncio.ensure_future(pool.run(_sleep, 60))
+        await asyncio.sleep(0.5)
+        # Outlives the hung job's timeout but not its own
+        innocent = asyncio.ensure_future(pool.run(_sleep, 0.8))
+
+        with pytest.raises(HTTPException):
+            await hung
+        # Started before the timeout on the same executor, and not killed with it
+        assert isinstance(await innocent, int)
+        await _wait_until(lambda: pool.pending == 0)
+
+    asyncio.run(scenario())
+
+def test_crashed_worker_is_replaced(pool):
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await pool.run(_crash)
+        assert error.value.status_code == 500
+
+        assert isinstance(await pool.run(_pid), int)
+        assert pool.pending == 0
+
+    asyncio.run(scenario())
+
+def test_full_pool_rejects_with_503():
+    pool = WorkerPool("test", max_workers=1, max_queue=0, timeout=5, kind="thread")
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as error:
+            await pool.run(time.sleep, 0)
+        assert error.value.status_code == 503
+        assert "Retry-After" in error.value.headers
+        await running
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()